@@ -0,0 +1,126 @@
+# annotation_io.py
+import json
+import os
+
+from annotation_store import Box
+
+def build_model_annotations(result):
+    """把模型识别结果转换为标注工具使用的标注框列表（编号从1开始，标签为pig编号，默认绿色）
+
+    result 为 onnxdealA.main 的返回值：[{'cls': 0, 'xyxy': [x1,y1,x2,y2], 'score': 0.8}, ...]
+    """
+    return [Box(i + 1, box['cls'], *box['xyxy']) for i, box in enumerate(result or [])]
+
+def make_output_dirs(output_root, folder_name):
+    """创建输出目录下的txt和json两个子目录，返回(txt目录, json目录)"""
+    txt_output_dir = os.path.join(output_root, folder_name, 'txt')
+    json_output_dir = os.path.join(output_root, folder_name, 'json')
+    os.makedirs(txt_output_dir, exist_ok=True)
+    os.makedirs(json_output_dir, exist_ok=True)
+    return txt_output_dir, json_output_dir
+
+def frame_file_paths(txt_output_dir, json_output_dir, frame_idx):
+    """单帧输出文件路径，文件名格式为frame_xxxxx.txt / frame_xxxxx.json"""
+    return (os.path.join(txt_output_dir, f"frame_{int(frame_idx):05d}.txt"),
+            os.path.join(json_output_dir, f"frame_{int(frame_idx):05d}.json"))
+
+def normalize_annotations(annotations, frame_size):
+    """把标注框转换为归一化的中心点坐标，frame_size为(高, 宽)，未知时坐标全部为0"""
+    json_single_frame_data = []
+    for ann in annotations:
+        x_min, y_min = ann['x1'], ann['y1']
+        x_max, y_max = ann['x2'], ann['y2']
+        if frame_size:
+            frame_height, frame_width = frame_size
+            # 计算归一化坐标
+            x_center = (x_min + x_max) / 2 / frame_width
+            y_center = (y_min + y_max) / 2 / frame_height
+            width = (x_max - x_min) / frame_width
+            height = (y_max - y_min) / frame_height
+        else:
+            x_center = y_center = width = height = 0
+        json_single_frame_data.append({
+            'class_id': ann['class_id'],
+            'x_center': x_center,
+            'y_center': y_center,
+            'width': width,
+            'height': height,
+            'text': ann['text'],
+        })
+    return json_single_frame_data
+
+def _replace_file(path, content):
+    """先写入同目录下的临时文件再重命名覆盖，写出中途出错或崩溃时原文件保持完整
+    （重命名前先把临时文件落盘，否则掉电后可能得到已替换但内容为空的文件）"""
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def write_normalized_frame(txt_output_dir, json_output_dir, frame_idx, json_single_frame_data):
+    """输出已归一化的单帧标注（normalize_annotations的返回格式）"""
+    txt_file_path, json_file_path = frame_file_paths(txt_output_dir, json_output_dir, frame_idx)
+    # 输出txt文件，每行为 类别,x中心,y中心,宽,高,文本
+    _replace_file(txt_file_path, ''.join(
+        f"{item['class_id']},{item['x_center']:.6f},{item['y_center']:.6f},"
+        f"{item['width']:.6f},{item['height']:.6f},{item['text']}\n" for item in json_single_frame_data))
+    # 写入单帧JSON文件
+    _replace_file(json_file_path, json.dumps(json_single_frame_data, ensure_ascii=False, indent=4))
+
+def write_frame(txt_output_dir, json_output_dir, frame_idx, annotations, frame_size):
+    """输出单帧的txt和json标注文件"""
+    write_normalized_frame(txt_output_dir, json_output_dir, frame_idx, normalize_annotations(annotations, frame_size))
+
+def read_frame(txt_output_dir, json_output_dir, frame_idx):
+    """读取单帧标注，返回normalize_annotations格式的列表；优先读json文件，没有时读txt文件，都没有时返回None"""
+    txt_file_path, json_file_path = frame_file_paths(txt_output_dir, json_output_dir, frame_idx)
+    if os.path.exists(json_file_path):
+        with open(json_file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    if not os.path.exists(txt_file_path):
+        return None
+    items = []
+    with open(txt_file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            fields = line.rstrip('\n').split(',', 5)
+            if len(fields) < 5:
+                continue
+            items.append({
+                'class_id': int(fields[0]),
+                'x_center': float(fields[1]),
+                'y_center': float(fields[2]),
+                'width': float(fields[3]),
+                'height': float(fields[4]),
+                'text': fields[5] if len(fields) > 5 else '',
+            })
+    return items
+
+def list_frames(txt_output_dir, json_output_dir):
+    """输出目录中已有标注文件的帧索引（升序）"""
+    indexes = set()
+    for directory, extension in ((txt_output_dir, '.txt'), (json_output_dir, '.json')):
+        if not os.path.isdir(directory):
+            continue
+        for name in os.listdir(directory):
+            stem, ext = os.path.splitext(name)
+            if ext == extension and stem.startswith('frame_') and stem[6:].isdigit():
+                indexes.add(int(stem[6:]))
+    return sorted(indexes)
+
+def remove_frame(txt_output_dir, json_output_dir, frame_idx):
+    """删除单帧的txt和json标注文件，返回删除的文件数"""
+    removed = 0
+    for path in frame_file_paths(txt_output_dir, json_output_dir, frame_idx):
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
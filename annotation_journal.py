@@ -0,0 +1,175 @@
+# annotation_journal.py
+import hashlib
+import json
+import os
+
+from annotation_store import Box
+
+def box_row(box):
+    """标注框的日志记录形式，颜色记录原有颜色（选中时的高亮色不写入）"""
+    return [int(box['id']), int(box['class_id']), int(box['x1']), int(box['y1']), int(box['x2']), int(box['y2']),
+            box['label'], box['text'], list(box['original_color'])]
+
+def box_from_row(row):
+    id, class_id, x1, y1, x2, y2, label, text, color = row
+    return Box(id, class_id, x1, y1, x2, y2, label=label, text=text, color=tuple(color))
+
+def apply_record(frames, key_frames, record, interpolated=None):
+    """把一条日志记录应用到 {帧索引: 标注行列表}、关键帧字典和插值帧集合上
+
+    记录格式为 [序号, 操作, 帧索引, 参数...]：
+      frame  整帧标注（该帧第一次修改或重置时记录）
+      add    追加标注框          del   按位置删除标注框
+      box    按位置修改框的坐标（拖动、扩缩）
+      text   按位置修改框的文本（体重）
+      key    设置关键帧状态
+      interp 设置该帧是否为关键帧插值生成
+    """
+    _, op, frame_index = record[:3]
+    args = record[3:]
+    if op == 'frame':
+        frames[frame_index] = args[0]
+    elif op == 'key':
+        key_frames[frame_index] = args[0]
+    elif op == 'interp':
+        if interpolated is not None:
+            if args[0]:
+                interpolated.add(frame_index)
+            else:
+                interpolated.discard(frame_index)
+    else:
+        rows = frames.setdefault(frame_index, [])
+        if op == 'add':
+            rows.append(args[0])
+        elif op == 'del':
+            del rows[args[0]]
+        elif op == 'box':
+            rows[args[0]][2:6] = args[1:5]
+        elif op == 'text':
+            rows[args[0]][7] = args[1]
+        else:
+            raise ValueError(f"未知的日志操作: {op}")
+
+class AnnotationJournal:
+    """追加写入的标注操作日志，程序异常退出后重新打开同一视频时恢复标注
+
+    每次编辑追加一行JSON并立即交给操作系统（进程崩溃不会丢失已写入的记录），
+    累计compact_every条记录后把全部已修改帧的标注写成快照并清空日志，
+    恢复时只需读取快照再重放快照之后的少量记录，耗时与编辑总次数无关。
+    快照带有最后一条记录的序号，写完快照、清空日志之前崩溃时，重放会跳过快照已包含的记录。
+    """
+    def __init__(self, path_prefix, compact_every=5000):
+        self.journal_path = path_prefix + '.journal'
+        self.snapshot_path = path_prefix + '.snapshot.json'
+        self.compact_every = compact_every
+        self._seq = 0
+        self._since_compact = 0
+        self._touched = set()   # 日志中已有整帧记录的帧，之后的修改只记录操作
+        self._changed = set()   # 上次压缩以来修改过的帧
+        self._frame_json = {}   # 上次压缩时各帧标注的JSON文本，未修改的帧压缩时直接复用
+        self._file = None
+
+    @staticmethod
+    def path_for(output_root, video_path):
+        """视频对应的日志路径前缀：输出目录/.journal/视频名称_路径摘要"""
+        video_path = os.path.abspath(video_path)
+        video_name = os.path.splitext(os.path.basename(video_path))[0]
+        digest = hashlib.sha1(video_path.encode('utf-8')).hexdigest()[:8]
+        journal_dir = os.path.join(output_root, '.journal')
+        os.makedirs(journal_dir, exist_ok=True)
+        return os.path.join(journal_dir, f"{video_name}_{digest}")
+
+    def load(self):
+        """读取快照并重放日志，返回({帧索引: 标注框列表}, {帧索引: 是否关键帧}, 插值帧集合)，之后的记录追加在已有日志之后"""
+        frames, key_frames, interpolated, seq = {}, {}, set(), 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, encoding='utf-8') as f:
+                snapshot = json.load(f)
+            seq = snapshot['seq']
+            frames = {int(index): rows for index, rows in snapshot['frames'].items()}
+            key_frames = {int(index): is_key for index, is_key in snapshot['key_frames'].items()}
+            interpolated = set(snapshot.get('interpolated', []))
+        snapshot_seq = seq
+        if os.path.exists(self.journal_path):
+            valid_size = 0
+            with open(self.journal_path, 'rb') as f:
+                for line in f:
+                    # 崩溃时最后一行可能只写了一半
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    valid_size += len(line)
+                    if record[0] <= snapshot_seq:
+                        continue
+                    apply_record(frames, key_frames, record, interpolated)
+                    seq = record[0]
+                    self._since_compact += 1
+            # 截掉不完整的记录，之后追加的记录才能被正确读取
+            if valid_size < os.path.getsize(self.journal_path):
+                os.truncate(self.journal_path, valid_size)
+        self._seq = seq
+        self._touched = set(frames)
+        self._changed = set(frames)
+        return ({index: [box_from_row(row) for row in rows] for index, rows in frames.items()}, key_frames, interpolated)
+
+    def _append(self, record):
+        if self._file is None:
+            self._file = open(self.journal_path, 'a', encoding='utf-8')
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+        self._since_compact += 1
+
+    def record(self, frame_index, op, *args, boxes=None):
+        """记录一次编辑，boxes为该帧修改后的标注框列表；op为'frame'或该帧第一次修改时记录整帧标注"""
+        frame_index = int(frame_index)
+        if op == 'frame' or (op not in ('key', 'interp') and frame_index not in self._touched):
+            self.record_frame(frame_index, boxes or [])
+            return
+        if op not in ('key', 'interp'):
+            self._changed.add(frame_index)
+        self._seq += 1
+        self._append([self._seq, op, frame_index, *args])
+
+    def record_frame(self, frame_index, boxes):
+        """记录整帧标注（第一次修改、重置）"""
+        frame_index = int(frame_index)
+        self._seq += 1
+        self._touched.add(frame_index)
+        self._changed.add(frame_index)
+        self._append([self._seq, 'frame', frame_index, [box_row(box) for box in boxes]])
+
+    def needs_compaction(self):
+        return self._since_compact >= self.compact_every
+
+    def compact(self, annotations, key_frames, interpolated=()):
+        """把已修改帧的当前标注、关键帧状态和插值帧写成快照，然后清空日志
+
+        只重新序列化上次压缩以来修改过的帧，其余帧复用上次的JSON文本，压缩耗时与本轮修改的帧数成正比。
+        """
+        for index in self._changed:
+            self._frame_json[index] = json.dumps([box_row(box) for box in annotations.get(index, [])],
+                                                 ensure_ascii=False, separators=(',', ':'))
+        self._changed.clear()
+        frames_json = ','.join(f'"{index}":{self._frame_json[index]}' for index in sorted(self._frame_json))
+        key_frames_json = json.dumps({str(index): bool(is_key) for index, is_key in key_frames.items()},
+                                     separators=(',', ':'))
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(f'{{"seq":{self._seq},"frames":{{{frames_json}}},"key_frames":{key_frames_json},'
+                    f'"interpolated":{json.dumps(sorted(int(index) for index in interpolated))}}}')
+        os.replace(tmp_path, self.snapshot_path)
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.journal_path, 'w', encoding='utf-8')
+        self._since_compact = 0
+
+    def close(self, annotations=None, key_frames=None, interpolated=()):
+        """关闭日志；传入当前标注时先压缩，下次恢复只需读取快照"""
+        if annotations is not None and self._since_compact:
+            self.compact(annotations, key_frames or {}, interpolated)
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,184 @@
+# annotation_store.py
+import threading
+from collections.abc import MutableMapping
+
+import numpy as np
+
+# 自动化标注框默认是绿色，所有模型标注框共用同一个颜色元组
+MODEL_COLOR = (0, 255, 0)
+# 关键帧插值生成的标注框为橙色，与模型结果和手动标注区分
+INTERPOLATED_COLOR = (255, 165, 0)
+
+class Box:
+    """单个标注框
+
+    使用__slots__代替原来的11键字典，单个框的内存降到原来的约三分之一；
+    仍支持 box['x1']、box.get('text') 形式的访问，原有按字典使用的代码无需修改。
+    比较相等时按对象本身比较，内容相同的两个框不会被误认为同一个。
+    """
+    __slots__ = ('id', 'class_id', 'x1', 'y1', 'x2', 'y2', 'label', 'text', 'color', 'original_color')
+
+    def __init__(self, id, class_id, x1, y1, x2, y2, label=None, text='', color=MODEL_COLOR, original_color=None):
+        self.id = id
+        self.class_id = class_id
+        self.x1, self.y1, self.x2, self.y2 = x1, y1, x2, y2
+        self.label = label if label is not None else f"pig{id}"
+        self.text = text
+        self.color = color
+        self.original_color = original_color if original_color is not None else color   # 记录原有颜色
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.__slots__
+
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+    def keys(self):
+        return self.__slots__
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    def copy(self):
+        return Box(**self.to_dict())
+
+    def __repr__(self):
+        return f"Box({self.to_dict()})"
+
+def result_to_array(result):
+    """把模型识别结果压缩为(N,6)的int32数组，每行为[类别, x1, y1, x2, y2, 编号]
+
+    结果带有跟踪编号('id')时使用该编号，否则按顺序从1开始编号
+    """
+    array = np.empty((len(result or []), 6), dtype=np.int32)
+    for i, (row, box) in enumerate(zip(array, result or [])):
+        row[0] = box['cls']
+        row[1:5] = box['xyxy']
+        row[5] = box.get('id', i + 1)
+    return array
+
+def boxes_from_array(array):
+    """由模型结果数组构建可编辑的标注框列表"""
+    return [Box(box_id, class_id, x1, y1, x2, y2) for class_id, x1, y1, x2, y2, box_id in array.tolist()]
+
+class AnnotationStore(MutableMapping):
+    """按帧存储标注框：帧索引 -> 标注框列表
+
+    模型识别结果以紧凑的数组快照保存（每个框24字节），作为原始标注的备份；
+    某一帧第一次被读取时才由快照生成可编辑的标注框列表（写时复制），
+    重置某一帧只需丢弃已生成的列表，下次读取时重新从快照生成。
+    同时记录上次保存以来内容发生变化的帧（脏帧），保存时只需写出这些帧。
+    替换、删除、重置整帧时自动记录；修改列表中的标注框后由调用方调用 mark_dirty。
+    """
+    def __init__(self):
+        self._frames = {}       # 已生成或手动创建的可编辑标注框列表
+        self._snapshots = {}    # 模型原始识别结果的只读快照
+        self._dirty = set()     # 上次保存以来内容发生变化的帧
+        self._lock = threading.RLock()
+
+    def mark_dirty(self, *frame_indexes):
+        """标记帧的内容已修改"""
+        with self._lock:
+            self._dirty.update(frame_indexes)
+
+    def dirty_frames(self):
+        """上次保存以来内容发生变化的帧（副本）"""
+        with self._lock:
+            return set(self._dirty)
+
+    def clear_dirty(self, frame_indexes):
+        """保存成功后清除这些帧的修改标记，保存期间再次修改的帧由调用方决定是否包含在内"""
+        with self._lock:
+            self._dirty.difference_update(frame_indexes)
+
+    def set_model_result(self, frame_index, array):
+        """保存模型识别结果快照；用户已经编辑过的帧保持当前标注不变"""
+        array = np.array(array, dtype=np.int32, copy=True)
+        array.setflags(write=False)
+        with self._lock:
+            self._snapshots[frame_index] = array
+            # 尚未生成可编辑列表的帧，其内容就是这份快照
+            if frame_index not in self._frames:
+                self._dirty.add(frame_index)
+
+    def has_original(self, frame_index):
+        return frame_index in self._snapshots
+
+    def original(self, frame_index):
+        """模型原始识别结果的新副本，没有时返回None"""
+        array = self._snapshots.get(frame_index)
+        return boxes_from_array(array) if array is not None else None
+
+    def reset(self, frame_index):
+        """把某一帧恢复为模型原始识别结果，没有原始结果时返回False"""
+        with self._lock:
+            if frame_index not in self._snapshots:
+                return False
+            self._frames.pop(frame_index, None)
+            self._dirty.add(frame_index)
+            return True
+
+    def peek(self, frame_index):
+        """该帧当前的标注框列表，尚未生成可编辑列表的帧临时由快照生成、不保存（批量只读访问时不增加内存）"""
+        with self._lock:
+            boxes = self._frames.get(frame_index)
+            if boxes is not None:
+                return boxes
+            array = self._snapshots.get(frame_index)
+        return boxes_from_array(array) if array is not None else []
+
+    def is_materialized(self, frame_index):
+        """该帧是否已经生成了可编辑的标注框列表"""
+        return frame_index in self._frames
+
+    def box_count(self):
+        """标注框总数（未生成列表的帧按快照计数）"""
+        with self._lock:
+            count = sum(len(boxes) for boxes in self._frames.values())
+            return count + sum(len(array) for index, array in self._snapshots.items() if index not in self._frames)
+
+    def __getitem__(self, frame_index):
+        with self._lock:
+            boxes = self._frames.get(frame_index)
+            if boxes is None:
+                array = self._snapshots.get(frame_index)
+                if array is None or not len(array):
+                    raise KeyError(frame_index)
+                boxes = self._frames[frame_index] = boxes_from_array(array)
+            return boxes
+
+    def __setitem__(self, frame_index, boxes):
+        with self._lock:
+            self._frames[frame_index] = boxes
+            self._dirty.add(frame_index)
+
+    def __delitem__(self, frame_index):
+        with self._lock:
+            found = self._frames.pop(frame_index, None) is not None
+            found = self._snapshots.pop(frame_index, None) is not None or found
+            if not found:
+                raise KeyError(frame_index)
+            self._dirty.add(frame_index)
+
+    def __contains__(self, frame_index):
+        return frame_index in self._frames or \
+            (frame_index in self._snapshots and len(self._snapshots[frame_index]) > 0)
+
+    def __iter__(self):
+        with self._lock:
+            keys = set(self._frames)
+            keys.update(index for index, array in self._snapshots.items() if len(array))
+        return iter(sorted(keys))
+
+    def __len__(self):
+        return sum(1 for _ in self)
@@ -2,17 +2,38 @@ import sys
 import os
 import cv2
 import time
-import json
+import sqlite3
 import threading
-import copy
-from queue import Queue, Empty
+from queue import Queue, Empty, Full
 import math
+import numpy as np
 import onnxdealA
+import video_io
+import pipeline
+import annotation_io
+import project_container
+import dataset_export
+import video_renderer
+from background_task import BackgroundTask
+from annotation_store import AnnotationStore, Box, INTERPOLATED_COLOR, result_to_array
+import multiprocessing
+from inference_pool import InferencePool
+from frame_store import FrameStore
+from frame_view import FrameView, RedrawScheduler
+from spatial_index import AnnotationGrid
+from tracker import IoUTracker
+import interpolation
+from scene_change import ChangeDetector
+import detection_cache
+from detection_cache import DetectionCache
+from project_writer import ProjectWriter
+from annotation_journal import AnnotationJournal, box_row
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                               QPushButton, QLabel, QMessageBox, QFrame, QFileDialog, QSlider, QGroupBox, QFormLayout,
                               QLineEdit, QComboBox, QColorDialog, QTabWidget, QSplitter, QCheckBox, QSizePolicy, QStyle,
-                              QInputDialog, QScrollArea, QListWidget, QListWidgetItem, QAbstractItemView, QButtonGroup, QRadioButton)
-from PySide6.QtCore import Qt, QTimer, QEvent, QPoint, QRect,QSize
+                              QInputDialog, QScrollArea, QListWidget, QListWidgetItem, QAbstractItemView, QButtonGroup, QRadioButton,
+                              QProgressDialog)
+from PySide6.QtCore import Qt, QTimer, QEvent, QPoint, QRect,QSize, Signal
 from PySide6.QtGui import QFont, QPixmap, QCursor, QColor, QImage
 
 # 分割标注工具（目前可能不需要）
@@ -557,8 +578,35 @@ class SelectionWindow(QMainWindow):
         self.show()
         event.accept()
 
+# 推理结果取决于的配置项，加载开始时取快照
+INFERENCE_OPTION_KEYS = ('model_path', 'input_size', 'conf_threshold', 'iou_threshold', 'class_thresholds')
+
+# 一次加载过程中解码线程和读取线程共享的分析状态
+class FrameAnalysisState:
+    """解码线程（gate_frame）决定每帧是否送入检测器并在这里记录判定结果，
+    读取线程（handle_frame_result）按帧序号取出记录，得到最终保存的识别结果"""
+    def __init__(self, interpolated, change_detector, sampler=None):
+        self.interpolated = interpolated   # 关键帧插值生成的帧（界面线程可能在加载过程中继续添加）
+        self.change_detector = change_detector
+        self.sampler = sampler             # 自适应采样器，检测结果变化时通知它缩短采样间隔
+        self.tracker = None
+        self.detect_every = 1              # 每隔多少个采样帧运行一次检测器
+        self.cache = None                  # 检测缓存
+        self.params = None                 # (推理参数摘要, 模型文件摘要)
+        self.options = None                # 加载开始时的推理参数快照（模型路径、输入尺寸和各项阈值）
+        self.pool = None                   # 本次加载使用的多进程推理后端
+        self.duplicates = set()   # 解码线程判定为重复的帧，读取线程取出后沿用上一帧的结果
+        self.cached = {}          # 解码线程在缓存中找到结果的帧 -> 识别结果
+        self.frame_keys = {}      # 送入检测器的帧 -> 帧内容摘要，读取线程据此写入缓存
+        self.skipped = set()      # 解码线程因已有插值标注而跳过的帧
+        self.last_result = []     # 上一个分析帧的识别结果
+
 # 方框标注工具
 class BoxAnnotationTool(QMainWindow):
+    # 读取线程通过信号通知界面线程更新显示（Qt控件只能在界面线程中访问）
+    loading_progress = Signal()
+    loading_finished = Signal(str)   # 状态栏消息，为空时不显示
+
     # 全类初始化
     def __init__(self):
         super().__init__()
@@ -568,18 +616,26 @@ class BoxAnnotationTool(QMainWindow):
         self.next_frame_lock = threading.Lock()
         self.loading = False           # 是否正在加载视频
         # 视频帧相关变量
-        self.video_frames = []         # 存储所有视频帧
         self.video_path = ""           # 视频的输入路径
         self.video_type = False        # 判断是视频还是图片序列
         self.current_frame_index = 0   # 当前显示的帧索引
         self.total_frame_count = 0     # 视频总帧数
         self.frame_rate = 30           # 视频的默认帧率是30
-        self.video_frame_selection_interval = 4 # 视频帧跳跃间隔（默认取第1帧、第5帧、第9帧...）
+        self.video_frame_selection_interval = 4 # 视频帧跳跃间隔（默认取第1帧、第5帧、第9帧...），自适应采样时不使用
+        self.inference_batch_size = 4  # 每次送入模型推理的帧数
         self.key_frames = {}           # 存储视频的关键帧索引
-        self.frame_queue = Queue(maxsize=150)    # 图片帧读取队列
+        self.interpolated_frames = set()   # 由关键帧插值生成标注的帧，加载视频时不再推理
+        self.frame_queue = Queue(maxsize=150)    # 图片帧读取队列，元素为(帧索引, 帧)
+        self.seek_index = None         # 视频采样帧寻址索引，用于任意帧的按需解码
+        self.frame_pipeline = None     # 解码/预处理/推理流水线
+        self.inference_pool = None     # 多进程推理后端（inference_backend为'process'时使用）
+        self.inference_pool_lock = threading.Lock()   # 后台预热和加载视频可能同时创建推理后端
+        self.retired_inference_pools = []  # 加载过程中被替换、但流水线仍在使用的推理后端，加载结束后关闭
+        self.detection_cache = None    # 检测结果的磁盘缓存，第一次使用时打开
         # 标注相关变量
-        self.original_annotations = {}  # 存储原始标注信息（作为备份）
-        self.annotations = {}          # 存储所有标注信息
+        # 存储所有标注信息；模型的原始识别结果以紧凑快照的形式一并保存在其中（作为备份）
+        self.annotations = AnnotationStore()
+        self.annotation_grids = {}     # 每帧标注框的网格索引（用于鼠标命中检测），按需建立
         self.current_tool = None       # 当前选中的标注工具
         # 标注框绘制相关变量
         self.drawing = False           # 是否正在绘制标注
@@ -593,6 +649,12 @@ class BoxAnnotationTool(QMainWindow):
         self.drag_offset = QPoint()    # 拖动偏移量
         # 文件保存相关变量
         self.saving_timestamp = None   # 记录当前项目第一次保存的时间戳
+        self.saved_output_dir = None   # 上次保存的输出目录
+        self.saved_frame_indexes = set()   # 上次保存的输出目录中已有输出文件的帧
+        self.journal = None            # 当前视频的标注操作日志，用于异常退出后恢复
+        self.background_task = None    # 正在执行的导出/渲染任务
+        self.inference_stats = {}      # 本次加载中检测、跟踪外推和补做检测的帧数
+        self.progress_dialog = None    # 后台任务的进度对话框
         # 标注框扩缩相关变量
         self.resizing = False          # 是否正在调整标注框大小
         self.resize_anchor = None      # 调整大小的锚点位置('n', 'ne', 'e', 'se', 's', 'sw', 'w', 'nw')
@@ -608,8 +670,39 @@ class BoxAnnotationTool(QMainWindow):
             'output_video_path': './processed_videos',
             'background_color': '#f0f0f0',
             'model_path': './model/1109_big_area_best.onnx',
-            'classes_path': './attachment/classes.txt'
+            'classes_path': './attachment/classes.txt',
+            'conf_threshold': 0.3,       # 模型检测的默认置信度阈值
+            'iou_threshold': 0.7,        # 按类别NMS的IoU阈值
+            'class_thresholds': {},      # 按类别单独设置的置信度阈值，如 {2: 0.5}
+            'frame_memory_budget_mb': 2048,  # 内存中保留的视频帧上限，超出部分溢出到磁盘缓存
+            'input_size': 1280,          # 模型输入尺寸
+            'preprocess_workers': 2,     # 流水线预处理阶段的线程数
+            'inference_workers': 1,      # 流水线推理阶段的线程数
+            'inference_backend': 'thread',   # 'thread'在界面进程内推理；'process'在工作进程中推理，不占用界面进程的GIL
+            'inference_processes': 2,    # 多进程推理后端的工作进程数
+            'pipeline_queue_size': 8,    # 流水线各阶段之间队列的容量
+            'redraw_interval_ms': None,  # 鼠标交互时两次重绘的最小间隔，None表示按屏幕刷新率
+            'journal_compact_every': 5000,   # 标注操作日志累计多少条记录后压缩为快照
+            'save_container': True,      # 保存时同时把全部关键帧写入输出目录下的单文件容器annotations.db
+            'dataset_image_format': 'jpg',   # 导出训练数据集的图片格式（jpg/png）
+            'dataset_max_size': None,    # 导出图片长边的最大像素数，None表示保持原尺寸
+            'dataset_val_ratio': 0.2,    # 导出时划入验证集的比例
+            'dataset_workers': 4,        # 导出时图片编码的线程数
+            'tracker_enabled': False,    # 视频加载时用跟踪器在检测之间传递标注框，并保持猪的编号稳定（开启后部分帧的预标注为外推结果）
+            'tracker_detect_every': 3,   # 跟踪时每隔多少个采样帧运行一次检测器，其余帧由跟踪器外推
+            'tracker_iou_threshold': 0.3,    # 检测框与轨迹关联的最小IoU
+            'tracker_min_confidence': 0.25,  # 轨迹平均置信度低于该值时提前运行检测器
+            'scene_change_threshold': 0,     # 与上一个分析过的帧相比变化像素比例不超过该值时视为重复帧，直接沿用其识别结果；0表示不跳过（静止画面较多时可设为0.002）
+            'scene_change_thresholds': {},   # 按视频文件名单独设置的重复帧阈值，如 {'pen3.mp4': 0.01}
+            'adaptive_sampling': False,  # 按画面运动和检测结果变化调整视频帧采样间隔
+            'sampling_min_interval': 4,  # 自适应采样的最小间隔（活动剧烈时），不小于固定采样间隔，采样帧数不会多于固定间隔
+            'sampling_max_interval': 16, # 自适应采样的最大间隔（画面静止时）
+            'detection_cache_path': detection_cache.DEFAULT_PATH,  # 检测结果缓存文件，默认在用户缓存目录下
+            'detection_cache_mb': 0,     # 检测结果缓存的大小上限，超出时淘汰最久未使用的条目；0表示不使用缓存（需要时可设为512）
+            'interpolation_mode': 'motion'   # 关键帧插值方式：'linear'按时间线性插值，'motion'按前后关键帧估计的速度平滑插值
         }
+        # 存储所有视频帧，超出内存预算的帧会溢出到磁盘并在访问时透明读回
+        self.video_frames = FrameStore(self.config['frame_memory_budget_mb'])
 
         # 初始化类别字典
         self.classes = self.init_classes()
@@ -632,6 +725,19 @@ class BoxAnnotationTool(QMainWindow):
         self.create_main_content()
         # 创建状态栏
         self.statusBar().showMessage("就绪")
+        # 鼠标移动产生的重绘请求合并后按屏幕刷新率执行
+        self.redraw_scheduler = RedrawScheduler(self.display_current_frame, self.config['redraw_interval_ms'], self)
+        # 标注文件在后台线程写出，进度和错误显示在状态栏
+        self.project_writer = ProjectWriter(self)
+        self.project_writer.progress.connect(self.on_save_progress)
+        self.project_writer.finished.connect(self.on_save_finished)
+        self.project_writer.failed.connect(self.on_save_failed)
+        self.loading_progress.connect(self.on_loading_progress)
+        self.loading_finished.connect(self.on_loading_finished)
+        # 定时把读取线程送达的帧转存到帧存储，避免用户停留在某一帧时流水线因队列满而停滞
+        self.frame_drain_timer = QTimer(self)
+        self.frame_drain_timer.timeout.connect(self.drain_frame_queue)
+        self.frame_drain_timer.start(100)
     
     # 初始化类别字典
     def init_classes(self):
@@ -688,6 +794,15 @@ class BoxAnnotationTool(QMainWindow):
         save_project_action = file_menu.addAction("保存项目")
         save_project_action.triggered.connect(self.save_project)
 
+        export_dataset_action = file_menu.addAction("导出训练数据集")
+        export_dataset_action.triggered.connect(self.export_dataset)
+
+        export_video_action = file_menu.addAction("导出标注视频")
+        export_video_action.triggered.connect(self.export_annotated_video)
+
+        clear_cache_action = file_menu.addAction("清除当前模型的检测缓存")
+        clear_cache_action.triggered.connect(self.invalidate_detection_cache)
+
         file_menu.addSeparator()
 
         exit_action = file_menu.addAction("退出")
@@ -779,6 +894,10 @@ class BoxAnnotationTool(QMainWindow):
         essential_frame_layout.addWidget(self.essential_frame_label)
         essential_frame_layout.addWidget(self.essential_frame_checkbox)
         essential_frame_layout.addWidget(self.weight_input)  # 添加输入框到勾选框右侧
+        # 关键帧插值：以当前关键帧和前后相邻关键帧的标注框填充中间的帧
+        self.interpolate_button = QPushButton("关键帧插值")
+        self.interpolate_button.clicked.connect(self.interpolate_key_frames)
+        essential_frame_layout.addWidget(self.interpolate_button)
         essential_frame_layout.addStretch()
         info_layout.addLayout(top_info_layout)
         info_layout.addLayout(essential_frame_layout)
@@ -786,7 +905,7 @@ class BoxAnnotationTool(QMainWindow):
 
         # 视频显示区域
         # TODO: 视频显示区域在界面可缩放时保持原视频比例
-        self.video_display = QLabel("视频显示区域")
+        self.video_display = FrameView("视频显示区域")
         # 居中文本
         self.video_display.setAlignment(Qt.AlignCenter)
 
@@ -1046,8 +1165,12 @@ class BoxAnnotationTool(QMainWindow):
         output_form_layout.addRow("", self.browse_input_btn)
         output_form_layout.addRow("输出参数文件路径:", self.output_txt_path_input)
         output_form_layout.addRow("", self.browse_output_btn)
+        self.export_video_btn = QPushButton("导出标注视频")
+        self.export_video_btn.clicked.connect(self.export_annotated_video)
+
         output_form_layout.addRow("输出标注视频图像帧路径:", self.output_video_path_input)
         output_form_layout.addRow("", self.browse_output_video_btn)
+        output_form_layout.addRow("", self.export_video_btn)
 
         output_group.setLayout(output_form_layout)
         output_layout.addWidget(output_group)
@@ -1071,9 +1194,8 @@ class BoxAnnotationTool(QMainWindow):
         # 先判断默认输入文件夹是否是图片数据集
         default_input_path = self.config['default_input_path']
         if os.path.exists(default_input_path):
-            files = os.listdir(default_input_path)
-            # 修改后：只要存在图片文件就询问用户是否加载
-            image_files = [file for file in files if file.endswith(('.jpg', '.jpeg', '.png'))]
+            # 修改后：只要存在图片文件就询问用户是否加载；按文件名排序，帧序号与批量预标注的输出一致
+            image_files = video_io.list_image_files(default_input_path)
             if image_files:
                 reply = QMessageBox.question(
                     self, 
@@ -1105,97 +1227,392 @@ class BoxAnnotationTool(QMainWindow):
         # 返回的格式：[{'cls': 0, 'xyxy': [x1,y1,x2,y2], 'score': 0.8},{'cls': 1, 'xyxy': [x1,y1,x2,y2], 'score': 0.8}]
         if frame is None:
             return None
-        result = onnxdealA.main(self.config['model_path'],frame,self.config['classes_path'])
+        result = onnxdealA.main(self.config['model_path'],frame,self.config['classes_path'],
+                                input_size=self.config['input_size'],
+                                conf_thres=self.config['conf_threshold'],
+                                iou_thres=self.config['iou_threshold'],
+                                class_thres=self.config['class_thresholds'])
         return result
-    
+
+    # 当前模型和推理参数的快照
+    def inference_options(self):
+        """ 加载开始时取一次快照，加载过程中切换模型或修改阈值不影响本次加载的推理和检测缓存的键 """
+        options = {key: self.config[key] for key in INFERENCE_OPTION_KEYS}
+        options['class_thresholds'] = dict(options['class_thresholds'] or {})
+        return options
+
+    # 流水线预处理阶段：letterbox并转换为模型输入张量
+    def preprocess_frames(self, frames, options=None):
+        """ 逐帧预处理，返回(帧, (张量, 缩放比例, 填充))列表；options为推理参数快照，为空时使用当前配置 """
+        options = options or self.config
+        return [(frame, onnxdealA.preprocess_batch([frame], options['input_size'])) for frame in frames]
+
+    # 流水线推理阶段：把已预处理的多帧合并为一次推理
+    def infer_preprocessed_frames(self, items, options=None):
+        """ 批量推理已预处理的帧，返回(帧, 识别结果)列表 """
+        options = options or self.config
+        blobs = [blob for _, (blob, _, _) in items]
+        ratios = [ratios[0] for _, (_, ratios, _) in items]
+        dwdhs = [dwdhs[0] for _, (_, _, dwdhs) in items]
+        results = onnxdealA.infer_blob(options['model_path'], blobs, ratios, dwdhs,
+                                       conf_thres=options['conf_threshold'],
+                                       iou_thres=options['iou_threshold'],
+                                       class_thres=options['class_thresholds'])
+        return [(frame, result) for (frame, _), result in zip(items, results)]
+
+    # 获取与当前模型和阈值一致的多进程推理后端，参数变化时重建
+    def get_inference_pool(self, options=None):
+        """ 获取多进程推理后端 """
+        options = options or self.config
+        options = (options['model_path'], options['input_size'], None, options['conf_threshold'],
+                   options['iou_threshold'], options['class_thresholds'])
+        with self.inference_pool_lock:
+            if self.inference_pool is not None and not self.inference_pool.matches(*options):
+                # 正在加载的流水线仍在使用旧的推理后端（如加载中切换了模型），等加载结束后再关闭
+                if self.loading:
+                    self.retired_inference_pools.append(self.inference_pool)
+                else:
+                    self.inference_pool.shutdown()
+                self.inference_pool = None
+            if self.inference_pool is None:
+                self.inference_pool = InferencePool(options[0], self.config['inference_processes'], *options[1:])
+            return self.inference_pool
+
+    # 关闭加载过程中被替换的推理后端
+    def release_retired_inference_pools(self):
+        with self.inference_pool_lock:
+            pools, self.retired_inference_pools = self.retired_inference_pools, []
+        for pool in pools:
+            pool.shutdown()
+
+    # 多进程后端的推理阶段：预处理、推理和后处理都在工作进程中完成
+    def infer_frames_in_pool(self, pool, frames):
+        """ 批量推理原始帧，返回(帧, 识别结果)列表 """
+        results = pool.infer(frames)
+        return list(zip(frames, results))
+
+    # 启动解码/预处理/推理流水线，并在读取线程中按帧序号顺序保存结果
+    def start_frame_pipeline(self, source, pure_frames_cutting=False, exact_count=False, tracking=False,
+                             change_threshold=None, sampler=None):
+        """ source 产生(帧索引, RGB帧)，由流水线的解码线程迭代；exact_count为True时以实际读取的帧数修正总帧数；
+        tracking为True时只对部分帧运行检测器，其余帧由跟踪器外推；
+        change_threshold不为空时，与上一个分析过的帧几乎相同的帧不再推理，沿用上一帧的识别结果；
+        sampler为自适应采样器时，相邻分析帧的检测结果发生变化会通知它缩短采样间隔 """
+        stages = []
+        state = None
+        self.inference_stats = {'detected': 0, 'tracked': 0, 'redetected': 0, 'reused': 0, 'cached': 0,
+                                'interpolated': 0}
+        if not pure_frames_cutting:
+            state = FrameAnalysisState(self.interpolated_frames, ChangeDetector(change_threshold), sampler)
+            # 推理和检测缓存的键使用同一份快照，加载中切换模型时新模型的结果不会以旧模型的键写入缓存
+            state.options = options = self.inference_options()
+            if tracking:
+                state.tracker = IoUTracker(self.config['tracker_iou_threshold'])
+                state.detect_every = max(1, int(self.config['tracker_detect_every']))
+            state.cache, state.params = self.detection_cache_params(options)
+
+            # 每帧标记是否需要检测，跳过检测的帧原样经过预处理和推理阶段
+            def gated_source(frames):
+                try:
+                    for frame_index, frame in frames:
+                        yield frame_index, (self.gate_frame(state, frame_index, frame), frame)
+                finally:
+                    frames.close()
+            source = gated_source(source)
+        if not pure_frames_cutting and self.config['inference_backend'] == 'process':
+            # 每个工作进程对应一个提交线程，帧经共享内存送入工作进程
+            pool = state.pool = self.get_inference_pool(options)
+            stages = [
+                pipeline.Stage('inference', pipeline.gated(lambda frames: self.infer_frames_in_pool(pool, frames),
+                                                           lambda frame: (frame, None)),
+                               pool.workers, self.inference_batch_size),
+            ]
+        elif not pure_frames_cutting:
+            stages = [
+                pipeline.Stage('preprocess', pipeline.gated(lambda frames: self.preprocess_frames(frames, options),
+                                                            lambda frame: frame),
+                               self.config['preprocess_workers']),
+                pipeline.Stage('inference', pipeline.gated(lambda items: self.infer_preprocessed_frames(items, options),
+                                                           lambda frame: (frame, None)),
+                               self.config['inference_workers'], self.inference_batch_size),
+            ]
+        # 在流水线启动前置位，此后替换推理后端时不会关闭流水线正在使用的后端
+        self.loading = True
+        frame_pipeline = pipeline.FramePipeline(source, stages, self.config['pipeline_queue_size']).start()
+        self.frame_pipeline = frame_pipeline
+
+        # 带取消检查地放入帧队列，流水线被取消后不再写入
+        def put_frame(item):
+            while not frame_pipeline.cancelled:
+                try:
+                    self.frame_queue.put(item, timeout=0.1)
+                    return True
+                except Full:
+                    continue
+            return False
+
+        # 结果读取线程；界面的更新通过信号交给界面线程执行
+        def frame_reader():
+            produced_count = 0
+            try:
+                for frame_index, output in frame_pipeline.results():
+                    if pure_frames_cutting:
+                        frame = output
+                    else:
+                        detected, (frame, result) = output
+                        self.handle_frame_result(state, frame_index, frame, detected, result)
+                    if not put_frame((frame_index, frame)):
+                        return
+                    produced_count += 1
+                    # 实时更新界面显示
+                    self.loading_progress.emit()
+            except Exception as e:
+                print(f"帧处理流水线出错: {e}")
+                # 读取线程自身出错时同样记录到流水线并停止解码和推理
+                if frame_pipeline.error is None:
+                    frame_pipeline.fail(e)
+            if state is not None and state.cache is not None:
+                try:
+                    state.cache.flush()
+                except sqlite3.Error as e:
+                    print(f"写入检测缓存时出错: {e}")
+            # 被clear_video_resources取消时，不再修改下一个视频的状态
+            if frame_pipeline.cancelled and frame_pipeline.error is None:
+                return
+            # 容器元数据中的帧数可能不准确，以实际读取到的帧数为准
+            if exact_count and produced_count:
+                self.total_frame_count = produced_count
+            # 视频帧读取完毕后，放入None作为结束信号；出错时流水线已被取消，结束信号不做取消检查，保证送达
+            if frame_pipeline.error is None:
+                put_frame(None)
+            else:
+                self.frame_queue.put(None)
+            self.loading = False
+            # 通知主线程更新界面（加载完成）
+            if frame_pipeline.error is not None:
+                self.loading_finished.emit(f"加载出错: {frame_pipeline.error}")
+            elif not pure_frames_cutting:
+                stats = self.inference_stats
+                self.loading_finished.emit(
+                    f"加载完成：检测 {stats['detected'] + stats['redetected']} 帧，缓存命中 {stats['cached']} 帧，"
+                    f"跟踪外推 {stats['tracked']} 帧，重复帧沿用结果 {stats['reused']} 帧，插值帧 {stats['interpolated']} 帧，"
+                    f"共跳过 {stats['cached'] + stats['tracked'] + stats['reused'] + stats['interpolated']} 次推理")
+            else:
+                self.loading_finished.emit("")
+
+        self.reader_thread = threading.Thread(target=frame_reader, daemon=True)
+        self.reader_thread.start()
+
+    # 解码线程中判定一帧是否需要送入检测器
+    def gate_frame(self, state, frame_index, frame):
+        """ 已有插值标注的帧、重复帧、跟踪外推的帧和命中缓存的帧返回False，判定结果记录在state中供读取线程使用 """
+        if frame_index in state.interpolated:
+            state.skipped.add(frame_index)
+            return False
+        if state.change_detector.is_duplicate(frame):
+            state.duplicates.add(frame_index)
+            return False
+        if frame_index % state.detect_every:
+            return False
+        if state.cache is not None:
+            key = state.frame_keys[frame_index] = detection_cache.frame_hash(frame)
+            result = state.cache.get(key, state.params[0])
+            if result is not None:
+                state.cached[frame_index] = result
+                return False
+        return True
+
+    # 读取线程中按帧序号处理一帧的流水线输出，得到并保存最终的识别结果
+    def handle_frame_result(self, state, frame_index, frame, detected, result):
+        """ detected为False时result为None，按解码线程的判定沿用、取缓存或由跟踪器外推 """
+        if frame_index in state.skipped:
+            # 插值帧已有标注，不保存识别结果；跟踪器照常外推，保持帧间的时间间隔
+            state.skipped.discard(frame_index)
+            if state.tracker is not None:
+                state.tracker.predict()
+            self.inference_stats['interpolated'] += 1
+            return
+        if frame_index in state.duplicates:
+            # 重复帧沿用上一帧的结果；跟踪器照常外推一帧，轨迹的速度和外推帧数与实际时间保持一致
+            state.duplicates.discard(frame_index)
+            result = state.last_result
+            if state.tracker is not None:
+                state.tracker.predict()
+            self.inference_stats['reused'] += 1
+        else:
+            if frame_index in state.cached:
+                detected, result = True, state.cached.pop(frame_index)
+                self.inference_stats['cached'] += 1
+            elif detected:
+                self.inference_stats['detected'] += 1
+                if state.cache is not None:
+                    state.cache.put(state.frame_keys[frame_index], state.params[0], state.params[1], result)
+            state.frame_keys.pop(frame_index, None)
+            # 跟踪器按帧顺序关联检测框或外推，结果带有稳定的编号
+            if state.tracker is not None:
+                result = self.track_frame(state, frame, result if detected else None)
+            if state.sampler is not None and self.detections_changed(state.last_result, result):
+                state.sampler.report_change()
+            state.last_result = result
+        # 保存当前帧的标注信息（界面线程可能在加载过程中把该帧标记为插值帧）
+        if frame_index not in state.interpolated:
+            self.Save_model_recognition_annotations(result, frame_index)
+
+    # 读取线程中补做检测的帧同样先查缓存
+    def detect_with_cache(self, state, frame):
+        """ 返回一帧的识别结果 """
+        if state.cache is None:
+            return self.detect_frames([frame], state.options, state.pool)[0]
+        key = detection_cache.frame_hash(frame)
+        result = state.cache.get(key, state.params[0])
+        if result is None:
+            result = self.detect_frames([frame], state.options, state.pool)[0]
+            state.cache.put(key, state.params[0], state.params[1], result)
+        return result
+
+    # 加载过程中刷新帧号显示（由读取线程的信号触发，在界面线程执行）
+    def on_loading_progress(self):
+        if self.loading:
+            self.frame_num_value.setText(f"{self.current_frame_index + 1}/{self.total_frame_count} (加载中...)")
+
+    # 加载结束（由读取线程的信号触发，在界面线程执行）
+    def on_loading_finished(self, message):
+        # 信号排队期间可能已经开始加载下一个视频，此时被替换的后端可能仍在使用
+        if not self.loading:
+            self.release_retired_inference_pools()
+        self.frame_num_value.setText(f"{self.current_frame_index + 1}/{self.total_frame_count}")
+        if message:
+            self.statusBar().showMessage(message)
+
+    # 等待读取线程送来第一帧
+    def wait_first_frame(self, timeout=0.1):
+        """ 返回第一帧(帧索引, 帧)，没有任何帧时返回None；流水线出错时抛出该错误，不会一直阻塞 """
+        frame_pipeline = self.frame_pipeline
+        while True:
+            try:
+                return self.frame_queue.get(timeout=timeout)
+            except Empty:
+                if frame_pipeline.error is not None:
+                    raise frame_pipeline.error
+                # 读取线程已经退出（如被取消）且没有送来任何数据
+                if not self.reader_thread.is_alive() and self.frame_queue.empty():
+                    return None
+
+    # 检测缓存及当前模型和阈值对应的推理参数
+    def detection_cache_params(self, options=None):
+        """ 返回(缓存, (参数摘要, 模型文件摘要))，未启用或无法打开缓存时返回(None, None)；options为推理参数快照 """
+        options = options or self.config
+        if not self.config['detection_cache_mb']:
+            return None, None
+        try:
+            if self.detection_cache is None:
+                self.detection_cache = DetectionCache(self.config['detection_cache_path'],
+                                                      int(self.config['detection_cache_mb'] * (1 << 20)))
+            params = detection_cache.inference_params(options['model_path'], options['input_size'],
+                                                      options['conf_threshold'], options['iou_threshold'],
+                                                      options['class_thresholds'])
+        except (OSError, sqlite3.Error) as e:
+            print(f"无法使用检测缓存: {e}")
+            return None, None
+        return self.detection_cache, params
+
+    # 删除当前模型的全部检测缓存（需要强制重新推理或释放空间时使用）
+    def invalidate_detection_cache(self):
+        try:
+            if self.detection_cache is None:
+                self.detection_cache = DetectionCache(self.config['detection_cache_path'],
+                                                      int(self.config['detection_cache_mb'] * (1 << 20)))
+            count = self.detection_cache.invalidate_model(detection_cache.model_hash(self.config['model_path']))
+        except (OSError, sqlite3.Error) as e:
+            QMessageBox.warning(self, "错误", f"清除检测缓存时出错: {e}")
+            return
+        self.statusBar().showMessage(f"已清除当前模型的 {count} 条检测缓存")
+
+    # 当前视频的重复帧判定阈值
+    def scene_change_threshold(self, video_path):
+        """ scene_change_thresholds中按视频文件名单独设置的阈值优先 """
+        return self.config['scene_change_thresholds'].get(os.path.basename(video_path),
+                                                          self.config['scene_change_threshold'])
+
+    # 相邻分析帧的检测结果是否发生变化（目标数量或跟踪编号不同）
+    @staticmethod
+    def detections_changed(previous, current):
+        previous, current = previous or [], current or []
+        return len(previous) != len(current) or \
+            {box.get('id') for box in previous} != {box.get('id') for box in current}
+
+    # 在读取线程中直接检测少量帧（跟踪置信度过低时补做检测）
+    def detect_frames(self, frames, options=None, pool=None):
+        """ 返回每帧的识别结果；options为推理参数快照，pool为本次加载使用的多进程推理后端 """
+        if self.config['inference_backend'] == 'process':
+            return (pool or self.get_inference_pool(options)).infer(frames)
+        return [result for _, result in self.infer_preprocessed_frames(self.preprocess_frames(frames, options), options)]
+
+    # 跟踪一帧
+    def track_frame(self, state, frame, detections):
+        """ detections为None表示本帧跳过了检测：轨迹置信度足够时按运动模型外推，否则补做检测 """
+        tracker = state.tracker
+        if detections is None:
+            if not len(tracker) or tracker.confidence() >= self.config['tracker_min_confidence']:
+                self.inference_stats['tracked'] += 1
+                return tracker.predict()
+            detections = self.detect_with_cache(state, frame)
+            self.inference_stats['redetected'] += 1
+        return tracker.update(detections)
+
     # 根据识别到的标注信息进行保存
     def Save_model_recognition_annotations(self,result,frame_index):
         """ 根据识别到的标注信息进行保存 """
         if not result:
             return
-        # 处理检测结果
-        frame_annotation = []
-        for i,box in enumerate(result):
-            # 获取标注框的坐标，将列表结构拆分成四个变量
-            x1,y1,x2,y2 = box['xyxy']
-            # 获取置信度
-            # confidence = float(box.conf[0])
-            # 获取检测类别
-            class_id = box['cls']
-            # 构建标注信息
-            annotation ={
-                'id': i + 1,
-                'class_id': class_id,
-                'x1': x1,
-                'y1': y1,
-                'x2': x2,
-                'y2': y2,
-                # 'confidence': confidence,
-                'label': f"pig{i+1}",
-                'text': '',
-                'color': (0, 255, 0),  # 自动化标注框默认是绿色
-                # 记录原有颜色
-                'original_color': (0, 255, 0)  # 自动化标注框默认是绿色
-            }
-            frame_annotation.append(annotation)
-        # 保存标注信息
-        if frame_annotation:
-            # 将标注信息加入原始标注字典（作为备份），使用深拷贝创建独立副本
-            self.original_annotations[frame_index] = copy.deepcopy(frame_annotation)
-            # 初始化当前标注字典，使用深拷贝创建独立副本
-            self.annotations[frame_index] = copy.deepcopy(frame_annotation)
+        # 以紧凑数组保存识别结果，第一次查看该帧时才生成可编辑的标注框；用户在识别完成前已经编辑过的帧保持不变
+        self.annotations.set_model_result(frame_index, result_to_array(result))
 
     # 加载图片数据集功能
     def load_default_atlas(self, files, montage=True):
         """批量加载文件夹中的图片"""
         try:
             # 清空之前的帧数据
-            self.video_frames = []
+            self.video_frames.clear()
             self.current_frame_index = 0
-            self.original_annotations = {}
-            self.annotations = {}
+            self.annotations = AnnotationStore()
             # 更新视频信息
             self.frame_rate = 1  # 图片序列的帧率设为1
+            # 图片数量即总帧数，任意一张图片都可以直接按需读取
+            self.total_frame_count = len(files)
 
-            # 图片帧读取线程加载所有图片
-            def frame_reader(pure_frames_cutting=False):
-                self.loading = True
+            # 读取指定序号的图片
+            def load_image(frame_index):
+                if not montage:
+                    file_path = self.video_path
+                else:
+                    file_path = os.path.join(self.video_path, files[frame_index])
+                frame = cv2.imread(file_path)
+                if frame is None:
+                    return None
+                # 转换为RGB格式
+                return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            self.video_frames.loader = load_image
+            # 与视频相同，在模型结果送达之前从日志恢复上次的标注（图片按文件名排序，帧序号保持一致）
+            self.open_journal()
+
+            # 图片帧读取（流水线的解码阶段）
+            def frame_source():
                 for frame_index,file in enumerate(files):
-                    if not montage:
-                        file_path = self.video_path
-                    else:
-                        file_path = os.path.join(self.video_path, file)
-                    frame = cv2.imread(file_path)
+                    frame = load_image(frame_index)
                     if frame is None:
                         print(f"无法加载图片: {file}")
                         continue
-                    # 转换为RGB格式
-                    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    if not pure_frames_cutting:
-                        result = self.Extract_the_annotation_information(frame)
-                        self.Save_model_recognition_annotations(result, frame_index)
-                    self.frame_queue.put(frame)
-                    self.total_frame_count += 1
-                    # 实时更新界面显示
-                    self.frame_num_value.setText(f"{self.current_frame_index + 1}/{self.total_frame_count} (加载中...)")
-                # 视频帧读取完毕后，放入None作为结束信号
-                self.frame_queue.put(None)
-                self.loading = False
-                # 通知主线程更新界面（加载完成）
-                self.frame_num_value.setText(f"{self.current_frame_index + 1}/{self.total_frame_count}")
-            
-            # 1. 判断模型是否有效，将视频帧转换为图片帧，启动视频帧读取子线程，当视频读取结束后，视频帧读取子线程会结束
-            if not self.selected_model_name:
-                self.reader_thread = threading.Thread(target=frame_reader,args=(True,))
-            else:
-                self.reader_thread = threading.Thread(target=frame_reader,)
-            self.reader_thread.daemon = True
-            self.reader_thread.start()
+                    yield frame_index, frame
+
+            # 1. 判断模型是否有效，启动解码/预处理/推理流水线，图片读取结束后流水线自动结束
+            self.start_frame_pipeline(frame_source(), pure_frames_cutting=not self.selected_model_name)
 
             # 2. 从视频帧队列中提取帧
-            # 2.1 先提取第一帧
-            frame = self.frame_queue.get()
-            self.video_frames.append(frame)
+            # 2.1 先提取第一帧（等待第一帧识别完成，以便显示时带有标注）
+            item = self.wait_first_frame()
+            if item is not None:
+                self.video_frames.put(*item)
 
             # 更新界面显示
             if self.video_frames:
@@ -1213,10 +1630,9 @@ class BoxAnnotationTool(QMainWindow):
     def load_video_frames(self):
         """按帧率从视频中提取帧"""
         # 清空之前的帧数据
-        self.video_frames = []
+        self.video_frames.clear()
         self.current_frame_index = 0
-        self.original_annotations = {}
-        self.annotations = {}
+        self.annotations = AnnotationStore()
         try:
             # 图像格式
             image_extensions = ['.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.tif']
@@ -1235,49 +1651,63 @@ class BoxAnnotationTool(QMainWindow):
                 return
             # 读取视频信息，直接从视频文件的元数据获取信息，这是一个高效信息
             self.frame_rate = int(self.cap.get(cv2.CAP_PROP_FPS))
-            # 处理总帧数等于视频总帧数除以间隔并向上取整
-            # self.total_frame_count = int(math.ceil(cap.get(cv2.CAP_PROP_FRAME_COUNT)/self.video_frame_selection_interval))
-
-            # 图片帧读取线程    
-            def frame_reader(cap:cv2.VideoCapture, pure_frames_cutting=False):
-                frame_count = 0
-                self.loading = True
-                while cap.isOpened():
-                    ret, frame = cap.read()
-                    if not ret:
-                        break
-                    # 从第一张开始，每隔k张读取一帧
-                    if frame_count % self.video_frame_selection_interval == 0:
-                        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                        if not pure_frames_cutting:
-                            # 解析当前帧的标注信息
-                            result = self.Extract_the_annotation_information(frame)
-                            # 保存当前帧的标注信息
-                            self.Save_model_recognition_annotations(result, int((frame_count / self.video_frame_selection_interval)))
-                        self.frame_queue.put(frame)
-                        self.total_frame_count += 1
-                    frame_count += 1
-                    # 实时更新界面显示
-                    self.frame_num_value.setText(f"{self.current_frame_index + 1}/{self.total_frame_count} (加载中...)")
-                # 视频帧读取完毕后，放入None作为结束信号
-                self.frame_queue.put(None)
-                self.loading = False
-                # 通知主线程更新界面（加载完成）
-                self.frame_num_value.setText(f"{self.current_frame_index + 1}/{self.total_frame_count}")
-                cap.release()
-
-            # 1. 先判断模型是否有效，将视频帧转换为图片帧，启动视频帧读取子线程，当视频读取结束后，视频帧读取子线程会结束
-            if not self.selected_model_name:
-                self.reader_thread = threading.Thread(target=frame_reader,args=(self.cap, True,))
-            else:
-                self.reader_thread = threading.Thread(target=frame_reader, args=(self.cap,))
-            self.reader_thread.daemon = True
-            self.reader_thread.start()
+            # 采样帧寻址索引：先按容器元数据估计总帧数（视频总帧数除以间隔并向上取整），
+            # 数据包扫描在后台进行，不阻塞第一帧的显示；读取结束后再以实际读取的帧数为准
+            self.seek_index = video_io.VideoSeekIndex.build(self.video_path, self.video_frame_selection_interval,
+                                                            background=True)
+            self.total_frame_count = len(self.seek_index)
+            # 读取线程尚未送达的帧通过寻址索引按需解码
+            self.video_frames.loader = self.seek_index.read
+            # 在模型结果送达之前恢复上次的标注，恢复的帧不会被模型结果覆盖
+            self.open_journal()
+
+            # 自适应采样：重新打开同一视频时先按上次记录的采样帧读取，帧序号与恢复的标注保持一致；
+            # 没有采样记录但日志中已有标注（固定间隔时期的标注）时继续使用固定间隔
+            seek_index, sampler, planned = self.seek_index, None, []
+            samples_path = self.sample_plan_path()
+            if self.config['adaptive_sampling']:
+                planned = video_io.VideoSeekIndex.load_samples(samples_path) or []
+                if planned or not (len(self.annotations) or self.key_frames):
+                    sampler = video_io.AdaptiveSampler(self.config['sampling_min_interval'],
+                                                       self.config['sampling_max_interval'])
+                    # 记录中的采样帧可以立即按需解码；计划之外的采样位置要等读取到才知道，
+                    # 总帧数先取已知的采样帧数，之后随读取逐帧增加
+                    seek_index.sample_frames = list(planned)
+                    self.total_frame_count = len(planned)
+
+            # 视频帧读取（流水线的解码阶段），读取结束或被取消时在解码线程内释放视频
+            def frame_source(cap:cv2.VideoCapture):
+                try:
+                    if sampler is None:
+                        # 从第一张开始，每隔k张读取一帧，未采样的帧只跳过不解码
+                        frames = video_io.iter_sampled_frames(cap, self.video_frame_selection_interval)
+                    else:
+                        frames = video_io.iter_adaptive_frames(cap, sampler, planned)
+                    for sample_index, source_frame, frame in frames:
+                        if sampler is not None and sample_index >= len(planned):
+                            seek_index.sample_frames.append(source_frame)
+                            self.total_frame_count = len(seek_index.sample_frames)
+                        yield sample_index, frame
+                finally:
+                    cap.release()
+                    # 记录采样帧号；中途取消时不覆盖更完整的记录
+                    if sampler is not None and len(seek_index.sample_frames) > len(planned):
+                        try:
+                            seek_index.save_samples(samples_path)
+                        except OSError as e:
+                            print(f"保存采样记录时出错: {e}")
+
+            # 1. 先判断模型是否有效，启动解码/预处理/推理流水线，当视频读取结束后，流水线和读取子线程会结束
+            self.start_frame_pipeline(frame_source(self.cap), pure_frames_cutting=not self.selected_model_name,
+                                      tracking=self.config['tracker_enabled'],
+                                      change_threshold=self.scene_change_threshold(self.video_path),
+                                      sampler=sampler, exact_count=True)
 
             # 2. 从视频帧队列中提取帧
-            # 2.1 先提取第一帧
-            frame = self.frame_queue.get()
-            self.video_frames.append(frame)
+            # 2.1 先提取第一帧（等待第一帧识别完成，以便显示时带有标注）
+            item = self.wait_first_frame()
+            if item is not None:
+                self.video_frames.put(*item)
             
             # 更新第一帧界面显示
             if self.video_frames:
@@ -1296,74 +1726,82 @@ class BoxAnnotationTool(QMainWindow):
     # 显示当前图片帧（⭐⭐⭐⭐⭐）
     def display_current_frame(self):
         """显示当前帧，并绘制标注"""
+        # 本次同步重绘已包含最新状态，排队中的重绘不再需要
+        self.redraw_scheduler.cancel()
         # 可以直接从已经被yolov8处理过的帧提取结果
-        if 0 <= self.current_frame_index < len(self.video_frames):
-            frame = self.video_frames[self.current_frame_index].copy()
-            # 转换为QImage
-            height, width, channel = frame.shape
-            bytes_per_line = 3 * width
+        frame = self.get_frame(self.current_frame_index)
+        if frame is not None:
+            # 只有切换帧或显示区域尺寸变化时才重新缩放底图，标注框的变化只重绘覆盖层
+            self.video_display.set_frame((self.current_frame_index, id(frame)), frame)
 
             # 绘制已有的标注（包含yolov8识别结果）,已包含拖动的标注框
-            if self.current_frame_index in self.annotations:
-                for annotation in self.annotations[self.current_frame_index]:
-                    # 绘制矩形
-                    color = annotation['color']
-                    thickness = 2
-                    # 如果是当前被选中的标注框，高亮显示
-                    if annotation == self.selected_annotation:
-                        thickness = 3  # 红色
-                    cv2.rectangle(frame, (annotation['x1'], annotation['y1']), 
-                                  (annotation['x2'], annotation['y2']), color, thickness)
-                    '''
-                    # 绘制标签
-                    label_text = f"{annotation['id']}"
-                    cv2.putText(frame, label_text, (annotation['x1'], annotation['y1'] - 10), 
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-                    '''
-                    # 绘制标签，包含标签和类别信息
-                    class_name = self.classes.get(annotation['class_id'], annotation['class_id'])
-                    # 为了避免OpenCV的中文显示问题，使用英文格式
-                    label_text = f"pig{annotation['id']}: {class_name}"
-                    # 增大字体大小到0.8，调整位置在方框左上角
-                    font_scale = 0.8
-                    font_thickness = 2
-                    # 添加标签背景以提高可读性
-                    (text_width, text_height), baseline = cv2.getTextSize(label_text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, font_thickness)
-                    text_x = annotation['x1']
-                    text_y = annotation['y1'] - 5 if annotation['y1'] > text_height + 10 else annotation['y1'] + text_height + 15
-                    # 绘制背景矩形
-                    cv2.rectangle(frame, (text_x - 3, text_y - text_height - baseline), 
-                                  (text_x + text_width + 3, text_y + 3), (255, 255, 255), -1)
-                    # 绘制边框
-                    cv2.rectangle(frame, (text_x - 3, text_y - text_height - baseline), 
-                                  (text_x + text_width + 3, text_y + 3), color, 1)
-                    # 绘制文本 - OpenCV默认字体不支持中文，所以使用英文
-                    cv2.putText(frame, label_text, (text_x, text_y), 
-                                cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0, 0, 0), font_thickness)
-                    
+            boxes = self.overlay_boxes(self.annotations.get(self.current_frame_index, []), self.selected_annotation)
+
             # 绘制正在绘制的矩形
+            rubber_band = None
             if self.drawing and self.start_point and self.end_point:
-                cv2.rectangle(frame, (self.start_point.x(), self.start_point.y()),
-                              (self.end_point.x(), self.end_point.y()), 
-                              (self.current_color.red(), self.current_color.green(), self.current_color.blue()), 2)
-            
-            # 获取视频显示区域的大小
-            display_width = self.video_display.width()
-            display_height = self.video_display.height()
-
-            q_image = QImage(frame.data, width, height, bytes_per_line, QImage.Format_RGB888)
-            scaled_image = q_image.scaled(display_width,display_height, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+                rubber_band = (self.start_point.x(), self.start_point.y(),
+                               self.end_point.x(), self.end_point.y(), QColor(self.current_color))
+
+            self.video_display.set_overlay(boxes, rubber_band)
+
+    # 标注框转换为覆盖层的绘制参数
+    def overlay_boxes(self, annotations, selected=None, color_key='color'):
+        """返回[(x1, y1, x2, y2, 颜色, 线宽, 标签文本)]，界面显示和导出标注视频共用"""
+        boxes = []
+        for annotation in annotations:
+            # 如果是当前被选中的标注框，加粗显示
+            thickness = 3 if annotation == selected else 2
+            # 标签包含编号和类别信息
+            class_name = self.classes.get(annotation['class_id'], annotation['class_id'])
+            label_text = f"pig{annotation['id']}: {class_name}"
+            boxes.append((annotation['x1'], annotation['y1'], annotation['x2'], annotation['y2'],
+                          tuple(annotation[color_key]), thickness, label_text))
+        return boxes
+
+    # 请求重绘当前帧
+    def request_redraw(self):
+        """标记当前帧需要重绘，同一刷新间隔内的多次请求只重绘一次"""
+        self.redraw_scheduler.request()
+
+    # 获取指定帧（⭐⭐⭐）
+    def get_frame(self, index):
+        """获取指定帧：先转存帧队列中已就绪的帧，仍缺失时按需解码，不再阻塞等待帧队列"""
+        self.drain_frame_queue()
+        if not 0 <= index < self.total_frame_count:
+            return None
+        try:
+            return self.video_frames[index]
+        except IndexError:
+            return None
 
-            self.video_display.setPixmap(QPixmap.fromImage(scaled_image))
+    # 将帧队列中已就绪的帧转存到帧存储
+    def drain_frame_queue(self):
+        """非阻塞地取出帧队列中所有已就绪的帧"""
+        while True:
+            try:
+                item = self.frame_queue.get_nowait()
+            except Empty:
+                return
+            if item is not None:
+                self.video_frames.put(*item)
 
     # 更新当前帧的图片信息（视频名称、总帧数、当前帧数、是否为关键帧、fps、当前标注框的类别和标签），同时更新右侧的类别标签
     def update_frame_info(self):
         """更新帧信息显示"""
         self.video_id_value.setText(str(self.video_path.split('/')[-1]).split('.')[0])
+        frame_text = f"{self.current_frame_index + 1}/{self.total_frame_count}"
+        # 视频帧附带其在源视频中的时间
+        if self.seek_index is not None and self.current_frame_index < len(self.seek_index):
+            seconds = self.seek_index.timestamp(self.current_frame_index)
+            if seconds is not None:
+                frame_text += f" [{int(seconds // 60):02d}:{seconds % 60:05.2f}]"
+        if self.current_frame_index in self.interpolated_frames:
+            frame_text += " (插值)"
         if self.loading:
-            self.frame_num_value.setText(f"{self.current_frame_index + 1}/{self.total_frame_count} (加载中...)")
+            self.frame_num_value.setText(f"{frame_text} (加载中...)")
         else:
-            self.frame_num_value.setText(f"{self.current_frame_index + 1}/{self.total_frame_count}")
+            self.frame_num_value.setText(frame_text)
         self.fps_value.setText(str(self.frame_rate))
         self.essential_frame_checkbox.setChecked(self.key_frames.get(self.current_frame_index, False))
         if  self.current_frame_index in self.annotations and self.annotations[self.current_frame_index]:
@@ -1448,6 +1886,85 @@ class BoxAnnotationTool(QMainWindow):
         if self.weight_input.hasFocus():
             self.weight_input.clearFocus()
 
+    # 打开当前视频的标注操作日志，恢复上次未保存的编辑
+    def open_journal(self):
+        """重新打开同一视频时，从日志恢复标注和关键帧状态"""
+        self.close_journal()
+        try:
+            path_prefix = AnnotationJournal.path_for(self.config['output_txt_path'], self.video_path)
+            self.journal = AnnotationJournal(path_prefix, self.config['journal_compact_every'])
+            frames, key_frames, interpolated = self.journal.load()
+        except (OSError, ValueError, KeyError, IndexError, TypeError) as e:
+            print(f"读取标注日志时出错: {e}")
+            self.journal = None
+            return
+        for frame_index, boxes in frames.items():
+            self.annotations[frame_index] = boxes
+        self.key_frames.update(key_frames)
+        self.interpolated_frames.update(interpolated)
+        if frames or key_frames:
+            self.statusBar().showMessage(f"已从日志恢复 {len(frames)} 帧的标注")
+
+    def close_journal(self):
+        """压缩并关闭日志"""
+        if self.journal is not None:
+            try:
+                self.journal.close(self.annotations, self.key_frames, self.interpolated_frames)
+            except OSError as e:
+                print(f"关闭标注日志时出错: {e}")
+            self.journal = None
+
+    # 把当前帧的一次编辑写入日志
+    def journal_edit(self, op, *args):
+        if self.journal is None:
+            return
+        try:
+            self.journal.record(self.current_frame_index, op, *args,
+                                boxes=self.annotations.get(self.current_frame_index))
+            if self.journal.needs_compaction():
+                self.journal.compact(self.annotations, self.key_frames, self.interpolated_frames)
+        except OSError as e:
+            print(f"写入标注日志时出错: {e}")
+
+    # 拖动或扩缩结束后把标注框的坐标写入日志
+    def journal_box(self, annotation):
+        boxes = self.annotations.get(self.current_frame_index, [])
+        for position, box in enumerate(boxes):
+            if box is annotation:
+                self.journal_edit('box', position, int(box['x1']), int(box['y1']), int(box['x2']), int(box['y2']))
+                return
+
+    # 本次标注会话的输出目录
+    def session_output_dirs(self):
+        """返回(txt目录, json目录)，同一视频的所有保存都写入视频名称加第一次保存时间戳的同一个目录"""
+        video_name = os.path.splitext(os.path.basename(self.video_path))[0]
+        # 确保输出目录存在，使用视频名称加时间戳作为子文件夹
+        if self.saving_timestamp is None:
+            self.saving_timestamp = time.strftime("%Y%m%d%H%M%S", time.localtime())
+        # 创建输出目录下的二级目录
+        file_name = video_name + '_' + self.saving_timestamp
+        # 创建两个不同的目录，分别用于保存txt和json文件
+        txt_output_dir, json_output_dir = annotation_io.make_output_dirs(self.config['output_txt_path'], file_name)
+        # 切换到新的输出目录时，之前保存的帧都需要重新写出
+        output_dir = os.path.dirname(txt_output_dir)
+        if output_dir != self.saved_output_dir:
+            self.saved_output_dir = output_dir
+            self.saved_frame_indexes = set()
+        # 自适应采样时一并写出采样帧号，导出工具据此把帧序号换算回源视频帧号和时间
+        if self.seek_index is not None and self.seek_index.sample_frames is not None:
+            self.seek_index.save_samples(os.path.join(output_dir, video_io.SAMPLES_NAME))
+        return txt_output_dir, json_output_dir
+
+    # 当前视频的采样记录路径（与标注日志放在一起）
+    def sample_plan_path(self):
+        return AnnotationJournal.path_for(self.config['output_txt_path'], self.video_path) + '.' + video_io.SAMPLES_NAME
+
+    # 本次会话输出目录下的单文件容器路径，未启用时返回None
+    def container_path(self):
+        if not self.config['save_container'] or self.saved_output_dir is None:
+            return None
+        return os.path.join(self.saved_output_dir, project_container.CONTAINER_NAME)
+
     # 保存项目标注信息到txt和json文件
     def save_project(self):
         """保存标注信息到txt和json文件,每个帧一个文件,txt和json分开保存"""
@@ -1457,95 +1974,183 @@ class BoxAnnotationTool(QMainWindow):
         if not video_name:
             QMessageBox.warning(self, "视频名称为空", "请先加载视频文件。")
             return
-        # 确保输出目录存在，使用视频名称加时间戳作为子文件夹
-        if self.saving_timestamp is None:
-            self.saving_timestamp = time.strftime("%Y%m%d%H%M%S", time.localtime())
-        # 创建输出目录下的二级目录
-        file_name = video_name + '_' + self.saving_timestamp
-        
-        # 创建两个不同的目录，分别用于保存txt和json文件
-        txt_output_dir = os.path.join(self.config['output_txt_path'], file_name, 'txt')
-        json_output_dir = os.path.join(self.config['output_txt_path'], file_name, 'json')
-        
-        # 创建目录
-        if not os.path.exists(txt_output_dir):
-            os.makedirs(txt_output_dir)
-        if not os.path.exists(json_output_dir):
-            os.makedirs(json_output_dir)
-
-        # 准备保存的数据
-        project_data = {
-            # 基本配置信息，实际不输出，先保留
-            'video_path': self.video_path,
-            'frame_rate': self.frame_rate,
-            'total_frames': self.total_frame_count,
-            # 图片帧标注信息
-            'annotations': self.annotations
-        }
+        try:
+            txt_output_dir, json_output_dir = self.session_output_dirs()
+        except OSError as e:
+            QMessageBox.warning(self, "错误", f"保存项目时出错: {e}")
+            return
+
+        # 第一次保存到该目录时写出全部关键帧，之后只写出上次保存以来修改过的帧
+        dirty = self.annotations.dirty_frames()
+        # 应当有输出文件的帧：是关键帧且有标注
+        target = {int(frame_idx) for frame_idx, is_key in self.key_frames.items()
+                  if is_key and int(frame_idx) in self.annotations}
+        to_write = sorted((target - self.saved_frame_indexes) | (target & dirty))
+        # 不再是关键帧（或标注被清空）的帧，删除之前保存的文件
+        to_remove = sorted(self.saved_frame_indexes - target)
+
+        if not to_write and not to_remove:
+            self.annotations.clear_dirty(dirty)
+            self.statusBar().showMessage("没有需要保存的修改")
+            return
 
-        # 保存到TXT和JSON文件，每个帧一个文件
+        # 在界面线程只复制标注快照，文件由后台线程写出；写出失败的帧会在on_save_failed中重新标记为已修改
+        frame_size = self.video_frames[0].shape[:2] if self.video_frames else None
+        writes = {frame_idx: ProjectWriter.snapshot(self.annotations[frame_idx]) for frame_idx in to_write}
+        self.project_writer.submit(txt_output_dir, json_output_dir, frame_size, writes, to_remove, self.container_path())
+        self.saved_frame_indexes.update(to_write)
+        self.saved_frame_indexes.difference_update(to_remove)
+        self.annotations.clear_dirty(dirty)
+        self.statusBar().showMessage(f"正在保存 {len(to_write)} 个关键帧到 {self.saved_output_dir}")
+
+    # 保存当前帧的标注信息
+    def save_current_frame_annotation(self):
+        """把当前关键帧的标注写入本次会话的输出目录"""
+        # 检查当前帧是否有关键帧标记，以及是否有标注数据
+        if not self.video_path or not self.key_frames.get(self.current_frame_index, False) \
+                or self.current_frame_index not in self.annotations:
+            return
         try:
-            for frame_idx, annotations in project_data['annotations'].items():
-                # 将frame_idx从浮点数转换为整数
-                frame_idx_int = int(frame_idx)
-                # 第一步检查，判断当前帧是否为关键帧，如果不是则跳过不输出
-                if not self.key_frames.get(frame_idx_int, False):
-                    continue
+            txt_output_dir, json_output_dir = self.session_output_dirs()
+        except OSError as e:
+            # 静默处理错误，不影响用户体验
+            print(f"保存当前帧标注时出错: {e}")
+            return
+        frame_size = self.video_frames[0].shape[:2] if self.video_frames else None
+        snapshot = ProjectWriter.snapshot(self.annotations[self.current_frame_index])
+        self.project_writer.submit(txt_output_dir, json_output_dir, frame_size, {self.current_frame_index: snapshot},
+                                   container_path=self.container_path())
+        self.saved_frame_indexes.add(self.current_frame_index)
+        self.annotations.clear_dirty([self.current_frame_index])
+
+    # 后台写出线程的信号处理（在界面线程执行）
+    def on_save_progress(self, done, total):
+        self.statusBar().showMessage(f"正在保存标注：{done}/{total}")
+
+    def on_save_finished(self, written, removed):
+        self.statusBar().showMessage(f"已保存：写入 {written} 个文件，删除 {removed} 个文件")
+
+    def on_save_failed(self, txt_output_dir, message, frames):
+        # 仍是当前会话目录时，写出失败的帧重新标记为已修改，下次保存时重试
+        if os.path.dirname(txt_output_dir) == self.saved_output_dir:
+            self.saved_frame_indexes.difference_update(frames)
+            self.annotations.mark_dirty(*frames)
+        QMessageBox.warning(self, "错误", f"保存项目时出错（{len(frames)} 帧未写出）: {message}")
+
+    # 在后台线程执行导出等耗时任务，显示可取消的进度对话框
+    def run_background_task(self, title, target, on_finished, *args, **kwargs):
+        """同一时间只执行一个后台任务，返回是否已启动"""
+        if self.background_task is not None and self.background_task.is_running():
+            QMessageBox.information(self, "提示", "已有后台任务正在执行，请等待完成或取消后再试")
+            return False
+        task = BackgroundTask(target, self)
+        dialog = QProgressDialog(title, "取消", 0, 0, self)
+        dialog.setWindowTitle(title)
+        dialog.setWindowModality(Qt.NonModal)
+        dialog.setMinimumDuration(0)
+        dialog.canceled.connect(task.cancel)
+
+        def on_progress(done, total):
+            dialog.setMaximum(total)
+            dialog.setValue(done)
+            self.statusBar().showMessage(f"{title}：{done}/{total}")
+
+        def on_done(result):
+            dialog.reset()
+            on_finished(result, task.cancelled)
+
+        def on_failed(message):
+            dialog.reset()
+            self.statusBar().showMessage(f"{title}失败")
+            QMessageBox.warning(self, "错误", f"{title}时出错: {message}")
+
+        task.progress.connect(on_progress)
+        task.finished.connect(on_done)
+        task.failed.connect(on_failed)
+        self.background_task, self.progress_dialog = task, dialog
+        task.start(*args, **kwargs)
+        dialog.show()
+        return True
+
+    # 导出关键帧图片和YOLO标签
+    def export_dataset(self):
+        """把当前视频有标注的关键帧图片和YOLO标签导出为训练数据集"""
+        if not self.video_path or not self.total_frame_count:
+            QMessageBox.warning(self, "提示", "请先加载视频文件。")
+            return
+        # 在界面线程取得标注快照，之后的编辑不影响本次导出
+        frame_size = self.video_frames[0].shape[:2] if self.video_frames else None
+        labels = {int(frame_idx): annotation_io.normalize_annotations(ProjectWriter.snapshot(self.annotations[int(frame_idx)]), frame_size)
+                  for frame_idx, is_key in self.key_frames.items() if is_key and int(frame_idx) in self.annotations}
+        if not labels:
+            QMessageBox.information(self, "提示", "没有带标注的关键帧可以导出")
+            return
+        output_dir = QFileDialog.getExistingDirectory(self, "选择数据集输出目录", self.config['output_txt_path'])
+        if not output_dir:
+            return
 
-                # 为每个帧创建单独的TXT文件，文件名格式为frame_xxxxx.txt
-                txt_file_name = f"frame_{frame_idx_int:05d}.txt"
-                txt_file_path = os.path.join(txt_output_dir, txt_file_name)
-                
-                # 为每个帧创建单独的JSON文件，文件名格式为frame_xxxxx.json
-                json_file_name = f"frame_{frame_idx_int:05d}.json"
-                json_file_path = os.path.join(json_output_dir, json_file_name)
-                
-                # 存储单帧JSON数据
-                json_single_frame_data = []
-                
-                # 输出txt文件
-                with open(txt_file_path, 'w', encoding='utf-8') as f:
-                    # 处理当前帧的所有标注信息
-                    for ann in annotations:
-                        x_min, y_min = ann['x1'], ann['y1']
-                        x_max, y_max = ann['x2'], ann['y2']
-                        class_id = ann['class_id']
-                        text = ann['text']
-                        # 获取原始视频帧的尺寸（从第一帧获取）
-                        if self.video_frames:
-                            frame_height, frame_width = self.video_frames[0].shape[:2]
-                            # 计算归一化坐标
-                            x_center = (x_min + x_max) / 2 / frame_width
-                            y_center = (y_min + y_max) / 2 / frame_height
-                            width = (x_max - x_min) / frame_width
-                            height = (y_max - y_min) / frame_height
-                        else:
-                            x_center = 0
-                            y_center = 0
-                            width = 0
-                            height = 0
-                        # 写入JSON数据中
-                        json_single_frame_data.append({
-                            'class_id': class_id,
-                            'x_center': x_center,
-                            'y_center': y_center,
-                            'width': width,
-                            'height': height,
-                            'text': text,
-                        })
-                        f.write(f"{class_id},{x_center:.6f},{y_center:.6f},{width:.6f},{height:.6f},{text}\n")
-                
-                # 写入单帧JSON文件
-                with open(json_file_path, 'w', encoding='utf-8') as f:
-                    json.dump(json_single_frame_data, f, ensure_ascii=False, indent=4)
-                
-                # 清空单帧数据
-                json_single_frame_data = []
-                
-            # 显示成功消息
-            QMessageBox.information(self, "成功", f"所有关键帧已保存\nTXT文件目录: {txt_output_dir}\nJSON文件目录: {json_output_dir}")
-        except Exception as e:
-            QMessageBox.warning(self, "错误", f"保存项目时出错: {e}")
+        # 视频用独立的解码器按关键帧索引读取；图片集直接读取图片文件
+        if os.path.isfile(self.video_path) and os.path.splitext(self.video_path)[1].lower() in ('.mp4', '.avi', '.mov', '.mkv'):
+            sample_frames = list(self.seek_index.sample_frames) if self.seek_index and self.seek_index.sample_frames is not None else None
+            frames = dataset_export.iter_video_frames(self.video_path, self.video_frame_selection_interval, labels,
+                                                      sample_frames)
+        else:
+            loader = self.video_frames.loader
+            frames = ((frame_idx, cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+                      for frame_idx in sorted(labels) for frame in [loader(frame_idx)] if frame is not None)
+        prefix = os.path.splitext(os.path.basename(os.path.normpath(self.video_path)))[0] + '_'
+
+        def on_finished(counts, cancelled):
+            state = "已取消" if cancelled else "完成"
+            message = f"导出{state}：训练集 {counts['train']} 帧，验证集 {counts['val']} 帧"
+            self.statusBar().showMessage(message)
+            if not cancelled:
+                QMessageBox.information(self, "导出完成", f"{message}\n输出目录: {output_dir}")
+
+        self.run_background_task("导出训练数据集", dataset_export.export_dataset, on_finished,
+                                 frames, labels, output_dir, classes=self.classes, prefix=prefix,
+                                 image_format=self.config['dataset_image_format'],
+                                 max_size=self.config['dataset_max_size'],
+                                 val_ratio=self.config['dataset_val_ratio'],
+                                 workers=self.config['dataset_workers'])
+
+    # 导出绘制了标注的视频
+    def export_annotated_video(self):
+        """把当前标注绘制到视频的采样帧上，编码输出到输出视频目录"""
+        if not self.video_path or not os.path.isfile(self.video_path) or \
+                os.path.splitext(self.video_path)[1].lower() not in ('.mp4', '.avi', '.mov', '.mkv'):
+            QMessageBox.warning(self, "提示", "请先加载视频文件。")
+            return
+        # 在界面线程取得标注快照（按原有颜色绘制，不包含选中高亮），未编辑的帧不会因此生成可编辑列表
+        overlays = {frame_idx: self.overlay_boxes(self.annotations.peek(frame_idx), color_key='original_color')
+                    for frame_idx in self.annotations}
+        try:
+            os.makedirs(self.config['output_video_path'], exist_ok=True)
+        except OSError as e:
+            QMessageBox.warning(self, "错误", f"无法创建输出目录: {e}")
+            return
+        video_name = os.path.splitext(os.path.basename(self.video_path))[0]
+        timestamp = time.strftime("%Y%m%d%H%M%S", time.localtime())
+        output_path = os.path.join(self.config['output_video_path'], f"{video_name}_annotated_{timestamp}.mp4")
+        # 同一秒内多次导出时不覆盖之前的文件
+        suffix = 1
+        while os.path.exists(output_path):
+            output_path = os.path.join(self.config['output_video_path'], f"{video_name}_annotated_{timestamp}_{suffix}.mp4")
+            suffix += 1
+        # 只输出采样帧，帧率相应降低，播放速度与原视频一致；自适应采样时按最小间隔输出，间隔较大的帧重复写出
+        sample_frames = list(self.seek_index.sample_frames) if self.seek_index and self.seek_index.sample_frames is not None else None
+        interval = self.config['sampling_min_interval'] if sample_frames is not None else self.video_frame_selection_interval
+        fps = self.frame_rate / interval
+
+        def on_finished(written, cancelled):
+            state = "已取消" if cancelled else "完成"
+            message = f"标注视频导出{state}：{written} 帧 -> {output_path}"
+            self.statusBar().showMessage(message)
+            if not cancelled:
+                QMessageBox.information(self, "导出完成", message)
+
+        self.run_background_task("导出标注视频", video_renderer.render_video, on_finished,
+                                 self.video_path, interval, overlays, output_path, fps, sample_frames=sample_frames)
 
     # 显示关于对话框（目前直接pass）
     def show_about(self):
@@ -1553,6 +2158,106 @@ class BoxAnnotationTool(QMainWindow):
         # 具体实现代码暂不生成
         pass
 
+    # 帧序号在源视频时间轴上的位置，按实际间隔插值（自适应采样时各帧间隔不同）
+    def frame_times(self, frame_indexes):
+        frame_indexes = np.asarray(frame_indexes, dtype=np.int64)
+        sample_frames = self.seek_index.sample_frames if self.seek_index is not None else None
+        if sample_frames is not None and len(frame_indexes) and len(sample_frames) > frame_indexes.max():
+            return np.asarray(sample_frames, dtype=np.int64)[frame_indexes]
+        return frame_indexes
+
+    # 关键帧插值
+    def interpolate_key_frames(self):
+        """以当前关键帧和前后相邻关键帧中编号相同的标注框，填充它们之间各帧的标注（原有标注被替换），
+        生成的帧标记为插值帧，之后加载同一视频时这些帧不再推理；其中手动修改过的帧先询问是否覆盖"""
+        current = self.current_frame_index
+        if not self.key_frames.get(current, False):
+            QMessageBox.information(self, "提示", "请先把当前帧标记为关键帧，并修正其中的标注框。")
+            return
+        keys = sorted(int(frame_idx) for frame_idx, is_key in self.key_frames.items()
+                      if is_key and int(frame_idx) in self.annotations)
+        if current not in keys:
+            QMessageBox.information(self, "提示", "当前关键帧没有标注框。")
+            return
+        position = keys.index(current)
+        spans = [i for i in (position - 1, position) if i >= 0 and i + 1 < len(keys) and keys[i + 1] - keys[i] > 1]
+        if not spans:
+            QMessageBox.information(self, "提示", "当前关键帧前后没有可以插值的关键帧。")
+            return
+        # 插值按编号配对标注框；未开启跟踪时模型每帧重新编号，编号相同的框不一定是同一头猪
+        if not self.config['tracker_enabled']:
+            reply = QMessageBox.question(self, "编号可能不对应",
+                                         "未开启跟踪（tracker_enabled），各帧中同一头猪的编号可能不同，插值会把编号相同的框当作同一头猪。\n"
+                                         "请确认两端关键帧中同一头猪的编号一致，是否继续插值？",
+                                         QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if reply != QMessageBox.Yes:
+                return
+
+        # 关键帧的(时间, 编号, 框坐标)，超出范围时为None
+        def key_state(i):
+            if not 0 <= i < len(keys):
+                return None
+            boxes = self.annotations[keys[i]]
+            return (self.frame_times([keys[i]])[0], np.array([box['id'] for box in boxes], dtype=np.int64),
+                    np.array([[box['x1'], box['y1'], box['x2'], box['y2']] for box in boxes], dtype=np.float64))
+
+        edited = [frame_index for i in spans for frame_index in range(keys[i] + 1, keys[i + 1])
+                  if self.is_user_edited(frame_index)]
+        if edited:
+            reply = QMessageBox.question(self, "覆盖手动标注",
+                                         f"其中有 {len(edited)} 帧的标注已经手动修改过，是否用插值结果覆盖？\n"
+                                         f"选择“否”时跳过这些帧，只填充其余的帧。",
+                                         QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if reply == QMessageBox.Yes:
+                edited = []
+        edited = set(edited)
+
+        filled = []
+        for i in spans:
+            targets = np.arange(keys[i] + 1, keys[i + 1])
+            ids, rows, boxes = interpolation.interpolate_boxes(key_state(i), key_state(i + 1), self.frame_times(targets),
+                                                               self.config['interpolation_mode'],
+                                                               key_state(i - 1), key_state(i + 2))
+            # 类别、标签和体重等文本沿用前一个关键帧中同一编号的标注框
+            templates = [self.annotations[keys[i]][row] for row in rows.tolist()]
+            for frame_index, frame_boxes in zip(targets.tolist(), np.rint(boxes).astype(int).tolist()):
+                if frame_index in edited:
+                    continue
+                self.annotations[frame_index] = [Box(box['id'], box['class_id'], *xyxy, label=box['label'],
+                                                     text=box['text'], color=INTERPOLATED_COLOR)
+                                                 for box, xyxy in zip(templates, frame_boxes)]
+                filled.append(frame_index)
+        self.annotations.mark_dirty(*filled)
+        self.interpolated_frames.update(filled)
+        if self.journal is not None:
+            try:
+                for frame_index in filled:
+                    self.journal.record_frame(frame_index, self.annotations[frame_index])
+                    self.journal.record(frame_index, 'interp', True)
+                if self.journal.needs_compaction():
+                    self.journal.compact(self.annotations, self.key_frames, self.interpolated_frames)
+            except OSError as e:
+                print(f"写入标注日志时出错: {e}")
+        message = f"已插值 {len(filled)} 帧（{self.config['interpolation_mode']}）"
+        if edited:
+            message += f"，跳过手动修改过的 {len(edited)} 帧"
+        self.statusBar().showMessage(message)
+
+    # 用户是否手动修改过某一帧的标注
+    def is_user_edited(self, frame_index):
+        """ 插值生成的帧和未改动的模型识别结果不算；有标注但没有模型原始结果的帧视为手动标注 """
+        if frame_index in self.interpolated_frames or not self.annotations.is_materialized(frame_index):
+            return False
+        boxes = self.annotations[frame_index]
+        original = self.annotations.original(frame_index)
+        if original is None:
+            return bool(boxes)
+
+        def content(frame_boxes):
+            return [(box['id'], box['class_id'], box['x1'], box['y1'], box['x2'], box['y2'], box['text'])
+                    for box in frame_boxes]
+        return content(boxes) != content(original)
+
     # 更新当前帧的关键帧状态
     def update_essential_frame_state(self):
         """更新当前帧的关键帧状态"""
@@ -1560,9 +2265,11 @@ class BoxAnnotationTool(QMainWindow):
         is_essential = self.essential_frame_checkbox.isChecked()
         # 更新当前帧的关键帧状态
         self.key_frames[self.current_frame_index] = is_essential
+        self.journal_edit('key', is_essential)
         # 如果annotations中不存在当前帧的标注，创建一个空列表
         if self.current_frame_index not in self.annotations:
             self.annotations[self.current_frame_index] = []
+            self.journal_edit('frame')
 
     # 更新当前帧的体重信息
     def update_frame_weight(self, text):
@@ -1570,16 +2277,20 @@ class BoxAnnotationTool(QMainWindow):
         # 如果文本框非空，自动将当前帧标记为关键帧
         if text.strip() and not self.key_frames.get(self.current_frame_index, False):
             self.key_frames[self.current_frame_index] = True
+            self.journal_edit('key', True)
             self.essential_frame_checkbox.setChecked(True)
         # 如果文本框为空，自动将当前帧标记为非关键帧
         elif not text.strip():
             self.key_frames[self.current_frame_index] = False
+            self.journal_edit('key', False)
             self.essential_frame_checkbox.setChecked(False)
             
         # 更新标注数据中的体重信息
         if self.current_frame_index in self.annotations and self.annotations[self.current_frame_index]:
             # 将体重信息保存到第一个标注中（因为现在每帧只有一个输入框）
             self.annotations[self.current_frame_index][0]['text'] = text
+            self.annotations.mark_dirty(self.current_frame_index)
+            self.journal_edit('text', 0, text)
     
     # 更新类别标签高亮状态
     def update_category_labels_highlight(self, selected_annotation):
@@ -1662,8 +2373,8 @@ class BoxAnnotationTool(QMainWindow):
                 mapped_point = self.map_to_original_frame(event.position().toPoint())
                 if mapped_point.x() != -1 and mapped_point.y() != -1:
                     self.end_point = mapped_point
-                    # 重绘当前帧
-                    self.display_current_frame()
+                    # 请求重绘当前帧（合并到下一次刷新）
+                    self.request_redraw()
                 return True
             elif event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton and self.drawing:
                 # 鼠标释放，结束绘制
@@ -1711,12 +2422,15 @@ class BoxAnnotationTool(QMainWindow):
             elif event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton:
                 if self.dragging:
                     self.dragging = False
+                    # 拖动结束时把最终位置写入日志
+                    self.journal_box(self.dragging_annotation)
                     # 清除当前拖动的标注框
                     self.dragging_annotation = None
                     # 恢复手掌光标
                     self.video_display.setCursor(QCursor(Qt.OpenHandCursor))
                 elif self.resizing:
                     self.resizing = False
+                    self.journal_box(self.resizing_annotation)
                     # 清除当前扩缩的标注框
                     self.resizing_annotation = None
                     # 清除扩缩锚点
@@ -1736,15 +2450,15 @@ class BoxAnnotationTool(QMainWindow):
         if self.dragging:
             # 计算新的标注框位置
             self.mouse_drag(mapped_point)
-            # 重绘当前帧
-            self.display_current_frame()
+            # 请求重绘当前帧（合并到下一次刷新）
+            self.request_redraw()
             return
         # 当前处于扩缩状态
         if self.resizing:
             # 计算新的标注框位置
             self.mouse_resize(mapped_point)
-            # 重绘当前帧
-            self.display_current_frame()
+            # 请求重绘当前帧（合并到下一次刷新）
+            self.request_redraw()
             return
         # 处于悬停状态
         if self.current_frame_index in self.annotations:
@@ -1788,6 +2502,19 @@ class BoxAnnotationTool(QMainWindow):
     def closeEvent(self, event):
         """重写窗口关闭事件，清理资源和终止线程"""
         self.clear_video_resources()
+        # 等待已提交的标注文件写完
+        self.project_writer.shutdown()
+        # 取消正在执行的导出任务
+        if self.background_task is not None:
+            self.background_task.cancel()
+            self.background_task.wait(5.0)
+        # 关闭推理工作进程并释放共享内存
+        with self.inference_pool_lock:
+            if self.inference_pool is not None:
+                self.inference_pool.shutdown()
+                self.inference_pool = None
+        if self.detection_cache is not None:
+            self.detection_cache.close()
         # 接受关闭事件
         event.accept()
         # 调用父类的关闭事件处理
@@ -1796,20 +2523,34 @@ class BoxAnnotationTool(QMainWindow):
     # 清空视频资源和相关变量
     def clear_video_resources(self):
         """清空视频资源和相关变量"""
+        # 取消帧处理流水线，停止解码、预处理和推理
+        if self.frame_pipeline is not None:
+            self.frame_pipeline.cancel()
+            self.frame_pipeline = None
         # 清理线程资源
         if hasattr(self, 'reader_thread') and self.reader_thread.is_alive():
             if hasattr(self, 'cap') and self.cap.isOpened():
                 self.cap.release()
             self.reader_thread.join(timeout=1.0)
-        
-        # 清空视频相关变量
-        self.video_frames = []
+        self.loading = False
+        self.release_retired_inference_pools()
+        
+        # 压缩并关闭标注日志（在清空标注之前）
+        self.close_journal()
+        # 释放按需解码使用的寻址索引
+        if self.seek_index is not None:
+            self.seek_index.release()
+            self.seek_index = None
+        # 清空视频相关变量（同时删除磁盘缓存）
+        self.video_frames.clear()
         self.video_path = ""
         self.video_type = False
         self.current_frame_index = 0
         self.total_frame_count = 0
         self.frame_rate = 30  # 重置为默认值
         self.key_frames = {}
+        # 原地清空，已取消的流水线仍持有同一个集合
+        self.interpolated_frames.clear()
         
         # 清空队列
         while not self.frame_queue.empty():
@@ -1823,8 +2564,10 @@ class BoxAnnotationTool(QMainWindow):
         self.category_labels.clear()
         
         # 清空标注相关变量
-        self.original_annotations = {}
-        self.annotations = {}
+        self.annotations = AnnotationStore()
+        self.saved_output_dir = None
+        self.saved_frame_indexes = set()
+        self.annotation_grids = {}
         
         # 重置绘制和拖动状态
         self.drawing = False
@@ -1842,17 +2585,19 @@ class BoxAnnotationTool(QMainWindow):
         # 更新界面状态
         self.loading = False
         self.video_id_value.setText("")
+        self.video_display.clear_frame()
         self.video_display.setText("视频显示区域")  # 重置显示区域文本
         self.statusBar().showMessage("就绪")
 
     # 将显示窗口的坐标映射到原始视频帧的坐标
     def map_to_original_frame(self, point):
         """将显示窗口中的坐标映射到原始视频帧的坐标"""
-        if not self.video_frames or self.current_frame_index < 0 or self.current_frame_index >= len(self.video_frames):
+        frame = self.get_frame(self.current_frame_index)
+        if frame is None:
             return point
         
         # 获取原始视频帧的尺寸
-        original_height, original_width = self.video_frames[self.current_frame_index].shape[:2]
+        original_height, original_width = frame.shape[:2]
         
         # 获取显示窗口的尺寸
         display_width = self.video_display.width()
@@ -1909,6 +2654,9 @@ class BoxAnnotationTool(QMainWindow):
         self.dragging_annotation['y1'] = new_y1
         self.dragging_annotation['x2'] = new_x2
         self.dragging_annotation['y2'] = new_y2
+        # 同步更新命中检测索引，并标记当前帧已修改
+        self.annotation_grid().update(self.dragging_annotation)
+        self.annotations.mark_dirty(self.current_frame_index)
     
     # 实现鼠标调整标注框大小的方法
     def mouse_resize(self, mapped_point):
@@ -1945,55 +2693,41 @@ class BoxAnnotationTool(QMainWindow):
         self.resizing_annotation['y1'] = y1
         self.resizing_annotation['x2'] = x2
         self.resizing_annotation['y2'] = y2
+        # 同步更新命中检测索引，并标记当前帧已修改
+        self.annotation_grid().update(self.resizing_annotation)
+        self.annotations.mark_dirty(self.current_frame_index)
+
+    # 获取当前帧标注框的网格索引，标注列表被整体替换时重建
+    def annotation_grid(self, frame_index=None):
+        """获取指定帧（默认当前帧）标注框的网格索引"""
+        if frame_index is None:
+            frame_index = self.current_frame_index
+        annotations = self.annotations.get(frame_index, [])
+        grid = self.annotation_grids.get(frame_index)
+        if grid is None or not grid.is_current(annotations):
+            grid = AnnotationGrid(annotations)
+            self.annotation_grids[frame_index] = grid
+        return grid
 
     # 判断当前鼠标是否在标注框内
     def is_mouse_in_annotation_inner(self,mapped_point):
-        for anno in self.annotations[self.current_frame_index]:
-            x1, y1, x2, y2 = anno['x1'], anno['y1'], anno['x2'], anno['y2']
-            if x1 <= mapped_point.x() <= x2 and y1 <= mapped_point.y() <= y2:
-                # 记录当前鼠标位置与左上角的偏移量
-                offset = mapped_point - QPoint(x1, y1)
-                return True,anno,offset
-        return False,None,None
+        anno = self.annotation_grid().hit_inner(mapped_point.x(), mapped_point.y())
+        if anno is None:
+            return False,None,None
+        # 记录当前鼠标位置与左上角的偏移量
+        offset = mapped_point - QPoint(anno['x1'], anno['y1'])
+        return True,anno,offset
 
     # 判断当前鼠标是否在标注框的边缘（点击左鼠标时）
     def is_mouse_on_annotation_edge(self,mapped_point):
-        """判断当前鼠标是否在标注框的边缘"""
-        edge_margin = 10       # 边缘检测的像素宽度
-        for anno in self.annotations[self.current_frame_index]:
-            x1,y1,x2,y2 = anno['x1'],anno['y1'],anno['x2'],anno['y2']
-            mouse_x,mouse_y = mapped_point.x(),mapped_point.y()
-            # 检查鼠标是否在右下角边缘(se)
-            if (abs(mouse_x - x2) <= edge_margin and abs(mouse_y - y2) <= edge_margin):
-                return True,'se',anno
-            # 检查鼠标是否在右上角边缘(ne)
-            if (abs(mouse_x - x2) <= edge_margin and abs(mouse_y - y1) <= edge_margin):
-                return True,'ne',anno
-            # 检查鼠标是否在左下角边缘(sw)
-            if (abs(mouse_x - x1) <= edge_margin and abs(mouse_y - y2) <= edge_margin):
-                return True,'sw',anno
-            # 检查鼠标是否在左上角边缘(nw)
-            if (abs(mouse_x - x1) <= edge_margin and abs(mouse_y - y1) <= edge_margin):
-                return True,'nw',anno
-            # 检查是否在右边框上(e)
-            if (abs(mouse_x - x2) <= edge_margin and y1 <= mouse_y <= y2):
-                return True,'e',anno
-            # 检查是否在左边框上(w)
-            if (abs(mouse_x - x1) <= edge_margin and y1 <= mouse_y <= y2):
-                return True,'w',anno
-            # 检查是否在上边框上(n)
-            if (abs(mouse_y - y1) <= edge_margin and x1 <= mouse_x <= x2):
-                return True,'n',anno
-            # 检查是否在下边框上(s)
-            if (abs(mouse_y - y2) <= edge_margin and x1 <= mouse_x <= x2):
-                return True,'s',anno
-        return False,None,None
+        """判断当前鼠标是否在标注框的边缘，返回(是否命中, 边缘位置, 标注框)"""
+        return self.annotation_grid().hit_edge(mapped_point.x(), mapped_point.y())
 
     # 添加标注框
     def add_annotation(self):
         """添加标注框"""
         # 确保当前帧有视频数据
-        if not self.video_frames or self.current_frame_index < 0 or self.current_frame_index >= len(self.video_frames):
+        if self.get_frame(self.current_frame_index) is None:
             return
         
         # 计算当前帧的最大标注id,从1开始递增
@@ -2031,20 +2765,15 @@ class BoxAnnotationTool(QMainWindow):
         # 存储标注信息
         if self.current_frame_index not in self.annotations:
             self.annotations[self.current_frame_index] = []
-        self.annotations[self.current_frame_index].append({
-            'id': annotation_id,
-            'x1': x1,
-            'y1': y1,
-            'x2': x2,
-            'y2': y2,
-            'label': label,
-            'class_id': class_id,
-            'text': '',
-            # 标注框的颜色，将self.current_color转换为RGB元组
-            'color': (self.current_color.red(), self.current_color.green(), self.current_color.blue()),  # 默认是绿色
-            # 记录原有颜色
-            'original_color': (self.current_color.red(), self.current_color.green(), self.current_color.blue())  # 默认是绿色
-        })
+        # 标注框的颜色，将self.current_color转换为RGB元组（默认是绿色），同时作为原有颜色记录
+        annotation = Box(annotation_id, class_id, x1, y1, x2, y2, label=label,
+                         color=(self.current_color.red(), self.current_color.green(), self.current_color.blue()))
+        # 先取得索引再修改列表，索引只需增量插入新框
+        grid = self.annotation_grid()
+        self.annotations[self.current_frame_index].append(annotation)
+        grid.insert(annotation)
+        self.annotations.mark_dirty(self.current_frame_index)
+        self.journal_edit('add', box_row(annotation))
     
     # 删除标注框
     def delete_annotation(self,annotation=None):
@@ -2054,8 +2783,14 @@ class BoxAnnotationTool(QMainWindow):
         # 如果传入了具体的标注框，则判断是否是选中标注框
         if annotation and annotation != self.selected_annotation:
             return
-        # 从当前帧的标注列表中移除选中的标注框
-        self.annotations[self.current_frame_index].remove(self.selected_annotation)
+        # 从当前帧的标注列表中移除选中的标注框，同步更新命中检测索引
+        grid = self.annotation_grid()
+        boxes = self.annotations[self.current_frame_index]
+        position = next(i for i, box in enumerate(boxes) if box is self.selected_annotation)
+        del boxes[position]
+        grid.remove(self.selected_annotation)
+        self.annotations.mark_dirty(self.current_frame_index)
+        self.journal_edit('del', position)
 
         # 使用QListWidget的removeItemWidget方法删除对应的列表项，而不是重新渲染整个列表
         if self.selected_annotation['id'] in self.category_labels:
@@ -2130,6 +2865,7 @@ class BoxAnnotationTool(QMainWindow):
         # 检查当前帧是否有标注
         if self.current_frame_index in self.annotation_widgets:
             self.annotations[self.current_frame_index][annotation_id - 1]['text'] = text
+            self.annotations.mark_dirty(self.current_frame_index)
     
     # 由于我们已经删除了标注框列表，不再需要清除现有控件或管理布局
     # 关键帧的体重信息现在通过main_content中的weight_input控件管理
@@ -2178,86 +2914,6 @@ class BoxAnnotationTool(QMainWindow):
                 text_input.show()
     '''
 
-    # 保存当前帧的标注信息
-    def save_current_frame_annotation(self):
-        """保存当前帧的标注信息到txt和json文件"""
-        # 检查当前帧是否有关键帧标记
-        if not self.key_frames.get(self.current_frame_index, False):
-            return
-            
-        # 检查当前帧是否有标注数据
-        if self.current_frame_index not in self.annotations:
-            return
-            
-        try:
-            # 获取视频名称作为文件夹名
-            video_name = os.path.splitext(os.path.basename(self.video_path))[0]
-            timestamp = time.strftime("%Y%m%d%H%M%S", time.localtime())
-            file_name = video_name + '_' + timestamp
-            
-            # 创建两个不同的目录，分别用于保存txt和json文件
-            txt_output_dir = os.path.join(self.config['output_txt_path'], file_name, 'txt')
-            json_output_dir = os.path.join(self.config['output_txt_path'], file_name, 'json')
-            
-            # 创建目录
-            if not os.path.exists(txt_output_dir):
-                os.makedirs(txt_output_dir)
-            if not os.path.exists(json_output_dir):
-                os.makedirs(json_output_dir)
-                
-            # 为当前帧创建单独的TXT文件，文件名格式为frame_xxxxx.txt
-            txt_file_name = f"frame_{self.current_frame_index:05d}.txt"
-            txt_file_path = os.path.join(txt_output_dir, txt_file_name)
-            
-            # 为当前帧创建单独的JSON文件，文件名格式为frame_xxxxx.json
-            json_file_name = f"frame_{self.current_frame_index:05d}.json"
-            json_file_path = os.path.join(json_output_dir, json_file_name)
-            
-            # 存储单帧JSON数据
-            json_single_frame_data = []
-            
-            # 输出txt文件
-            with open(txt_file_path, 'w', encoding='utf-8') as f:
-                # 处理当前帧的所有标注信息
-                for ann in self.annotations[self.current_frame_index]:
-                    x_min, y_min = ann['x1'], ann['y1']
-                    x_max, y_max = ann['x2'], ann['y2']
-                    class_id = ann['class_id']
-                    text = ann['text']
-                    # 获取原始视频帧的尺寸（从第一帧获取）
-                    if self.video_frames:
-                        frame_height, frame_width = self.video_frames[0].shape[:2]
-                        # 计算归一化坐标
-                        x_center = (x_min + x_max) / 2 / frame_width
-                        y_center = (y_min + y_max) / 2 / frame_height
-                        width = (x_max - x_min) / frame_width
-                        height = (y_max - y_min) / frame_height
-                    else:
-                        x_center = 0
-                        y_center = 0
-                        width = 0
-                        height = 0
-                    # 写入JSON数据中
-                    json_single_frame_data.append({
-                        'class_id': class_id,
-                        'x_center': x_center,
-                        'y_center': y_center,
-                        'width': width,
-                        'height': height,
-                        'text': text,
-                    })
-                    f.write(f"{class_id},{x_center:.6f},{y_center:.6f},{width:.6f},{height:.6f},{text}\n")
-            
-            # 写入单帧JSON文件
-            with open(json_file_path, 'w', encoding='utf-8') as f:
-                json.dump(json_single_frame_data, f, ensure_ascii=False, indent=4)
-                
-            # 可以在这里添加日志记录或调试信息
-            # print(f"帧 {self.current_frame_index} 的标注已保存")
-        except Exception as e:
-            # 静默处理错误，不影响用户体验
-            print(f"保存当前帧标注时出错: {e}")
-    
     # 获取标注标签
     def get_annotation_label(self, annotation_id):
         """获取标注框的标签"""
@@ -2274,9 +2930,13 @@ class BoxAnnotationTool(QMainWindow):
         if not self.video_path:
             QMessageBox.information(self, "提示", "请先加载视频")
             return
-        if self.current_frame_index in self.annotations and self.current_frame_index in self.original_annotations:
-            # 将当前帧的标注信息恢复到原始标注字典（作为备份），使用深拷贝创建独立副本
-            self.annotations[self.current_frame_index] = copy.deepcopy(self.original_annotations[self.current_frame_index])
+        # 丢弃当前帧的编辑结果，下次读取时从模型原始识别结果的快照重新生成
+        if self.annotations.reset(self.current_frame_index):
+            self.journal_edit('frame')
+            # 恢复为模型结果后不再是插值帧
+            if self.current_frame_index in self.interpolated_frames:
+                self.interpolated_frames.discard(self.current_frame_index)
+                self.journal_edit('interp', False)
             # 清除当前选中的标注框
             self.selected_annotation = None
             # 更新当前帧的图片信息
@@ -2325,12 +2985,9 @@ class BoxAnnotationTool(QMainWindow):
                     return
                 QMessageBox.information(self, "提示", "已经是最后一帧")
                 return
-            # 如果当前帧的索引号小于self.total_frame_count的长度减一，说明下一帧已经处理，可以使用
+            # 如果当前帧的索引号小于self.total_frame_count的长度减一，说明下一帧存在
             if self.current_frame_index < self.total_frame_count - 1:
-                # 如果当前帧的索引号大于等于self.video_frames的长度减1，说明下一帧还没有持久化进self.video_frames，需要从视频帧队列中拉取新的帧信息
-                if self.current_frame_index >= len(self.video_frames) - 1:
-                    frame = self.frame_queue.get()
-                    self.video_frames.append(frame)
+                # 下一帧若还没有从帧队列送达，显示时会通过寻址索引按需解码，不需要等待读取线程
                 self.current_frame_index += 1
                 # 清除之前的高亮
                 if self.selected_annotation:
@@ -2417,21 +3074,8 @@ class BoxAnnotationTool(QMainWindow):
             
             # 更新帧索引并显示
             if new_index != self.current_frame_index:
-                # 如果视频帧还没有加载到目标帧，需要确保从队列中加载足够的帧
-                if new_index >= len(self.video_frames):
-                    # 需要加载的帧数
-                    needed_frames = new_index - len(self.video_frames) + 1
-                    # 从队列中加载帧
-                    for _ in range(needed_frames):
-                        if not self.frame_queue.empty():
-                            frame = self.frame_queue.get()
-                            self.video_frames.append(frame)
-                        else:
-                            # 如果队列中没有足够的帧，就加载到队列中现有的最后一帧
-                            break
-                
-                # 更新索引并显示帧
-                self.current_frame_index = min(new_index, len(self.video_frames) - 1)
+                # 目标帧无需等待读取线程，显示时会通过寻址索引按需解码
+                self.current_frame_index = new_index
                 # 清除之前的高亮
                 if self.selected_annotation:
                     self.selected_annotation['color'] = self.selected_annotation['original_color']  # 恢复原有颜色
@@ -2451,10 +3095,22 @@ class BoxAnnotationTool(QMainWindow):
             self.config['model_path'] = new_model_path
             # 更新显示的模型路径
             self.selected_model_path.setText(new_model_path)
-            
-            # 这里可以添加模型切换后的其他处理逻辑，比如重新初始化模型等
-            # 例如：self.init_model() 或其他相关方法
+            # 在后台计算模型文件摘要，切换回用过的模型后加载视频时直接用于查找检测缓存
+            threading.Thread(target=self.hash_model_file, args=(new_model_path,), daemon=True).start()
+            # 在后台预热新模型的会话，已加载过的模型直接命中会话池缓存
+            if self.config['inference_backend'] == 'process':
+                threading.Thread(target=lambda: self.get_inference_pool().warm_up(), daemon=True).start()
+            else:
+                threading.Thread(target=onnxdealA.get_session, args=(new_model_path,), daemon=True).start()
     
+    # 计算模型文件摘要（结果由detection_cache缓存）
+    @staticmethod
+    def hash_model_file(model_path):
+        try:
+            detection_cache.model_hash(model_path)
+        except OSError as e:
+            print(f"读取模型文件时出错: {e}")
+
     # 浏览并选择输入视频路径
     def browse_input_video_path(self):
         """浏览并选择导入的输入图片集路径"""
@@ -2491,6 +3147,8 @@ class BoxAnnotationTool(QMainWindow):
 
 # 主运行函数
 if __name__ == "__main__":
+    # 打包后的程序需要支持多进程推理后端启动工作进程
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     # 首先显示功能选择界面
     selection_window = SelectionWindow()
@@ -0,0 +1,50 @@
+# background_task.py
+import threading
+
+from PySide6.QtCore import QObject, Signal
+
+class BackgroundTask(QObject):
+    """在后台线程执行耗时任务（导出、渲染等），通过Qt信号报告进度和结果
+
+    任务函数以关键字参数 progress(已完成数, 总数) 和 cancel（threading.Event）调用，
+    应定期检查 cancel.is_set() 并尽快返回。信号的槽函数在界面线程执行。
+    """
+    progress = Signal(int, int)     # 已完成数, 总数
+    finished = Signal(object)       # 任务函数的返回值（被取消时同样发出）
+    failed = Signal(str)            # 错误信息
+
+    def __init__(self, target, parent=None):
+        super().__init__(parent)
+        self._target = target
+        self._cancel = threading.Event()
+        self._thread = None
+
+    def start(self, *args, **kwargs):
+        self._cancel.clear()
+        self._thread = threading.Thread(target=self._run, args=args, kwargs=kwargs, daemon=True)
+        self._thread.start()
+
+    def _run(self, *args, **kwargs):
+        try:
+            result = self._target(*args, progress=self.progress.emit, cancel=self._cancel, **kwargs)
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.finished.emit(result)
+
+    def cancel(self):
+        """请求取消，任务函数在下一次检查时结束"""
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def wait(self, timeout=None):
+        """等待任务结束，超时返回False"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return not self.is_running()
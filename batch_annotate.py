@@ -0,0 +1,188 @@
+# batch_annotate.py
+"""无界面批量预标注
+
+遍历目录树中的视频和图片文件夹，用 onnxdealA 模型识别每个采样帧，
+按 save_project 相同的 txt/json 目录结构输出。进度记录在输出目录的检查点文件中，
+中断后使用相同参数重新运行即可从中断处继续。
+
+用法示例：
+    python batch_annotate.py ./input_videos --model ./model/1109_big_area_best.onnx --workers 2
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+import annotation_io
+import onnxdealA
+import video_io
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+CHECKPOINT_NAME = 'batch_checkpoint.json'
+PROGRESS_NAME = 'batch_progress.json'
+
+def find_sources(input_root):
+    """查找目录树中的全部视频文件和包含图片的文件夹，返回[(类型, 路径)]"""
+    sources = []
+    for dirpath, dirnames, filenames in os.walk(input_root):
+        dirnames.sort()
+        filenames.sort()
+        if any(name.lower().endswith(video_io.IMAGE_EXTENSIONS) for name in filenames):
+            sources.append(('images', dirpath))
+        for name in filenames:
+            if name.lower().endswith(VIDEO_EXTENSIONS):
+                sources.append(('video', os.path.join(dirpath, name)))
+    return sources
+
+def source_name(input_root, path, kind):
+    """输出子文件夹名：子目录中的数据加上相对路径前缀以免重名；视频保留扩展名（如 a_b_mp4），
+    不与同名的图片文件夹 a/b 或其他格式的同名视频冲突"""
+    relative = os.path.relpath(path, input_root)
+    if relative == '.':
+        relative = os.path.basename(os.path.abspath(path))
+    base, extension = os.path.splitext(relative)
+    if kind == 'video':
+        return f"{base}_{extension[1:]}".replace(os.sep, '_')
+    return relative.replace(os.sep, '_')
+
+def atomic_write_json(path, data):
+    """先写临时文件再替换，进程中断时不会留下截断的检查点"""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+    os.replace(temp_path, path)
+
+def load_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def iter_source_frames(kind, path, interval, start):
+    """从第start个采样帧开始产生(帧索引, RGB帧)"""
+    if kind == 'images':
+        files = video_io.list_image_files(path)
+        for frame_index in range(start, len(files)):
+            frame = cv2.imread(os.path.join(path, files[frame_index]))
+            if frame is None:
+                print(f"无法加载图片: {files[frame_index]}")
+                continue
+            yield frame_index, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        return
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            raise IOError(f"无法打开视频文件: {path}")
+        if start:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start * interval)
+        for sample_index, _, frame in video_io.iter_sampled_frames(cap, interval):
+            yield start + sample_index, frame
+    finally:
+        cap.release()
+
+def annotate_source(kind, path, output_root, folder_name, options):
+    """工作进程：识别一个视频或图片文件夹并输出标注文件，返回处理的帧数"""
+    txt_output_dir, json_output_dir = annotation_io.make_output_dirs(output_root, folder_name)
+    progress_path = os.path.join(output_root, folder_name, PROGRESS_NAME)
+    start = load_json(progress_path, {}).get('next_frame', 0)
+
+    processed = 0
+    batch = []
+
+    def flush():
+        nonlocal processed
+        frames = [frame for _, frame in batch]
+        results = onnxdealA.main_batch(options['model'], frames, None,
+                                       input_size=options['input_size'],
+                                       providers=options['providers'],
+                                       conf_thres=options['conf'],
+                                       iou_thres=options['iou'])
+        for (frame_index, frame), result in zip(batch, results):
+            annotations = annotation_io.build_model_annotations(result)
+            if annotations or options['write_empty']:
+                annotation_io.write_frame(txt_output_dir, json_output_dir, frame_index, annotations, frame.shape[:2])
+        processed += len(batch)
+        # 本批的文件全部写完后才推进进度，中断时最多重做一批
+        atomic_write_json(progress_path, {'next_frame': batch[-1][0] + 1})
+        batch.clear()
+
+    for frame_index, frame in iter_source_frames(kind, path, options['interval'], start):
+        batch.append((frame_index, frame))
+        if len(batch) >= options['batch_size']:
+            flush()
+    if batch:
+        flush()
+    return processed
+
+def run(args):
+    input_root = os.path.abspath(args.input)
+    output_root = os.path.abspath(args.output)
+    os.makedirs(output_root, exist_ok=True)
+    checkpoint_path = os.path.join(output_root, CHECKPOINT_NAME)
+    checkpoint = load_json(checkpoint_path, {'sources': {}})
+
+    options = {
+        'model': os.path.abspath(args.model),
+        'input_size': args.input_size,
+        'providers': ['CPUExecutionProvider'] if args.cpu else None,
+        'conf': args.conf,
+        'iou': args.iou,
+        'interval': args.interval,
+        'batch_size': args.batch_size,
+        'write_empty': args.write_empty,
+    }
+
+    # 新发现的数据源分配输出文件夹（视频名加时间戳），已记录的沿用原文件夹以便续跑
+    timestamp = time.strftime("%Y%m%d%H%M%S", time.localtime())
+    pending = []
+    for kind, path in find_sources(input_root):
+        entry = checkpoint['sources'].setdefault(
+            path, {'kind': kind, 'folder': source_name(input_root, path, kind) + '_' + timestamp, 'done': False})
+        if not entry['done']:
+            pending.append((kind, path, entry))
+    atomic_write_json(checkpoint_path, checkpoint)
+    print(f"共 {len(checkpoint['sources'])} 个数据源，待处理 {len(pending)} 个")
+    if not pending:
+        return 0
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.workers),
+                             mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = {executor.submit(annotate_source, kind, path, output_root, entry['folder'], options): (path, entry)
+                   for kind, path, entry in pending}
+        for future in as_completed(futures):
+            path, entry = futures[future]
+            try:
+                count = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"[ERROR] {path}: {e}")
+                continue
+            entry['done'] = True
+            atomic_write_json(checkpoint_path, checkpoint)
+            print(f"完成 {path}: {count} 帧 -> {os.path.join(output_root, entry['folder'])}")
+    return 1 if failed else 0
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="无界面批量预标注视频和图片文件夹")
+    parser.add_argument('input', help="输入目录，递归查找其中的视频文件和图片文件夹")
+    parser.add_argument('--model', default='./model/1109_big_area_best.onnx', help="ONNX模型路径")
+    parser.add_argument('--output', default='./output', help="输出目录，检查点文件也保存在这里")
+    parser.add_argument('--workers', type=int, default=2, help="并行处理的进程数")
+    parser.add_argument('--interval', type=int, default=4, help="视频帧采样间隔")
+    parser.add_argument('--batch-size', type=int, default=4, help="每次送入模型推理的帧数")
+    parser.add_argument('--input-size', type=int, default=1280, help="模型输入尺寸")
+    parser.add_argument('--conf', type=float, default=0.3, help="置信度阈值")
+    parser.add_argument('--iou', type=float, default=0.7, help="NMS的IoU阈值")
+    parser.add_argument('--cpu', action='store_true', help="只使用CPU推理")
+    parser.add_argument('--write-empty', action='store_true', help="没有识别到目标的帧也输出空文件")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(run(parse_args()))
@@ -0,0 +1,348 @@
+# benchmark.py
+"""加载-标注-保存热路径的离屏性能基准测试
+
+生成合成的猪栏视频和图片文件夹，分别计时：
+  - onnxdealA 的 letterbox / preprocess / 推理 / 后处理
+  - load_video_frames 和 load_default_atlas 的帧读取吞吐量
+  - display_current_frame 的渲染延迟（离屏Qt平台）
+  - save_project 的写出时间
+结果写入JSON格式的报告，可以用 --compare 与上一次的报告对比，发现性能回退。
+
+用法示例：
+    python benchmark.py --width 1920 --height 1080 --frames 120 --model ./model/1109_big_area_best.onnx
+    python benchmark.py --compare bench_baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+import annotation_io
+import onnxdealA
+
+# 报告中用于判断性能回退的指标（越小越好）
+COMPARE_KEY = 'median_ms'
+
+def synthetic_frames(width, height, count, pigs=12, seed=0):
+    """生成合成的猪栏画面：带栏杆的地面上有若干缓慢移动的椭圆形猪只，返回(BGR帧, 真实框列表)"""
+    rng = np.random.default_rng(seed)
+    background = np.full((height, width, 3), (96, 110, 120), dtype=np.uint8)
+    noise = rng.integers(0, 24, (height, width, 1), dtype=np.uint8)
+    background = cv2.add(background, np.repeat(noise, 3, axis=2))
+    for x in range(0, width, max(1, width // 8)):
+        cv2.line(background, (x, 0), (x, height), (60, 60, 60), max(2, width // 200))
+    scale = min(width, height)
+    centers = rng.uniform([0.1 * width, 0.1 * height], [0.9 * width, 0.9 * height], (pigs, 2))
+    velocity = rng.normal(0, scale * 0.004, (pigs, 2))
+    axes = rng.uniform(scale * 0.04, scale * 0.08, (pigs, 1)) * np.array([[1.8, 1.0]])
+    angles = rng.uniform(0, 180, pigs)
+    for _ in range(count):
+        frame = background.copy()
+        boxes = []
+        for (cx, cy), (ax, ay), angle in zip(centers, axes, angles):
+            cv2.ellipse(frame, (int(cx), int(cy)), (int(ax), int(ay)), angle, 0, 360, (150, 170, 215), -1)
+            cv2.ellipse(frame, (int(cx), int(cy)), (int(ax), int(ay)), angle, 0, 360, (110, 130, 180), 2)
+            boxes.append([int(cx - ax), int(cy - ax), int(cx + ax), int(cy + ax)])
+        yield frame, boxes
+        centers = np.clip(centers + velocity, [0, 0], [width - 1, height - 1])
+        angles = angles + rng.normal(0, 2, pigs)
+
+def write_synthetic_video(path, width, height, count, fps=25):
+    """写出合成视频"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    if not writer.isOpened():
+        raise IOError(f"无法创建视频文件: {path}")
+    try:
+        for frame, _ in synthetic_frames(width, height, count):
+            writer.write(frame)
+    finally:
+        writer.release()
+
+def write_synthetic_images(directory, width, height, count):
+    """写出合成图片文件夹"""
+    os.makedirs(directory, exist_ok=True)
+    for i, (frame, _) in enumerate(synthetic_frames(width, height, count, seed=1)):
+        cv2.imwrite(os.path.join(directory, f"img_{i:05d}.jpg"), frame)
+
+def summarize(samples, items=1):
+    """把耗时样本（秒）汇总为毫秒统计值，items为每次调用处理的条目数"""
+    ms = np.asarray(samples, dtype=np.float64) * 1000.0
+    return {
+        'runs': int(len(ms)),
+        'min_ms': round(float(ms.min()), 3),
+        'median_ms': round(float(np.median(ms)), 3),
+        'mean_ms': round(float(ms.mean()), 3),
+        'p95_ms': round(float(np.percentile(ms, 95)), 3),
+        'items_per_s': round(items * 1000.0 / float(np.median(ms)), 2) if ms.any() else None,
+    }
+
+def measure(func, repeat, warmup=1, items=1, setup=None):
+    """重复调用func并汇总耗时；setup不为空时在每次调用前执行（不计入耗时）"""
+    for _ in range(warmup):
+        if setup is not None:
+            setup()
+        func()
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples, items)
+
+def synthetic_predictions(count, input_size, classes=3, seed=0):
+    """生成模型原始输出形式的候选框 (N,6)：x1,y1,x2,y2,score,cls"""
+    rng = np.random.default_rng(seed)
+    xy = rng.uniform(0, input_size * 0.9, (count, 2))
+    wh = rng.uniform(input_size * 0.02, input_size * 0.1, (count, 2))
+    return np.concatenate([xy, xy + wh, rng.uniform(0, 1, (count, 1)),
+                           rng.integers(0, classes, (count, 1))], axis=1).astype(np.float32)
+
+def bench_model(args, report):
+    """onnxdealA 各阶段的耗时"""
+    results = report['results']
+    frame, _ = next(synthetic_frames(args.width, args.height, 1))
+    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    frames = [frame] * args.batch_size
+
+    results['letterbox'] = measure(lambda: onnxdealA.letterbox(frame, args.input_size), args.repeat)
+    results['preprocess'] = measure(lambda: onnxdealA.preprocess(frame, args.input_size), args.repeat)
+    results['preprocess_batch'] = measure(lambda: onnxdealA.preprocess_batch(frames, args.input_size),
+                                          args.repeat, items=len(frames))
+
+    blob, ratios, dwdhs = onnxdealA.preprocess_batch([frame], args.input_size)
+    preds = synthetic_predictions(args.candidates, args.input_size)
+    results['postprocess'] = measure(lambda: onnxdealA.postprocess(preds, ratios[0], dwdhs[0]), args.repeat)
+
+    if not args.model:
+        report['skipped'].append('inference: 未指定 --model')
+        return
+    onnxdealA.get_session(args.model)
+    results['inference_single'] = measure(
+        lambda: onnxdealA.infer_blob(args.model, blob, ratios, dwdhs), args.repeat)
+    batch_blob, batch_ratios, batch_dwdhs = onnxdealA.preprocess_batch(frames, args.input_size)
+    results['inference_batch'] = measure(
+        lambda: onnxdealA.infer_blob(args.model, batch_blob, batch_ratios, batch_dwdhs),
+        args.repeat, items=len(frames))
+    results['main_batch'] = measure(
+        lambda: onnxdealA.main_batch(args.model, frames, None, input_size=args.input_size),
+        args.repeat, items=len(frames))
+
+def bench_gui(args, video_path, image_dir, output_dir, report):
+    """离屏Qt平台下的帧读取、渲染和保存耗时"""
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PySide6.QtCore import QTimer
+    from PySide6.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication([])
+    # 标注工具依赖相对路径的类别文件
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    import annotation_tool
+
+    # 加载和保存完成后会弹出模态提示框，离屏运行时定时关闭
+    dismiss_timer = QTimer()
+    dismiss_timer.timeout.connect(lambda: QApplication.activeModalWidget() and QApplication.activeModalWidget().close())
+    dismiss_timer.start(20)
+
+    results = report['results']
+    tool = annotation_tool.BoxAnnotationTool()
+    tool.resize(1200, 800)
+    tool.show()
+    tool.config['input_size'] = args.input_size
+    tool.config['output_txt_path'] = output_dir
+    if args.model:
+        tool.config['model_path'] = os.path.abspath(args.model)
+        tool.selected_model_name = os.path.splitext(os.path.basename(args.model))[0]
+
+    def wait_loaded():
+        while tool.loading or tool.reader_thread.is_alive():
+            app.processEvents()
+            time.sleep(0.002)
+        app.processEvents()
+
+    # 视频帧读取吞吐量：从开始加载到读取线程结束
+    tool.clear_video_resources()
+    tool.video_path = video_path
+    start = time.perf_counter()
+    tool.load_video_frames()
+    wait_loaded()
+    elapsed = time.perf_counter() - start
+    results['load_video_frames'] = dict(summarize([elapsed], tool.total_frame_count),
+                                        frames=tool.total_frame_count,
+                                        source_frames_per_s=round(args.frames / elapsed, 2))
+
+    # 没有模型时用合成的真实框作为标注
+    if not tool.annotations:
+        for index, (_, boxes) in zip(range(tool.total_frame_count),
+                                     synthetic_frames(args.width, args.height, tool.total_frame_count)):
+            result = [{'cls': i % 3, 'xyxy': box, 'score': 1.0} for i, box in enumerate(boxes)]
+            tool.annotations[index] = annotation_io.build_model_annotations(result)
+
+    # 渲染延迟（包含实际绘制）：逐帧切换，以及同一帧的重复重绘（相当于鼠标拖动时的刷新）
+    def render():
+        tool.display_current_frame()
+        tool.video_display.repaint()
+
+    count = min(tool.total_frame_count, args.repeat)
+    samples = []
+    for index in range(count):
+        tool.current_frame_index = index
+        start = time.perf_counter()
+        render()
+        samples.append(time.perf_counter() - start)
+    results['display_current_frame_switch'] = summarize(samples)
+    tool.current_frame_index = 0
+    results['display_current_frame_redraw'] = measure(render, args.repeat)
+
+    # 鼠标拖动：一次性送入大量移动事件（相当于高回报率鼠标），统计处理耗时和合并的重绘次数
+    if tool.annotations.get(0):
+        results['mouse_drag_events'] = bench_drag(app, tool, args.repeat * 10)
+
+    # 保存耗时：全部帧标记为关键帧；save_project只写出修改过的帧且由后台线程写文件，
+    # 每次计时前把全部帧标记为已修改，计时包含等待后台写出完成
+    tool.key_frames = {index: True for index in tool.annotations}
+
+    def save_all():
+        tool.save_project()
+        tool.project_writer.flush()
+    results['save_project'] = dict(measure(save_all, max(1, args.repeat // 5),
+                                           setup=lambda: tool.annotations.mark_dirty(*tool.key_frames)),
+                                   frames=len(tool.key_frames))
+
+    # 图片文件夹读取吞吐量
+    files = sorted(os.listdir(image_dir))
+    tool.clear_video_resources()
+    tool.video_path = image_dir
+    start = time.perf_counter()
+    tool.load_default_atlas(files)
+    wait_loaded()
+    results['load_default_atlas'] = dict(summarize([time.perf_counter() - start], len(files)), frames=len(files))
+
+    tool.clear_video_resources()
+    tool.close()
+    dismiss_timer.stop()
+
+def bench_drag(app, tool, moves):
+    """模拟拖动当前帧的第一个标注框"""
+    from PySide6.QtCore import QEvent, QPointF, Qt
+    from PySide6.QtGui import QMouseEvent
+
+    def send(event_type, point, button=Qt.NoButton, buttons=Qt.NoButton):
+        event = QMouseEvent(event_type, point, point, button, buttons, Qt.NoModifier)
+        tool.eventFilter(tool.video_display, event)
+
+    tool.current_frame_index = 0
+    tool.display_current_frame()
+    tool.set_current_tool('mouse')
+    annotation = tool.annotations[0][0]
+    center = tool.video_display.map_from_frame((annotation['x1'] + annotation['x2']) / 2,
+                                               (annotation['y1'] + annotation['y2']) / 2)
+    tool.redraw_scheduler.reset_stats()
+    start = time.perf_counter()
+    send(QEvent.MouseButtonPress, center, Qt.LeftButton, Qt.LeftButton)
+    for i in range(moves):
+        send(QEvent.MouseMove, QPointF(center.x() + i % 40, center.y()), buttons=Qt.LeftButton)
+        # 每个事件之间让事件循环运行一次，模拟真实的事件投递
+        app.processEvents()
+    send(QEvent.MouseButtonRelease, center, Qt.LeftButton, Qt.NoButton)
+    elapsed = time.perf_counter() - start
+    return dict(summarize([elapsed], moves), **tool.redraw_scheduler.stats())
+
+def environment():
+    """记录运行环境，便于对比不同机器和版本的结果"""
+    info = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'opencv': cv2.__version__,
+        'numpy': np.__version__,
+        'onnxruntime': onnxdealA.ort.__version__,
+        'providers': list(onnxdealA.SessionPool.resolve_providers()),
+    }
+    try:
+        info['commit'] = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                        cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        info['commit'] = None
+    return info
+
+def compare_reports(baseline, report, tolerance):
+    """与基准报告对比，返回变慢超过容差的指标列表"""
+    regressions = []
+    for name, current in report['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous or not previous.get(COMPARE_KEY):
+            continue
+        ratio = current[COMPARE_KEY] / previous[COMPARE_KEY]
+        flag = ' <-- 回退' if ratio > 1 + tolerance else ''
+        print(f"{name:32s} {previous[COMPARE_KEY]:10.3f} -> {current[COMPARE_KEY]:10.3f} ms  x{ratio:.2f}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="标注工具热路径的离屏性能基准测试")
+    parser.add_argument('--width', type=int, default=1920, help="合成视频的宽度")
+    parser.add_argument('--height', type=int, default=1080, help="合成视频的高度")
+    parser.add_argument('--frames', type=int, default=120, help="合成视频的帧数")
+    parser.add_argument('--images', type=int, default=30, help="合成图片文件夹的图片数")
+    parser.add_argument('--model', default=None, help="ONNX模型路径，不指定时跳过推理相关的测试")
+    parser.add_argument('--input-size', type=int, default=1280, help="模型输入尺寸")
+    parser.add_argument('--batch-size', type=int, default=4, help="批量预处理和推理的帧数")
+    parser.add_argument('--candidates', type=int, default=2000, help="后处理测试的候选框数量")
+    parser.add_argument('--repeat', type=int, default=20, help="每项测试的重复次数")
+    parser.add_argument('--skip-gui', action='store_true', help="跳过需要Qt的测试")
+    parser.add_argument('--report', default='bench_report.json', help="JSON报告的输出路径")
+    parser.add_argument('--compare', default=None, help="作为基准的历史报告路径")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="判定为性能回退的相对变慢比例")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    report_path = os.path.abspath(args.report)
+    report = {
+        'created': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+        'environment': environment(),
+        'parameters': {k: v for k, v in vars(args).items() if k not in ('report', 'compare')},
+        'results': {},
+        'skipped': [],
+    }
+    work_dir = tempfile.mkdtemp(prefix='annotation_bench_')
+    try:
+        bench_model(args, report)
+        if args.skip_gui:
+            report['skipped'].append('gui: --skip-gui')
+        else:
+            video_path = os.path.join(work_dir, 'synthetic_pen.mp4')
+            image_dir = os.path.join(work_dir, 'synthetic_pen_images')
+            write_synthetic_video(video_path, args.width, args.height, args.frames)
+            write_synthetic_images(image_dir, args.width, args.height, args.images)
+            bench_gui(args, video_path, image_dir, os.path.join(work_dir, 'output'), report)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=4)
+    for name, stats in report['results'].items():
+        print(f"{name:32s} median {stats['median_ms']:10.3f} ms  p95 {stats['p95_ms']:10.3f} ms")
+    for reason in report['skipped']:
+        print(f"[SKIP] {reason}")
+    print(f"报告已写入: {report_path}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare_reports(baseline, report, args.tolerance):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+# dataset_export.py
+"""训练数据集导出
+
+把关键帧图片和YOLO格式的标签一起写出，目录结构为：
+    images/train/*.jpg  labels/train/*.txt
+    images/val/*.jpg    labels/val/*.txt
+    data.yaml
+帧按顺序从解码器取出，图片编码和写文件在线程池中完成；同时在处理中的帧数有上限，
+无论导出多少关键帧，内存占用都保持不变。
+
+用法示例：
+    python dataset_export.py ./output/video_20240101120000 ./input_videos/video.mp4 --output ./dataset --val 0.2
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+import annotation_io
+import video_io
+
+IMAGE_FORMATS = ('jpg', 'png')
+SPLITS = ('train', 'val')
+
+def iter_video_frames(video_path, interval, frame_indexes, sample_frames=None):
+    """按采样帧序号从视频中读取指定的帧（BGR），借助关键帧索引跳过不需要的片段；
+    sample_frames 为自适应采样时各采样帧的源帧号"""
+    seek_index = video_io.VideoSeekIndex.build(video_path, interval)
+    seek_index.sample_frames = sample_frames
+    try:
+        for frame_idx in sorted(frame_indexes):
+            frame = seek_index.read(frame_idx, convert_rgb=False)
+            if frame is not None:
+                yield frame_idx, frame
+    finally:
+        seek_index.release()
+
+def split_of(frame_idx, val_ratio, seed=0):
+    """帧所属的数据集划分；同一帧在相同的种子下总是分到同一边，重复导出结果稳定"""
+    if val_ratio <= 0:
+        return 'train'
+    return 'val' if random.Random(f"{seed}:{frame_idx}").random() < val_ratio else 'train'
+
+def yolo_label(items):
+    """normalize_annotations格式的标注转换为YOLO标签文本，每行为 类别 x中心 y中心 宽 高"""
+    return ''.join(f"{item['class_id']} {item['x_center']:.6f} {item['y_center']:.6f} "
+                   f"{item['width']:.6f} {item['height']:.6f}\n" for item in items)
+
+def resize_frame(frame, max_size):
+    """长边超过max_size时按比例缩小；归一化坐标不受缩放影响，标签无需修改"""
+    if not max_size:
+        return frame
+    height, width = frame.shape[:2]
+    scale = max_size / max(height, width)
+    if scale >= 1:
+        return frame
+    return cv2.resize(frame, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+
+def write_data_yaml(output_dir, classes):
+    """写出YOLO训练使用的数据集描述文件"""
+    lines = [f"path: {os.path.abspath(output_dir)}", "train: images/train", "val: images/val", "names:"]
+    lines += [f"  {class_id}: {name}" for class_id, name in sorted(classes.items())]
+    with open(os.path.join(output_dir, 'data.yaml'), 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+
+def export_dataset(frames, labels, output_dir, classes=None, prefix='', image_format='jpg', quality=95,
+                   max_size=None, val_ratio=0.0, seed=0, workers=4, progress=None, cancel=None):
+    """导出图片和标签
+
+    frames 为按顺序产生(帧索引, BGR帧)的可迭代对象，labels 为 {帧索引: normalize_annotations格式的列表}，
+    只导出有标签的帧；prefix 加在文件名前，多个视频可以导出到同一个数据集。
+    返回 {'train': 帧数, 'val': 帧数}。
+    """
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"不支持的图片格式: {image_format}")
+    for split in SPLITS:
+        os.makedirs(os.path.join(output_dir, 'images', split), exist_ok=True)
+        os.makedirs(os.path.join(output_dir, 'labels', split), exist_ok=True)
+    if classes:
+        write_data_yaml(output_dir, classes)
+    params = [cv2.IMWRITE_JPEG_QUALITY, quality] if image_format == 'jpg' else []
+
+    def write_sample(frame_idx, frame, split):
+        frame = resize_frame(frame, max_size)
+        ok, encoded = cv2.imencode('.' + image_format, frame, params)
+        if not ok:
+            raise IOError(f"图片编码失败: 帧 {frame_idx}")
+        name = f"{prefix}{frame_idx:05d}"
+        # 先写图片再写标签，中断时不会出现没有图片的标签
+        encoded.tofile(os.path.join(output_dir, 'images', split, f"{name}.{image_format}"))
+        with open(os.path.join(output_dir, 'labels', split, f"{name}.txt"), 'w', encoding='utf-8') as f:
+            f.write(yolo_label(labels[frame_idx]))
+
+    counts = dict.fromkeys(SPLITS, 0)
+    total, done = len(labels), 0
+    errors = []
+    lock = threading.Lock()
+    # 处理中的帧数上限：解码比编码快时，解码线程在这里等待，内存占用不随导出帧数增长
+    slots = threading.BoundedSemaphore(max(1, workers) * 2)
+
+    def on_done(future, split):
+        nonlocal done
+        slots.release()
+        with lock:
+            if future.exception() is not None:
+                errors.append(future.exception())
+            else:
+                counts[split] += 1
+            done += 1
+            finished = done
+        if progress is not None:
+            progress(finished, total)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for frame_idx, frame in frames:
+            if cancel is not None and cancel.is_set():
+                break
+            if frame_idx not in labels:
+                continue
+            slots.acquire()
+            split = split_of(frame_idx, val_ratio, seed)
+            future = executor.submit(write_sample, frame_idx, np.ascontiguousarray(frame), split)
+            future.add_done_callback(lambda future, split=split: on_done(future, split))
+    if errors:
+        raise errors[0]
+    return counts
+
+def load_labels(session_dir):
+    """读取输出目录（txt/json子目录）中的全部标注，返回 {帧索引: 标注列表}"""
+    txt_output_dir, json_output_dir = os.path.join(session_dir, 'txt'), os.path.join(session_dir, 'json')
+    return {frame_idx: annotation_io.read_frame(txt_output_dir, json_output_dir, frame_idx)
+            for frame_idx in annotation_io.list_frames(txt_output_dir, json_output_dir)}
+
+def load_sample_frames(session_dir):
+    """读取输出目录中自适应采样的采样帧号，固定间隔采样时返回None"""
+    return video_io.VideoSeekIndex.load_samples(os.path.join(session_dir, video_io.SAMPLES_NAME))
+
+def load_classes(classes_path):
+    """读取类别文件，与标注工具一致取每行的第一个词为类别名，行号为类别编号"""
+    if not classes_path or not os.path.exists(classes_path):
+        return {}
+    with open(classes_path, 'r', encoding='utf-8') as f:
+        return {class_id: line.split()[0] for class_id, line in enumerate(f) if line.strip()}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="导出关键帧图片和YOLO标签，用于模型训练")
+    parser.add_argument('session_dir', help="标注输出目录（包含txt和json子目录）")
+    parser.add_argument('video', help="标注对应的源视频")
+    parser.add_argument('--output', default='./dataset', help="数据集输出目录")
+    parser.add_argument('--interval', type=int, default=4,
+                        help="标注时使用的视频帧采样间隔（输出目录中有采样记录samples.json时以记录为准）")
+    parser.add_argument('--classes', default='./attachment/classes.txt', help="类别文件，用于生成data.yaml")
+    parser.add_argument('--format', default='jpg', choices=IMAGE_FORMATS, help="图片格式")
+    parser.add_argument('--quality', type=int, default=95, help="JPEG质量")
+    parser.add_argument('--max-size', type=int, default=None, help="图片长边的最大像素数，超过时缩小")
+    parser.add_argument('--val', type=float, default=0.0, help="验证集比例")
+    parser.add_argument('--seed', type=int, default=0, help="划分训练集/验证集的随机种子")
+    parser.add_argument('--workers', type=int, default=4, help="图片编码的线程数")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    labels = load_labels(args.session_dir)
+    prefix = os.path.splitext(os.path.basename(args.video))[0] + '_'
+
+    def report(done, total):
+        print(f"\r已导出 {done}/{total}", end='', flush=True)
+
+    frames = iter_video_frames(args.video, args.interval, labels, load_sample_frames(args.session_dir))
+    counts = export_dataset(frames, labels, args.output,
+                            classes=load_classes(args.classes), prefix=prefix, image_format=args.format,
+                            quality=args.quality, max_size=args.max_size, val_ratio=args.val, seed=args.seed,
+                            workers=args.workers, progress=report)
+    print(f"\n训练集 {counts['train']} 帧，验证集 {counts['val']} 帧 -> {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
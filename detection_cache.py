@@ -0,0 +1,213 @@
+# detection_cache.py
+"""检测结果的磁盘缓存
+
+以 (帧内容摘要, 推理参数) 为键保存模型的识别结果，推理参数由模型文件摘要、输入尺寸和各项阈值组成，
+重新打开同一视频或切换回用过的模型时，命中缓存的帧不再推理。缓存保存在一个SQLite文件中，
+总大小超过上限时按最近使用时间淘汰。
+
+用法示例：
+    python detection_cache.py stats
+    python detection_cache.py invalidate ./model/1109_big_area_best.onnx
+    python detection_cache.py clear
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import numpy as np
+
+from inference_pool import boxes_to_array, array_to_boxes
+
+def default_cache_dir():
+    """当前用户的缓存目录：Windows为%LOCALAPPDATA%，macOS为~/Library/Caches，其他系统为$XDG_CACHE_HOME或~/.cache"""
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~\\AppData\\Local')
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'pig_annotation')
+
+# 缓存放在用户缓存目录，不写入项目目录
+DEFAULT_PATH = os.path.join(default_cache_dir(), 'detections.db')
+# 缓存写入积攒到该条数时合并为一个事务写出
+FLUSH_EVERY = 64
+# 每条记录在数据之外估计的存储开销（键、索引等），用于计算缓存大小
+ROW_OVERHEAD = 96
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS detections (
+    frame_hash BLOB NOT NULL,     -- 帧内容摘要
+    params TEXT NOT NULL,         -- 推理参数摘要（包含模型文件摘要）
+    model_hash TEXT NOT NULL,     -- 模型文件摘要，按模型清除缓存时使用
+    result BLOB NOT NULL,         -- float32[N, 6] 每行为 x1, y1, x2, y2, score, cls
+    size INTEGER NOT NULL,        -- 估计占用的字节数
+    last_used REAL NOT NULL,      -- 最近一次写入或命中的时间
+    PRIMARY KEY (frame_hash, params)
+);
+CREATE INDEX IF NOT EXISTS detections_model ON detections (model_hash);
+CREATE INDEX IF NOT EXISTS detections_last_used ON detections (last_used);
+"""
+
+_model_hashes = {}   # (模型路径, 文件大小, 修改时间) -> 摘要
+
+def model_hash(model_path):
+    """模型文件内容的摘要；按路径、大小和修改时间缓存，同一文件只计算一次"""
+    stat = os.stat(model_path)
+    memo_key = (os.path.abspath(model_path), stat.st_size, stat.st_mtime_ns)
+    digest = _model_hashes.get(memo_key)
+    if digest is None:
+        sha1 = hashlib.sha1()
+        with open(model_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha1.update(chunk)
+        digest = _model_hashes[memo_key] = sha1.hexdigest()
+    return digest
+
+def inference_params(model_path, input_size, conf_threshold, iou_threshold, class_thresholds=None):
+    """推理参数摘要，返回(参数摘要, 模型文件摘要)；任何一项变化都对应不同的缓存条目"""
+    digest = model_hash(model_path)
+    options = json.dumps([input_size, conf_threshold, iou_threshold,
+                          sorted((int(k), float(v)) for k, v in (class_thresholds or {}).items())])
+    return f"{digest}:{hashlib.sha1(options.encode()).hexdigest()[:16]}", digest
+
+def frame_hash(frame):
+    """帧内容摘要：对隔行隔列抽取的像素计算，比对整帧计算快约4倍"""
+    frame = np.asarray(frame)
+    digest = hashlib.blake2b(repr(frame.shape).encode(), digest_size=16)
+    digest.update(np.ascontiguousarray(frame[::2, ::2]).data)
+    return digest.digest()
+
+class DetectionCache:
+    """检测结果缓存，可以在多个线程中使用
+
+    get 直接查询；put 先在内存中积攒，达到FLUSH_EVERY条或调用flush时在一个事务中写出，
+    写出后总大小超过max_bytes时删除最久未使用的条目，直到降到上限的90%。
+    """
+    def __init__(self, path=DEFAULT_PATH, max_bytes=512 << 20):
+        self.path = path
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._pending = []    # 待写入的 (frame_hash, params, model_hash, result, size, last_used)
+        self._hits = []       # 命中的 (frame_hash, params)，写出时更新最近使用时间
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def get(self, key, params):
+        """返回缓存的识别结果，未命中时返回None"""
+        with self._lock:
+            if self._conn is None:
+                return None
+            row = self._conn.execute("SELECT result FROM detections WHERE frame_hash = ? AND params = ?",
+                                     (key, params)).fetchone()
+            if row is None:
+                return None
+            self._hits.append((key, params))
+        return array_to_boxes(np.frombuffer(row[0], dtype=np.float32).reshape(-1, 6))
+
+    def put(self, key, params, model_digest, result):
+        """缓存一帧的识别结果（推理失败的None不缓存）"""
+        if result is None:
+            return
+        blob = boxes_to_array(result).tobytes()
+        with self._lock:
+            self._pending.append((key, params, model_digest, blob, len(blob) + ROW_OVERHEAD, time.time()))
+            full = len(self._pending) >= FLUSH_EVERY
+        if full:
+            self.flush()
+
+    def flush(self):
+        """写出积攒的条目，并按大小上限淘汰"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            hits, self._hits = self._hits, []
+            # 关闭之后（如窗口关闭时读取线程尚未结束）写入的条目直接丢弃
+            if self._conn is None or (not pending and not hits):
+                return
+            now = time.time()
+            with self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO detections "
+                                       "(frame_hash, params, model_hash, result, size, last_used) "
+                                       "VALUES (?, ?, ?, ?, ?, ?)", pending)
+                self._conn.executemany("UPDATE detections SET last_used = ? WHERE frame_hash = ? AND params = ?",
+                                       [(now, key, params) for key, params in hits])
+            if pending:
+                self._evict()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM detections").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - int(self.max_bytes * 0.9)
+        rows = []
+        for rowid, size in self._conn.execute("SELECT rowid, size FROM detections ORDER BY last_used"):
+            rows.append((rowid,))
+            excess -= size
+            if excess <= 0:
+                break
+        with self._conn:
+            self._conn.executemany("DELETE FROM detections WHERE rowid = ?", rows)
+
+    def invalidate_model(self, model_digest):
+        """删除某个模型文件的全部条目，返回删除的条数"""
+        self.flush()
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM detections WHERE model_hash = ?", (model_digest,)).rowcount
+
+    def clear(self):
+        with self._lock:
+            self._pending, self._hits = [], []
+            with self._conn:
+                return self._conn.execute("DELETE FROM detections").rowcount
+
+    def stats(self):
+        """返回(条目数, 估计占用的字节数)"""
+        self.flush()
+        with self._lock:
+            count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM detections").fetchone()
+        return count, size
+
+    def close(self):
+        if self._conn is not None:
+            self.flush()
+            with self._lock:
+                self._conn.close()
+                self._conn = None
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="检测结果缓存的维护")
+    parser.add_argument('--cache', default=DEFAULT_PATH, help="缓存文件路径")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('stats', help="显示缓存条目数和大小")
+    invalidate_parser = commands.add_parser('invalidate', help="删除某个模型的全部缓存条目")
+    invalidate_parser.add_argument('model', help="模型文件路径")
+    commands.add_parser('clear', help="清空缓存")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    with DetectionCache(args.cache) as cache:
+        if args.command == 'stats':
+            count, size = cache.stats()
+            print(f"{count} 条，约 {size / (1 << 20):.1f} MB -> {args.cache}")
+        elif args.command == 'invalidate':
+            print(f"已删除 {cache.invalidate_model(model_hash(args.model))} 条")
+        else:
+            print(f"已删除 {cache.clear()} 条")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+# frame_store.py
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+class FrameStore:
+    """有内存上限的帧存储，替代保存全部帧的列表
+
+    最近使用的帧保留在内存中，超出内存预算时把最久未使用的帧写入磁盘缓存，
+    再次访问时透明地从磁盘读回。用法与列表一致：append、len、下标访问；
+    也可以用 put 按索引乱序存入，缺失的帧交给 loader 按需加载。
+    """
+    def __init__(self, memory_budget_mb=2048, spill_format='png', spill_dir=None):
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)   # 内存中热帧的字节上限
+        self.spill_format = spill_format   # 'png'为无损压缩，'npy'为原始数组（按内存映射读回）
+        self.spill_dir = spill_dir         # 磁盘缓存目录，None时首次溢出才创建临时目录
+        self._own_spill_dir = spill_dir is None
+        self._hot = OrderedDict()          # 帧索引 -> 帧数组，按最近使用顺序排列
+        self._hot_bytes = 0
+        self._spilled = {}                 # 帧索引 -> 磁盘缓存文件路径
+        self._count = 0                    # 最大帧索引加一
+        self._lock = threading.RLock()
+        self.loader = None                 # 缺失帧的按需加载函数 loader(index) -> 帧或None
+
+    def __len__(self):
+        return self._count
+
+    def __bool__(self):
+        return self._count > 0
+
+    def __contains__(self, index):
+        return index in self._hot or index in self._spilled
+
+    def __getitem__(self, index):
+        with self._lock:
+            if index < 0:
+                index += self._count
+            frame = self._hot.get(index)
+            if frame is not None:
+                self._hot.move_to_end(index)
+                return frame
+            path = self._spilled.get(index)
+            if path is not None:
+                # 从磁盘缓存读回并重新放入热区
+                frame = self._load(path)
+                self._put_hot(index, frame)
+                return frame
+        # 从未存入过的帧交给loader按需加载
+        if self.loader is not None and index >= 0:
+            frame = self.loader(index)
+            if frame is not None:
+                self.put(index, frame)
+                return frame
+        raise IndexError("frame index out of range")
+
+    def put(self, index, frame):
+        """按索引存入一帧，已存在的帧不会被覆盖（帧内容不会改变）"""
+        with self._lock:
+            if index in self:
+                return
+            self._put_hot(index, frame)
+            self._count = max(self._count, index + 1)
+
+    def append(self, frame):
+        """追加一帧"""
+        self.put(self._count, frame)
+
+    def clear(self):
+        """清空所有帧并删除磁盘缓存"""
+        with self._lock:
+            self._hot.clear()
+            self._hot_bytes = 0
+            self._spilled.clear()
+            self._count = 0
+            self.loader = None
+            if self._own_spill_dir and self.spill_dir:
+                shutil.rmtree(self.spill_dir, ignore_errors=True)
+                self.spill_dir = None
+
+    def memory_usage(self):
+        """返回(内存中的帧数, 内存占用字节数, 磁盘缓存的帧数)"""
+        with self._lock:
+            return len(self._hot), self._hot_bytes, len(self._spilled)
+
+    def _put_hot(self, index, frame):
+        self._hot[index] = frame
+        self._hot_bytes += frame.nbytes
+        # 超出预算时淘汰最久未使用的帧，至少保留刚放入的一帧
+        while self._hot_bytes > self.memory_budget and len(self._hot) > 1:
+            old_index, old_frame = self._hot.popitem(last=False)
+            self._hot_bytes -= old_frame.nbytes
+            # 帧内容不会改变，已经写过磁盘的帧直接丢弃即可
+            if old_index not in self._spilled:
+                self._spilled[old_index] = self._spill(old_index, old_frame)
+
+    def _spill(self, index, frame):
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.mkdtemp(prefix="frame_store_")
+        os.makedirs(self.spill_dir, exist_ok=True)
+        if self.spill_format == 'npy':
+            path = os.path.join(self.spill_dir, f"frame_{index:06d}.npy")
+            np.save(path, frame)
+        else:
+            path = os.path.join(self.spill_dir, f"frame_{index:06d}.png")
+            # 压缩等级1在速度和体积之间取得较好平衡
+            ok, buffer = cv2.imencode('.png', frame, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+            if not ok:
+                raise IOError(f"无法写入帧缓存: {path}")
+            buffer.tofile(path)
+        return path
+
+    def _load(self, path):
+        if path.endswith('.npy'):
+            return np.load(path, mmap_mode='r')
+        return cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
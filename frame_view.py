@@ -0,0 +1,194 @@
+# frame_view.py
+import time
+
+import numpy as np
+from PySide6.QtCore import QObject, QPointF, QRectF, Qt, QTimer
+from PySide6.QtGui import QBrush, QColor, QFont, QFontMetrics, QImage, QPainter, QPen, QPixmap
+from PySide6.QtWidgets import QApplication, QLabel
+
+def label_font():
+    """标注框标签使用的字体"""
+    font = QFont("Microsoft YaHei")
+    font.setPixelSize(13)
+    font.setBold(True)
+    return font
+
+def _pen(color, width):
+    pen = QPen(color)
+    pen.setWidth(width)
+    return pen
+
+def draw_boxes(painter, boxes, to_rect, font):
+    """绘制标注框和标签，boxes为[(x1, y1, x2, y2, 颜色, 线宽, 标签文本)]，to_rect把原图坐标转换为绘制坐标的QRectF
+
+    颜色可以是QColor或RGB元组；界面显示和导出标注视频共用这一份绘制代码，两者的外观一致。
+    """
+    painter.setFont(font)
+    metrics = QFontMetrics(font)
+    label_background = QBrush(QColor(Qt.white))
+    text_pen = _pen(QColor(Qt.black), 1)
+    for x1, y1, x2, y2, color, thickness, label_text in boxes:
+        if not isinstance(color, QColor):
+            color = QColor(*color)
+        rect = to_rect(x1, y1, x2, y2)
+        painter.setPen(_pen(color, thickness))
+        painter.setBrush(Qt.NoBrush)
+        painter.drawRect(rect)
+        if not label_text:
+            continue
+        # 标签放在方框左上角上方，空间不足时放到框内
+        text_width, text_height = metrics.horizontalAdvance(label_text), metrics.height()
+        top = rect.top() - text_height - 4 if rect.top() > text_height + 6 else rect.top() + 2
+        label_rect = QRectF(rect.left(), top, text_width + 6, text_height + 2)
+        painter.setPen(_pen(color, 1))
+        painter.setBrush(label_background)
+        painter.drawRect(label_rect)
+        painter.setPen(text_pen)
+        painter.drawText(label_rect, Qt.AlignCenter, label_text)
+
+def render_annotated_frame(frame, boxes, font=None):
+    """在RGB帧的副本上按原图尺寸绘制标注框，返回新的RGB数组；可在非界面线程调用"""
+    height, width = frame.shape[:2]
+    frame = np.ascontiguousarray(frame)
+    image = QImage(frame.data, width, height, frame.strides[0], QImage.Format_RGB888).copy()
+    painter = QPainter(image)
+    try:
+        draw_boxes(painter, boxes, lambda x1, y1, x2, y2: QRectF(x1, y1, x2 - x1, y2 - y1), font or label_font())
+    finally:
+        painter.end()
+    buffer = np.frombuffer(image.constBits(), dtype=np.uint8).reshape(height, image.bytesPerLine())
+    return buffer[:, :width * 3].reshape(height, width, 3).copy()
+
+class FrameView(QLabel):
+    """视频显示区域
+
+    缩放后的帧作为底图缓存为QPixmap，只在帧或显示区域尺寸变化时重建；
+    标注框、标签和正在绘制的矩形作为矢量覆盖层在显示坐标下绘制，
+    因此拖动、扩缩和绘制时的刷新开销与原视频分辨率无关。
+    """
+    def __init__(self, text=""):
+        super().__init__(text)
+        self._base = None           # 缩放后的帧底图
+        self._base_key = None       # 底图对应的(帧标识, 显示区域尺寸)
+        self._scale = 1.0           # 原图坐标到显示坐标的缩放比例
+        self._offset = (0, 0)       # 底图左上角在控件中的位置
+        self._boxes = []            # [(x1, y1, x2, y2, 颜色, 线宽, 标签文本)]，原图坐标
+        self._rubber_band = None    # 正在绘制的矩形 (x1, y1, x2, y2, 颜色)，原图坐标
+        self.label_font = label_font()
+
+    def set_frame(self, key, frame):
+        """设置底图，key与上次相同且显示区域尺寸未变时直接复用缓存"""
+        base_key = (key, self.width(), self.height())
+        if base_key == self._base_key:
+            return
+        height, width = frame.shape[:2]
+        frame = np.ascontiguousarray(frame)
+        q_image = QImage(frame.data, width, height, frame.strides[0], QImage.Format_RGB888)
+        # 平滑缩放只在这里做一次
+        self._base = QPixmap.fromImage(q_image.scaled(self.width(), self.height(),
+                                                      Qt.KeepAspectRatio, Qt.SmoothTransformation))
+        self._base_key = base_key
+        self._scale = self._base.width() / width
+        self._offset = ((self.width() - self._base.width()) // 2, (self.height() - self._base.height()) // 2)
+        # 清除占位文本
+        super().clear()
+
+    def set_overlay(self, boxes, rubber_band=None):
+        """更新覆盖层内容并请求重绘"""
+        self._boxes = boxes
+        self._rubber_band = rubber_band
+        self.update()
+
+    def clear_frame(self):
+        """清除底图和覆盖层"""
+        self._base = None
+        self._base_key = None
+        self._boxes = []
+        self._rubber_band = None
+        self.update()
+
+    def map_from_frame(self, x, y):
+        """原图坐标转换为控件坐标"""
+        ox, oy = self._offset
+        return QPointF(ox + x * self._scale, oy + y * self._scale)
+
+    def _to_display(self, x1, y1, x2, y2):
+        ox, oy = self._offset
+        s = self._scale
+        return QRectF(ox + x1 * s, oy + y1 * s, (x2 - x1) * s, (y2 - y1) * s)
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self._base is None:
+            return
+        painter = QPainter(self)
+        painter.drawPixmap(*self._offset, self._base)
+        draw_boxes(painter, self._boxes, self._to_display, self.label_font)
+        if self._rubber_band is not None:
+            x1, y1, x2, y2, color = self._rubber_band
+            painter.setPen(_pen(color, 2))
+            painter.setBrush(Qt.NoBrush)
+            painter.drawRect(self._to_display(min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)))
+        painter.end()
+
+class RedrawScheduler(QObject):
+    """合并重绘请求，并把重绘频率限制在屏幕刷新率（或指定间隔）以内
+
+    鼠标事件只调用 request() 标记需要重绘，同一间隔内的多次请求合并为一次重绘，
+    重绘时读取的是最新的标注状态，因此期间所有的标注框修改都会体现在这一次重绘中。
+    """
+    def __init__(self, callback, interval_ms=None, parent=None):
+        super().__init__(parent)
+        self.callback = callback
+        if interval_ms is None:
+            # 默认按主屏幕刷新率计算间隔
+            screen = QApplication.primaryScreen()
+            refresh_rate = screen.refreshRate() if screen is not None else 60.0
+            interval_ms = 1000.0 / (refresh_rate if refresh_rate > 0 else 60.0)
+        self.interval_ms = float(interval_ms)
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setTimerType(Qt.PreciseTimer)
+        self._timer.timeout.connect(self._fire)
+        self._last_redraw = 0.0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.requested = 0     # 重绘请求总数
+        self.performed = 0     # 实际执行的重绘次数
+        self.coalesced = 0     # 合并到已排队重绘中的请求数
+        self.dropped = 0       # 已排队但被同步重绘取代而取消的重绘数
+
+    def stats(self):
+        return {'requested': self.requested, 'performed': self.performed,
+                'coalesced': self.coalesced, 'dropped': self.dropped}
+
+    @property
+    def pending(self):
+        return self._timer.isActive()
+
+    def request(self):
+        """标记需要重绘，距离上次重绘不足一个间隔时推迟到间隔结束"""
+        self.requested += 1
+        if self._timer.isActive():
+            self.coalesced += 1
+            return
+        elapsed_ms = (time.perf_counter() - self._last_redraw) * 1000.0
+        self._timer.start(max(0, int(round(self.interval_ms - elapsed_ms))))
+
+    def flush(self):
+        """有排队的重绘时立即执行"""
+        if self._timer.isActive():
+            self._timer.stop()
+            self._fire()
+
+    def cancel(self):
+        """调用方即将同步重绘，取消排队的重绘"""
+        if self._timer.isActive():
+            self._timer.stop()
+            self.dropped += 1
+
+    def _fire(self):
+        self._last_redraw = time.perf_counter()
+        self.performed += 1
+        self.callback()
@@ -0,0 +1,174 @@
+# inference_pool.py
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import onnxdealA
+
+# 共享内存中每帧的起始偏移按该字节数对齐
+_ALIGNMENT = 64
+
+# 工作进程内的推理参数，由进程初始化函数设置
+_worker_options = None
+
+def boxes_to_array(boxes):
+    """把标注框列表压缩为(N,6)的float32数组，每行为[x1, y1, x2, y2, score, cls]"""
+    if boxes is None:
+        return None
+    array = np.empty((len(boxes), 6), dtype=np.float32)
+    for row, box in zip(array, boxes):
+        row[:4] = box['xyxy']
+        row[4] = box['score']
+        row[5] = box['cls']
+    return array
+
+def array_to_boxes(array):
+    """boxes_to_array 的逆操作，还原为 onnxdealA.postprocess 的返回格式"""
+    if array is None:
+        return None
+    xyxy = array[:, :4].round().astype(np.int32).tolist()
+    return [{'cls': c, 'xyxy': b, 'score': s}
+            for c, b, s in zip(array[:, 5].astype(np.int64).tolist(), xyxy, array[:, 4].tolist())]
+
+def _init_worker(options):
+    global _worker_options
+    _worker_options = options
+    # 提前创建会话，第一批帧不必再等待模型加载
+    onnxdealA.get_session(options['onnx_model'], options['providers'])
+
+def _infer_shared(shm_name, layout):
+    """工作进程：直接在共享内存上构造帧数组并推理，返回每帧的压缩结果数组"""
+    options = _worker_options
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        frames = [np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=offset) for offset, shape in layout]
+        results = onnxdealA.main_batch(options['onnx_model'], frames, None,
+                                       input_size=options['input_size'],
+                                       providers=options['providers'],
+                                       conf_thres=options['conf_thres'],
+                                       iou_thres=options['iou_thres'],
+                                       class_thres=options['class_thres'])
+        del frames
+        return [boxes_to_array(boxes) for boxes in results]
+    finally:
+        try:
+            shm.close()
+        except BufferError:
+            # 推理出错时异常栈仍引用着帧数组，映射留给垃圾回收释放
+            pass
+
+class InferencePool:
+    """多进程推理后端
+
+    预处理、推理和后处理都在独立的工作进程中完成，不再与界面线程争用GIL。
+    帧通过共享内存缓冲区传给工作进程（不经过pickle），结果以紧凑数组返回。
+    infer() 是阻塞调用，可以在多个线程中同时调用，每个线程占用一个共享内存缓冲区。
+    """
+    def __init__(self, onnx_model, workers=2, input_size=1280, providers=None,
+                 conf_thres=0.3, iou_thres=0.7, class_thres=None):
+        self.workers = max(1, int(workers))
+        self.options = {
+            'onnx_model': onnx_model,
+            'input_size': input_size,
+            'providers': providers,
+            'conf_thres': conf_thres,
+            'iou_thres': iou_thres,
+            'class_thres': dict(class_thres or {}),
+        }
+        # 使用spawn启动工作进程，避免fork带有Qt和多线程状态的界面进程
+        self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context('spawn'),
+                                             initializer=_init_worker, initargs=(self.options,))
+        # 空闲缓冲区，None表示尚未分配，首次使用时按需创建
+        self._slots = queue.Queue()
+        for _ in range(self.workers):
+            self._slots.put(None)
+        self._buffers = set()      # 当前存在的全部共享内存，用于关闭时统一释放
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def matches(self, onnx_model, input_size, providers, conf_thres, iou_thres, class_thres):
+        """判断推理参数是否与当前进程池一致，不一致时需要重建进程池"""
+        return self.options == {
+            'onnx_model': onnx_model,
+            'input_size': input_size,
+            'providers': providers,
+            'conf_thres': conf_thres,
+            'iou_thres': iou_thres,
+            'class_thres': dict(class_thres or {}),
+        }
+
+    def warm_up(self):
+        """提前启动全部工作进程并加载模型"""
+        for future in [self._executor.submit(int) for _ in range(self.workers)]:
+            future.result()
+
+    def infer(self, frames):
+        """推理一批帧，返回与输入一一对应的标注框列表（None帧对应None）"""
+        results = [None] * len(frames)
+        valid = [i for i, frame in enumerate(frames) if frame is not None]
+        if not valid:
+            return results
+
+        # 计算每帧在缓冲区中的偏移
+        layout, size = [], 0
+        for i in valid:
+            frame = frames[i]
+            layout.append((size, frame.shape))
+            size += (frame.nbytes + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+        shm = self._acquire(size)
+        try:
+            for i, (offset, shape) in zip(valid, layout):
+                np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=offset)[...] = frames[i]
+            arrays = self._executor.submit(_infer_shared, shm.name, layout).result()
+        finally:
+            self._slots.put(shm)
+        for i, array in zip(valid, arrays):
+            results[i] = array_to_boxes(array)
+        return results
+
+    def _acquire(self, size):
+        """取得一个至少有size字节的空闲缓冲区，容量不足时重新分配"""
+        shm = self._slots.get()
+        if shm is not None and shm.size >= size:
+            return shm
+        with self._lock:
+            if self._closed:
+                self._slots.put(shm)
+                raise RuntimeError("推理进程池已关闭")
+            if shm is not None:
+                self._buffers.discard(shm)
+                self._free(shm)
+            # 多分配一些余量，避免帧尺寸略有变化时反复重建
+            shm = shared_memory.SharedMemory(create=True, size=int(size * 1.25))
+            self._buffers.add(shm)
+        return shm
+
+    @staticmethod
+    def _free(shm):
+        try:
+            shm.close()
+        except BufferError:
+            # 仍有线程在使用该缓冲区，只解除名称，映射随最后的引用释放
+            pass
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def shutdown(self):
+        """关闭工作进程并释放全部共享内存"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        with self._lock:
+            for shm in self._buffers:
+                self._free(shm)
+            self._buffers.clear()
@@ -0,0 +1,45 @@
+# interpolation.py
+import numpy as np
+
+MODES = ('linear', 'motion')
+
+def _tangent(neighbor, ids, near, far, t_near, t_far, t_span):
+    """端点near处按时间正向的切线（已乘以区间长度）：邻近关键帧中有同一编号时取far与邻近关键帧之间的平均速度，
+    没有时取near与far之间的平均速度，即该端点按直线运动"""
+    tangent = (far - near) * (t_span / (t_far - t_near))
+    if neighbor is None:
+        return tangent
+    t_neighbor, neighbor_ids, neighbor_boxes = neighbor
+    _, rows, neighbor_rows = np.intersect1d(ids, neighbor_ids, return_indices=True)
+    if len(rows) and t_far != t_neighbor:
+        tangent[rows] = (far[rows] - np.asarray(neighbor_boxes, dtype=np.float64)[neighbor_rows]) \
+            * (t_span / (t_far - t_neighbor))
+    return tangent
+
+def interpolate_boxes(start, end, times, mode='linear', before=None, after=None):
+    """在两个关键帧之间插值同一编号的标注框
+
+    start、end 以及可选的 before（start之前的关键帧）、after（end之后的关键帧）均为
+    (时间, 编号数组(M,), 框数组(M,4) x1 y1 x2 y2)；times 为待插值帧的时间(F,)。
+    linear 按时间线性插值；motion 用三次Hermite曲线，端点切线由前后相邻关键帧估计（Catmull-Rom），
+    邻近关键帧中没有该编号时退化为直线。全部帧和框一次按数组计算。
+    返回(编号(K,), 各编号在start中的位置(K,), 插值框(F,K,4))，只包含两个关键帧都有的编号。
+    """
+    if mode not in MODES:
+        raise ValueError(f"不支持的插值方式: {mode}")
+    t_a, ids_a, boxes_a = start
+    t_b, ids_b, boxes_b = end
+    ids, rows_a, rows_b = np.intersect1d(np.asarray(ids_a), np.asarray(ids_b), return_indices=True)
+    a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)[rows_a]
+    b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)[rows_b]
+    span = float(t_b - t_a)
+    u = ((np.asarray(times, dtype=np.float64) - t_a) / span)[:, None, None]
+    if mode == 'linear':
+        return ids, rows_a, a + u * (b - a)
+    # 三次Hermite基函数
+    u2, u3 = u * u, u * u * u
+    h00, h10 = 2 * u3 - 3 * u2 + 1, u3 - 2 * u2 + u
+    h01, h11 = -2 * u3 + 3 * u2, u3 - u2
+    tangent_a = _tangent(before, ids, a, b, t_a, t_b, span)
+    tangent_b = _tangent(after, ids, b, a, t_b, t_a, span)
+    return ids, rows_a, h00 * a + h10 * tangent_a + h01 * b + h11 * tangent_b
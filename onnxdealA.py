@@ -2,12 +2,70 @@
 import cv2
 import numpy as np
 import onnxruntime as ort
+import os
 import sys
-
-def load_classes(path):
-    """加载类别名称列表"""
-    with open(path, "r", encoding="utf-8") as f:
-        return [line.strip() for line in f.readlines()]
+import threading
+from collections import OrderedDict
+
+# 默认推理后端，优先使用CUDA，不可用时退回CPU
+DEFAULT_PROVIDERS = ["CUDAExecutionProvider", "CPUExecutionProvider"]
+
+class SessionPool:
+    """ONNX Runtime 会话池，按(模型路径, 推理后端)缓存会话，容量不足时淘汰最久未使用的模型"""
+    def __init__(self, max_sessions=3, max_model_bytes=None):
+        self.max_sessions = max_sessions          # 最多同时保留的会话数
+        self.max_model_bytes = max_model_bytes    # 已加载模型文件的总大小上限（近似内存占用），None表示不限制
+        self._sessions = OrderedDict()            # key -> (session, 模型修改时间, 模型文件大小)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def resolve_providers(providers=None):
+        """过滤掉当前环境不可用的推理后端"""
+        available = ort.get_available_providers()
+        providers = [p for p in (providers or DEFAULT_PROVIDERS) if p in available]
+        return tuple(providers or ["CPUExecutionProvider"])
+
+    def get(self, onnx_model, providers=None):
+        """获取模型会话，不存在或模型文件已更新时才重新创建"""
+        key = (os.path.abspath(onnx_model), self.resolve_providers(providers))
+        mtime = os.path.getmtime(key[0])
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry is not None and entry[1] == mtime:
+                # 命中缓存，标记为最近使用
+                self._sessions.move_to_end(key)
+                return entry[0]
+            session = ort.InferenceSession(key[0], providers=list(key[1]))
+            self._sessions[key] = (session, mtime, os.path.getsize(key[0]))
+            self._sessions.move_to_end(key)
+            self._evict_locked()
+            return session
+
+    def _evict_locked(self):
+        """淘汰最久未使用的会话，至少保留最近使用的一个"""
+        while len(self._sessions) > 1:
+            total_bytes = sum(entry[2] for entry in self._sessions.values())
+            if len(self._sessions) <= self.max_sessions and \
+                    (self.max_model_bytes is None or total_bytes <= self.max_model_bytes):
+                break
+            self._sessions.popitem(last=False)
+
+    def release(self, onnx_model=None):
+        """释放指定模型的全部会话，不传模型路径时清空会话池"""
+        with self._lock:
+            if onnx_model is None:
+                self._sessions.clear()
+                return
+            path = os.path.abspath(onnx_model)
+            for key in [k for k in self._sessions if k[0] == path]:
+                del self._sessions[key]
+
+# 进程内共享的会话池
+session_pool = SessionPool()
+
+def get_session(onnx_model, providers=None):
+    """从共享会话池中获取模型会话"""
+    return session_pool.get(onnx_model, providers)
 
 def letterbox(image, new_shape=1280, color=(114, 114, 114)):
     """resize + padding 保持纵横比"""
@@ -35,68 +93,142 @@ def preprocess(image, input_size):
     img = np.expand_dims(img, axis=0).astype(np.float32) / 255.0
     return img, ratio, dwdh
 
-def main(onnx_model, image, classes_txt, input_size=1280):
-    # 加载类别
-    class_names = load_classes(classes_txt)
-
-    # 创建 ONNX Runtime session
-    session = ort.InferenceSession(
-        onnx_model, providers=["CUDAExecutionProvider", "CPUExecutionProvider"]
-    )
-    input_name = session.get_inputs()[0].name
-    output_name = session.get_outputs()[0].name
-
-    if image is None:
-        print(f"[ERROR] 无法读取图像: {image}")
-        return None
-
-    img, ratio, dwdh = preprocess(image, input_size)
-    dwdh = np.array([dwdh[0], dwdh[1], dwdh[0], dwdh[1]])
-
-    # 推理结果
-    preds = session.run([output_name], {input_name: img})[0]
-    preds = np.squeeze(preds)
-
+def preprocess_batch(images, input_size):
+    """批量预处理，将多帧letterbox后拼接为一个NCHW张量"""
+    letterboxed, ratios, dwdhs = [], [], []
+    for image in images:
+        img, ratio, dwdh = letterbox(image, new_shape=input_size)
+        letterboxed.append(img)
+        ratios.append(ratio)
+        dwdhs.append(dwdh)
+    # blobFromImages 一次完成 BGR->RGB、HWC->CHW 和归一化
+    blob = cv2.dnn.blobFromImages(letterboxed, scalefactor=1 / 255.0, swapRB=True, crop=False)
+    return blob, ratios, dwdhs
+
+def nms(boxes, scores, iou_thres, classes=None):
+    """按类别的非极大值抑制，返回按置信度降序排列的保留索引"""
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+    if hasattr(cv2.dnn, "NMSBoxesBatched"):
+        # OpenCV 4.7+ 提供C++实现的按类别NMS
+        xywh = np.concatenate([boxes[:, :2], boxes[:, 2:4] - boxes[:, :2]], axis=1)
+        if classes is None:
+            keep = cv2.dnn.NMSBoxes(xywh.tolist(), scores.tolist(), 0.0, iou_thres)
+        else:
+            keep = cv2.dnn.NMSBoxesBatched(xywh.tolist(), scores.tolist(), classes.tolist(), 0.0, iou_thres)
+        keep = np.asarray(keep, dtype=np.int64).reshape(-1)
+        return keep[np.argsort(-scores[keep], kind="stable")]
+    if classes is not None:
+        # 不同类别的框平移到互不重叠的区域，一次完成按类别的NMS
+        offsets = classes.astype(np.float32)[:, None] * (float(boxes.max()) + 1.0)
+        boxes = boxes + offsets
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = w * h
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-9)
+        order = rest[iou <= iou_thres]
+    return np.array(keep, dtype=np.int64)
+
+def postprocess(preds, ratio, dwdh, conf_thres=0.3, iou_thres=0.7, class_thres=None):
+    """将单帧的模型输出还原为原图坐标下的标注框列表（全程向量化）
+
+    class_thres 为 {类别id: 阈值} 字典，未配置的类别使用 conf_thres
+    """
     if preds.ndim == 1:
         preds = np.expand_dims(preds, axis=0)
 
     # 兼容两种常见输出格式
-    if preds.shape[1] >= 6:  # 形如 (N,6) 或 (N,7)
-        boxes_list = []
-        for det in preds:
-            if len(det) == 6:
-                x0, y0, x1, y1, score, cls_id = det
-            else:
-                x0, y0, x1, y1, score, conf, cls_id = det
-                score = conf  # 用 conf 作为置信度
-
-            if score < 0.3:
-                continue
-
-            box = np.array([x0, y0, x1, y1])
-            box -= dwdh
-            box /= ratio
-            box = box.round().astype(np.int32).tolist()
-
-            cls_id = int(cls_id)
-            label = class_names[cls_id] if cls_id < len(class_names) else str(cls_id)
-
-            # 四个角点
-            x_min, y_min, x_max, y_max = box
-            corners = [(x_min, y_min), (x_max, y_min),
-                       (x_max, y_max), (x_min, y_max)]
-            print(f"类别: {label}, 置信度: {score:.2f}, 角点: {corners}")
-            boxes_list.append({
-                'cls': cls_id,
-                'xyxy': box,    # box参数类型是python列表
-                'score': score,
-            })
-        return boxes_list
-
-    else:
+    if preds.shape[1] < 6:
         print(f"[WARN] 模型输出格式不符合预期: {preds.shape}")
         return None
 
+    # 形如 (N,6) 时第5列为置信度；(N,7) 时用 conf 列作为置信度
+    score_col = 4 if preds.shape[1] == 6 else 5
+    scores = preds[:, score_col].astype(np.float32)
+    cls_ids = preds[:, score_col + 1].astype(np.int64)
+
+    # 按类别查表得到每个候选框的阈值，一次掩码过滤
+    thresholds = np.full(len(preds), conf_thres, dtype=np.float32)
+    if class_thres:
+        table = np.full(max(int(cls_ids.max(initial=0)), max(class_thres)) + 1, conf_thres, dtype=np.float32)
+        table[list(class_thres.keys())] = list(class_thres.values())
+        thresholds = table[np.clip(cls_ids, 0, None)]
+    mask = scores >= thresholds
+    if not mask.any():
+        return []
+    scores, cls_ids = scores[mask], cls_ids[mask]
+
+    # 一次数组运算撤销letterbox的缩放和填充
+    boxes = (preds[mask, :4].astype(np.float32) - np.array([dwdh[0], dwdh[1], dwdh[0], dwdh[1]], dtype=np.float32)) / ratio
+
+    if iou_thres is not None and len(boxes) > 1:
+        keep = nms(boxes, scores, iou_thres, cls_ids)
+        boxes, scores, cls_ids = boxes[keep], scores[keep], cls_ids[keep]
+
+    boxes = boxes.round().astype(np.int32).tolist()   # box参数类型是python列表
+    return [{'cls': c, 'xyxy': b, 'score': sc}
+            for c, b, sc in zip(cls_ids.tolist(), boxes, scores.tolist())]
+
+def infer_blob(onnx_model, blob, ratios, dwdhs, providers=None,
+               conf_thres=0.3, iou_thres=0.7, class_thres=None):
+    """对已预处理的NCHW张量推理，blob也可以是多个(1,3,H,W)张量的列表，返回每帧的标注框列表"""
+    if isinstance(blob, (list, tuple)):
+        blob = np.concatenate(blob)
+    # 从会话池获取 ONNX Runtime session
+    session = get_session(onnx_model, providers)
+    model_input = session.get_inputs()[0]
+    output_name = session.get_outputs()[0].name
+
+    # 导出时固定了batch维度的模型只能按固定大小分块推理，不足的部分补零
+    fixed_batch = model_input.shape[0] if isinstance(model_input.shape[0], int) and model_input.shape[0] > 0 else None
+    chunk_size = fixed_batch or len(blob)
+    preds_list = []
+    for start in range(0, len(blob), chunk_size):
+        chunk = blob[start:start + chunk_size]
+        count = len(chunk)
+        if fixed_batch and count < fixed_batch:
+            chunk = np.concatenate([chunk, np.zeros((fixed_batch - count,) + chunk.shape[1:], dtype=chunk.dtype)])
+        preds = session.run([output_name], {model_input.name: chunk})[0]
+        if preds.ndim == 2:
+            preds = np.expand_dims(preds, axis=0)
+        preds_list.extend(preds[:count])
+
+    return [postprocess(preds, ratio, dwdh, conf_thres, iou_thres, class_thres)
+            for preds, ratio, dwdh in zip(preds_list, ratios, dwdhs)]
+
+def main_batch(onnx_model, images, classes_txt, input_size=1280, providers=None,
+               conf_thres=0.3, iou_thres=0.7, class_thres=None):
+    """批量推理，images为帧列表或(N,H,W,3)数组，返回与输入一一对应的标注框列表
+
+    结果中只包含类别id，classes_txt 仅为兼容原有调用方式而保留
+    """
+    results = [None] * len(images)
+    valid = [i for i, image in enumerate(images) if image is not None]
+    if not valid:
+        return results
+
+    blob, ratios, dwdhs = preprocess_batch([images[i] for i in valid], input_size)
+    boxes_lists = infer_blob(onnx_model, blob, ratios, dwdhs, providers, conf_thres, iou_thres, class_thres)
+    for i, boxes_list in zip(valid, boxes_lists):
+        results[i] = boxes_list
+    return results
+
+def main(onnx_model, image, classes_txt, input_size=1280, providers=None,
+         conf_thres=0.3, iou_thres=0.7, class_thres=None):
+    if image is None:
+        print(f"[ERROR] 无法读取图像: {image}")
+        return None
+    return main_batch(onnx_model, [image], classes_txt, input_size, providers,
+                      conf_thres, iou_thres, class_thres)[0]
+
 
 if __name__ == "__main__":
 
@@ -0,0 +1,161 @@
+# pipeline.py
+import queue
+import threading
+
+# 阶段之间传递的结束信号
+_END = object()
+
+class Stage:
+    """流水线中的一个阶段，func 接收一批数据并返回等长的结果列表"""
+    def __init__(self, name, func, workers=1, batch_size=1):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))         # 该阶段的工作线程数
+        self.batch_size = max(1, int(batch_size))   # 每次最多合并处理的数据条数
+
+def gated(func, passthrough):
+    """包装阶段函数，数据为(是否处理, 数据)：只把需要处理的数据合批交给func，其余数据经passthrough转换后直接传到下游
+
+    用于部分帧跳过推理（如跟踪外推的帧），被跳过的帧仍按原顺序经过流水线。
+    """
+    def run(items):
+        selected = [data for process, data in items if process]
+        results = iter(func(selected) if selected else ())
+        return [(process, next(results) if process else passthrough(data)) for process, data in items]
+    return run
+
+class FramePipeline:
+    """分阶段的帧处理流水线（解码 -> 预处理 -> 推理 ...）
+
+    source 在独立的线程中迭代，产生(键, 数据)；每个阶段有自己的工作线程，
+    阶段之间通过有界队列连接，下游处理不过来时上游自动阻塞（背压）。
+    results() 按 source 的原始顺序重新排序后产出(键, 结果)，cancel() 可随时终止。
+    """
+    def __init__(self, source, stages, queue_size=8):
+        self.source = source
+        self.stages = list(stages)
+        self._queues = [queue.Queue(maxsize=max(1, queue_size)) for _ in range(len(self.stages) + 1)]
+        self._cancel_event = threading.Event()
+        self._alive = [stage.workers for stage in self.stages]   # 每个阶段仍在运行的工作线程数
+        self._alive_lock = threading.Lock()
+        self._threads = []
+        self.error = None
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def start(self):
+        """启动解码线程和各阶段的工作线程"""
+        self._threads.append(threading.Thread(target=self._run_source, name="pipeline-source", daemon=True))
+        for index, stage in enumerate(self.stages):
+            for worker in range(stage.workers):
+                self._threads.append(threading.Thread(target=self._run_stage, args=(index,),
+                                                      name=f"pipeline-{stage.name}-{worker}", daemon=True))
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def cancel(self, timeout=1.0):
+        """取消流水线，等待工作线程退出"""
+        self._cancel_event.set()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout=timeout)
+
+    def results(self):
+        """按原始顺序产出(键, 结果)，被取消时直接结束，某个阶段出错时抛出该异常"""
+        output = self._queues[-1]
+        pending = {}
+        next_seq = 0
+        while True:
+            item = self._get(output)
+            if item is _END:
+                break
+            seq, key, result = item
+            pending[seq] = (key, result)
+            # 乱序到达的结果先暂存，等前面的序号到齐后再依次产出
+            while next_seq in pending:
+                yield pending.pop(next_seq)
+                next_seq += 1
+        if self.error is not None:
+            raise self.error
+
+    def _put(self, q, item):
+        """带取消检查的阻塞写入，被取消时返回False"""
+        while not self._cancel_event.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        """带取消检查的阻塞读取，被取消时返回结束信号"""
+        while not self._cancel_event.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def fail(self, error):
+        """记录错误并取消流水线；阶段出错时自动调用，读取结果的一方出错时也可以调用"""
+        self.error = error
+        self._cancel_event.set()
+
+    def _finish(self, index):
+        """第index个阶段全部结束后，向下游的每个工作线程发送结束信号"""
+        count = self.stages[index + 1].workers if index + 1 < len(self.stages) else 1
+        for _ in range(count):
+            self._put(self._queues[index + 1], _END)
+
+    def _run_source(self):
+        iterator = iter(self.source)
+        try:
+            for seq, (key, data) in enumerate(iterator):
+                if not self._put(self._queues[0], (seq, key, data)):
+                    return
+        except Exception as e:
+            self.fail(e)
+            return
+        finally:
+            # 生成器在本线程内关闭，保证其中打开的视频等资源在同一线程释放
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+        self._finish(-1)
+
+    def _run_stage(self, index):
+        stage = self.stages[index]
+        in_queue, out_queue = self._queues[index], self._queues[index + 1]
+        try:
+            ended = False
+            while not ended:
+                item = self._get(in_queue)
+                if item is _END:
+                    break
+                batch = [item]
+                # 动态凑批：只合并队列中已经就绪的数据，不为凑满一批而等待
+                while len(batch) < stage.batch_size:
+                    try:
+                        item = in_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _END:
+                        ended = True
+                        break
+                    batch.append(item)
+                results = stage.func([data for _, _, data in batch])
+                for (seq, key, _), result in zip(batch, results):
+                    if not self._put(out_queue, (seq, key, result)):
+                        return
+        except Exception as e:
+            self.fail(e)
+            return
+        with self._alive_lock:
+            self._alive[index] -= 1
+            last_worker = self._alive[index] == 0
+        if last_worker:
+            self._finish(index)
@@ -0,0 +1,152 @@
+# project_container.py
+"""单文件标注工程容器
+
+把一个输出目录（txt/json两个子目录，每帧两个小文件）中的全部帧保存到一个SQLite文件中：
+每帧一行，以帧索引为主键（按帧索引直接定位，不需要扫描），标注框以二进制数组保存，
+训练数据加载和网络共享盘上的读写不必再打开成千上万个小文件。
+
+用法示例：
+    python project_container.py pack ./output/video_20240101120000
+    python project_container.py unpack ./output/video_20240101120000/annotations.db ./output/restored
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+
+import numpy as np
+
+import annotation_io
+
+CONTAINER_NAME = 'annotations.db'
+FORMAT_VERSION = '1'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS frames (
+    frame_index INTEGER PRIMARY KEY,   -- 帧索引即行号，按帧读取直接走主键
+    is_key INTEGER NOT NULL,           -- 是否关键帧
+    classes BLOB NOT NULL,             -- int32[N] 类别
+    boxes BLOB NOT NULL,               -- float64[N, 4] 归一化的 x中心, y中心, 宽, 高
+    texts TEXT NOT NULL                -- JSON数组，每个框的文本（体重）
+);
+"""
+
+def _encode(items):
+    classes = np.array([item['class_id'] for item in items], dtype=np.int32)
+    boxes = np.array([[item['x_center'], item['y_center'], item['width'], item['height']] for item in items],
+                     dtype=np.float64).reshape(-1, 4)
+    texts = json.dumps([item['text'] for item in items], ensure_ascii=False)
+    return classes.tobytes(), boxes.tobytes(), texts
+
+class ProjectContainer:
+    """单文件标注容器的读写，可作为上下文管理器使用"""
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(_SCHEMA)
+        self._conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('format_version', ?)", (FORMAT_VERSION,))
+        self._conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def set_meta(self, **values):
+        with self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                                   [(key, json.dumps(value, ensure_ascii=False)) for key, value in values.items()])
+
+    def meta(self):
+        return {key: json.loads(value) for key, value in self._conn.execute("SELECT key, value FROM meta")
+                if key != 'format_version'}
+
+    def write_frames(self, frames, is_key=True):
+        """批量写入，frames为[(帧索引, normalize_annotations格式的列表)]，全部在一个事务中完成"""
+        rows = [(int(frame_idx), int(is_key), *_encode(items)) for frame_idx, items in frames]
+        with self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO frames (frame_index, is_key, classes, boxes, texts) "
+                                   "VALUES (?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def delete_frames(self, frame_indexes):
+        with self._conn:
+            self._conn.executemany("DELETE FROM frames WHERE frame_index = ?", [(int(i),) for i in frame_indexes])
+
+    def frame_indexes(self, key_only=False):
+        query = "SELECT frame_index FROM frames" + (" WHERE is_key = 1" if key_only else "") + " ORDER BY frame_index"
+        return [row[0] for row in self._conn.execute(query)]
+
+    def read_arrays(self, frame_idx):
+        """读取单帧，返回(类别数组, 归一化框数组, 文本列表, 是否关键帧)，没有该帧时返回None"""
+        row = self._conn.execute("SELECT classes, boxes, texts, is_key FROM frames WHERE frame_index = ?",
+                                 (int(frame_idx),)).fetchone()
+        if row is None:
+            return None
+        classes = np.frombuffer(row[0], dtype=np.int32)
+        boxes = np.frombuffer(row[1], dtype=np.float64).reshape(-1, 4)
+        return classes, boxes, json.loads(row[2]), bool(row[3])
+
+    def read_frame(self, frame_idx):
+        """读取单帧，返回normalize_annotations格式的列表，没有该帧时返回None"""
+        arrays = self.read_arrays(frame_idx)
+        if arrays is None:
+            return None
+        classes, boxes, texts, _ = arrays
+        return [{'class_id': int(class_id), 'x_center': float(x), 'y_center': float(y),
+                 'width': float(w), 'height': float(h), 'text': text}
+                for class_id, (x, y, w, h), text in zip(classes, boxes.tolist(), texts)]
+
+def pack(session_dir, container_path=None):
+    """把输出目录中的txt/json标注转换为单文件容器，返回帧数"""
+    txt_output_dir, json_output_dir = os.path.join(session_dir, 'txt'), os.path.join(session_dir, 'json')
+    container_path = container_path or os.path.join(session_dir, CONTAINER_NAME)
+    frames = [(frame_idx, annotation_io.read_frame(txt_output_dir, json_output_dir, frame_idx))
+              for frame_idx in annotation_io.list_frames(txt_output_dir, json_output_dir)]
+    with ProjectContainer(container_path) as container:
+        return container.write_frames(frames)
+
+def unpack(container_path, session_dir):
+    """把单文件容器中的关键帧还原为txt/json目录结构，返回帧数"""
+    txt_output_dir, json_output_dir = annotation_io.make_output_dirs(*os.path.split(os.path.normpath(session_dir)))
+    count = 0
+    with ProjectContainer(container_path) as container:
+        for frame_idx in container.frame_indexes(key_only=True):
+            annotation_io.write_normalized_frame(txt_output_dir, json_output_dir, frame_idx, container.read_frame(frame_idx))
+            count += 1
+    return count
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="txt/json标注目录与单文件容器之间的转换")
+    commands = parser.add_subparsers(dest='command', required=True)
+    pack_parser = commands.add_parser('pack', help="把输出目录转换为单文件容器")
+    pack_parser.add_argument('session_dir', help="包含txt和json子目录的输出目录")
+    pack_parser.add_argument('--output', default=None, help=f"容器文件路径，默认为输出目录下的{CONTAINER_NAME}")
+    unpack_parser = commands.add_parser('unpack', help="把单文件容器还原为txt/json目录")
+    unpack_parser.add_argument('container', help="容器文件路径")
+    unpack_parser.add_argument('session_dir', help="还原到的输出目录")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'pack':
+        count = pack(args.session_dir, args.output)
+        print(f"已写入 {count} 帧 -> {args.output or os.path.join(args.session_dir, CONTAINER_NAME)}")
+    else:
+        count = unpack(args.container, args.session_dir)
+        print(f"已还原 {count} 帧 -> {args.session_dir}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
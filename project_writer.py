@@ -0,0 +1,130 @@
+# project_writer.py
+import threading
+from queue import Queue, Empty
+
+from PySide6.QtCore import QObject, Signal
+
+import annotation_io
+from project_container import ProjectContainer
+
+# 每写出多少帧报告一次进度
+PROGRESS_STEP = 50
+
+class ProjectWriter(QObject):
+    """后台标注文件写出线程
+
+    界面线程只提交标注快照（独立副本，之后的编辑不会影响已提交的内容），文件I/O全部在写出线程完成；
+    写出线程每次取出队列中积压的全部任务合并为一批，同一帧只写最后一次提交的内容。
+    每个文件先写临时文件再重命名（annotation_io.write_frame），中途崩溃不会留下截断的文件。
+    进度、结果和错误通过Qt信号报告，槽函数在界面线程执行。
+    """
+    progress = Signal(int, int)        # 本批已处理帧数, 本批总帧数
+    finished = Signal(int, int)        # 本批写入文件数, 删除文件数
+    failed = Signal(str, str, list)    # 输出目录, 错误信息, 写出失败的帧
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._queue = Queue()
+        self._idle = threading.Condition()
+        self._pending = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def snapshot(annotations):
+        """复制写出所需的标注字段，提交后界面线程可以继续修改原标注"""
+        return tuple({'class_id': ann['class_id'], 'x1': ann['x1'], 'y1': ann['y1'],
+                      'x2': ann['x2'], 'y2': ann['y2'], 'text': ann['text']} for ann in annotations)
+
+    def submit(self, txt_output_dir, json_output_dir, frame_size, writes=None, removes=(), container_path=None):
+        """提交一次保存：writes为{帧索引: 标注快照}，removes为需要删除输出文件的帧索引；
+        指定container_path时同时更新单文件容器"""
+        job = (txt_output_dir, json_output_dir, frame_size, dict(writes or {}), tuple(removes), container_path)
+        with self._idle:
+            self._pending += 1
+        self._queue.put(job)
+
+    def pending(self):
+        """尚未写完的提交数"""
+        with self._idle:
+            return self._pending
+
+    def flush(self, timeout=None):
+        """等待已提交的内容全部写完，超时返回False"""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def shutdown(self, timeout=None):
+        """写完已提交的内容后结束写出线程"""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _next_batch(self):
+        """阻塞取出一个任务，再取出队列中积压的其余任务，返回(任务列表, 是否收到结束标记)"""
+        jobs = [self._queue.get()]
+        while True:
+            try:
+                jobs.append(self._queue.get_nowait())
+            except Empty:
+                break
+        stop = None in jobs
+        return [job for job in jobs if job is not None], stop
+
+    def _run(self):
+        while True:
+            jobs, stop = self._next_batch()
+            try:
+                self._write_batch(jobs)
+            finally:
+                with self._idle:
+                    self._pending -= len(jobs)
+                    self._idle.notify_all()
+            if stop:
+                return
+
+    def _write_batch(self, jobs):
+        # 合并：(txt目录, json目录, 帧索引) -> (帧尺寸, 标注快照, 容器路径)，快照为None表示删除
+        operations = {}
+        for txt_output_dir, json_output_dir, frame_size, writes, removes, container_path in jobs:
+            for frame_idx in removes:
+                operations[(txt_output_dir, json_output_dir, frame_idx)] = (frame_size, None, container_path)
+            for frame_idx, annotations in writes.items():
+                operations[(txt_output_dir, json_output_dir, frame_idx)] = (frame_size, annotations, container_path)
+        if not operations:
+            return
+
+        written, removed, errors = 0, 0, {}
+        containers = {}   # 容器路径 -> (txt目录, 写入的帧, 删除的帧)，所有小文件写完后每个容器一次事务写入
+        total = len(operations)
+        for done, ((txt_output_dir, json_output_dir, frame_idx), (frame_size, annotations, container_path)) \
+                in enumerate(operations.items(), 1):
+            try:
+                if annotations is None:
+                    removed += annotation_io.remove_frame(txt_output_dir, json_output_dir, frame_idx)
+                else:
+                    items = annotation_io.normalize_annotations(annotations, frame_size)
+                    annotation_io.write_normalized_frame(txt_output_dir, json_output_dir, frame_idx, items)
+                    written += 2
+                if container_path:
+                    container = containers.setdefault(container_path, (txt_output_dir, [], []))
+                    if annotations is None:
+                        container[2].append(frame_idx)
+                    else:
+                        container[1].append((frame_idx, items))
+            except Exception as e:
+                message, frames = errors.setdefault(txt_output_dir, [str(e), []])
+                frames.append(frame_idx)
+            if done % PROGRESS_STEP == 0 and done < total:
+                self.progress.emit(done, total)
+        for container_path, (txt_output_dir, frame_writes, frame_removes) in containers.items():
+            try:
+                with ProjectContainer(container_path) as container:
+                    container.write_frames(frame_writes)
+                    container.delete_frames(frame_removes)
+            except Exception as e:
+                message, frames = errors.setdefault(txt_output_dir, [str(e), []])
+                frames.extend(frame_idx for frame_idx, _ in frame_writes)
+        self.progress.emit(total, total)
+        for txt_output_dir, (message, frames) in errors.items():
+            self.failed.emit(txt_output_dir, message, frames)
+        self.finished.emit(written, removed)
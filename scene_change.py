@@ -0,0 +1,40 @@
+# scene_change.py
+import cv2
+import numpy as np
+
+def thumbnail(frame, size=96):
+    """缩小为长边size像素的灰度图（int16，便于直接相减）"""
+    height, width = frame.shape[:2]
+    scale = size / max(height, width)
+    small = cv2.resize(frame, (max(1, round(width * scale)), max(1, round(height * scale))),
+                       interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+    return small.astype(np.int16)
+
+def changed_ratio(thumb_a, thumb_b, pixel_delta=20):
+    """两张缩略图中灰度差超过pixel_delta的像素所占比例"""
+    return float(np.count_nonzero(np.abs(thumb_a - thumb_b) > pixel_delta)) / thumb_a.size
+
+class ChangeDetector:
+    """判断帧与上一个分析过的帧是否几乎相同
+
+    每帧缩小为长边size像素的灰度图后与参考帧比较，灰度差超过pixel_delta的像素比例不超过threshold时视为重复帧；
+    否则该帧成为新的参考帧。始终与参考帧（而不是上一帧）比较，缓慢的累积变化最终也会被识别出来。
+    threshold为0或None时不跳过任何帧。
+    """
+    def __init__(self, threshold, size=96, pixel_delta=20):
+        self.threshold = threshold
+        self.size = size
+        self.pixel_delta = pixel_delta
+        self.reference = None
+
+    def is_duplicate(self, frame):
+        if not self.threshold:
+            return False
+        thumb = thumbnail(frame, self.size)
+        if self.reference is not None and self.reference.shape == thumb.shape \
+                and changed_ratio(thumb, self.reference, self.pixel_delta) <= self.threshold:
+            return True
+        self.reference = thumb
+        return False
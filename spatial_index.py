@@ -0,0 +1,131 @@
+# spatial_index.py
+from collections import defaultdict
+
+# 边缘检测的像素宽度（原图坐标）
+EDGE_MARGIN = 10
+
+# 判断边缘位置的顺序：四个角优先于四条边
+_CORNERS = ('se', 'ne', 'sw', 'nw')
+
+def edge_anchor(anno, x, y, margin=EDGE_MARGIN):
+    """返回点(x, y)所在的标注框边缘位置('n', 'ne', 'e', 'se', 's', 'sw', 'w', 'nw')，不在边缘上时返回None"""
+    x1, y1, x2, y2 = anno['x1'], anno['y1'], anno['x2'], anno['y2']
+    near_x1, near_x2 = abs(x - x1) <= margin, abs(x - x2) <= margin
+    near_y1, near_y2 = abs(y - y1) <= margin, abs(y - y2) <= margin
+    if near_x2 and near_y2:
+        return 'se'
+    if near_x2 and near_y1:
+        return 'ne'
+    if near_x1 and near_y2:
+        return 'sw'
+    if near_x1 and near_y1:
+        return 'nw'
+    if near_x2 and y1 <= y <= y2:
+        return 'e'
+    if near_x1 and y1 <= y <= y2:
+        return 'w'
+    if near_y1 and x1 <= x <= x2:
+        return 'n'
+    if near_y2 and x1 <= x <= x2:
+        return 's'
+    return None
+
+def _area(anno):
+    return abs(anno['x2'] - anno['x1']) * abs(anno['y2'] - anno['y1'])
+
+class AnnotationGrid:
+    """单帧标注框的均匀网格索引，用于鼠标命中检测
+
+    每个标注框（向外扩展边缘宽度后）登记到它覆盖的网格单元中，查询时只检查鼠标所在单元的候选框，
+    耗时与当前帧的标注框总数无关。框重叠时的优先级：
+      边缘命中优先于内部命中；角优先于边；面积小的框优先（嵌套在大框里的小框也能选中）；
+      面积相同时先加入的框优先。
+    """
+    def __init__(self, annotations=(), cell_size=64, margin=EDGE_MARGIN):
+        self.cell_size = cell_size
+        self.margin = margin
+        self._cells = defaultdict(set)   # (列, 行) -> 标注框键的集合
+        self._entries = {}               # 标注框键 -> (标注框, 登记时的单元范围, 加入顺序)
+        self._order = 0
+        self.source = annotations        # 建立索引时的标注列表，用于判断索引是否过期
+        for anno in annotations:
+            self.insert(anno)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def is_current(self, annotations):
+        """索引是否仍对应该标注列表（列表被整体替换或条目数变化时需要重建）"""
+        return annotations is self.source and len(annotations) == len(self._entries)
+
+    def _cell_range(self, anno):
+        m, size = self.margin, self.cell_size
+        x1, x2 = sorted((anno['x1'], anno['x2']))
+        y1, y2 = sorted((anno['y1'], anno['y2']))
+        return (int((x1 - m) // size), int((y1 - m) // size), int((x2 + m) // size), int((y2 + m) // size))
+
+    def insert(self, anno):
+        """加入标注框，已存在时按新坐标更新"""
+        key = id(anno)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._unregister(key, entry[1])
+            order = entry[2]
+        else:
+            order = self._order
+            self._order += 1
+        cell_range = self._cell_range(anno)
+        c1, r1, c2, r2 = cell_range
+        for col in range(c1, c2 + 1):
+            for row in range(r1, r2 + 1):
+                self._cells[(col, row)].add(key)
+        self._entries[key] = (anno, cell_range, order)
+
+    # 坐标变化后重新登记
+    update = insert
+
+    def remove(self, anno):
+        """移除标注框"""
+        entry = self._entries.pop(id(anno), None)
+        if entry is not None:
+            self._unregister(id(anno), entry[1])
+
+    def _unregister(self, key, cell_range):
+        c1, r1, c2, r2 = cell_range
+        for col in range(c1, c2 + 1):
+            for row in range(r1, r2 + 1):
+                cell = self._cells.get((col, row))
+                if cell is not None:
+                    cell.discard(key)
+                    if not cell:
+                        del self._cells[(col, row)]
+
+    def candidates(self, x, y):
+        """鼠标所在单元中的候选标注框，按加入顺序排列"""
+        keys = self._cells.get((int(x // self.cell_size), int(y // self.cell_size)), ())
+        entries = sorted((self._entries[key] for key in keys), key=lambda entry: entry[2])
+        return [entry[0] for entry in entries]
+
+    def hit_edge(self, x, y):
+        """返回(True, 边缘位置, 标注框)，未命中任何边缘时返回(False, None, None)"""
+        best, best_rank = None, None
+        for anno in self.candidates(x, y):
+            anchor = edge_anchor(anno, x, y, self.margin)
+            if anchor is None:
+                continue
+            rank = (anchor not in _CORNERS, _area(anno))
+            if best_rank is None or rank < best_rank:
+                best, best_rank = (anchor, anno), rank
+        if best is None:
+            return False, None, None
+        return True, best[0], best[1]
+
+    def hit_inner(self, x, y):
+        """返回包含该点的标注框，没有时返回None"""
+        best, best_area = None, None
+        for anno in self.candidates(x, y):
+            if anno['x1'] <= x <= anno['x2'] and anno['y1'] <= y <= anno['y2']:
+                area = _area(anno)
+                if best_area is None or area < best_area:
+                    best, best_area = anno, area
+        return best
@@ -0,0 +1,149 @@
+# tracker.py
+import numpy as np
+
+def iou_matrix(boxes_a, boxes_b):
+    """两组框(N,4)与(M,4)两两之间的IoU，返回(N,M)"""
+    boxes_a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+    x1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    y1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    x2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    y2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+def greedy_match(iou, threshold):
+    """按IoU从大到小贪心匹配，返回[(行, 列)]；每行每列最多匹配一次，IoU低于阈值的不匹配"""
+    matches = []
+    if iou.size == 0:
+        return matches
+    rows, cols = np.nonzero(iou >= threshold)
+    order = np.argsort(-iou[rows, cols], kind='stable')
+    used_rows, used_cols = set(), set()
+    for k in order:
+        row, col = int(rows[k]), int(cols[k])
+        if row in used_rows or col in used_cols:
+            continue
+        used_rows.add(row)
+        used_cols.add(col)
+        matches.append((row, col))
+    return matches
+
+class IoUTracker:
+    """基于IoU关联和匀速运动模型的多目标跟踪
+
+    每条轨迹保存框的中心、宽高和中心点速度（像素/帧）。有检测结果的帧先按运动模型预测各轨迹的位置，
+    再与检测框按IoU贪心匹配：匹配上的轨迹用检测框修正位置和速度，没有匹配的检测框建立新轨迹（新编号），
+    连续max_age次没有匹配的轨迹被删除。没有检测结果的帧只按运动模型外推，轨迹置信度随外推次数衰减，
+    置信度过低时调用方应重新运行检测器。所有轨迹的计算都以数组整体完成。
+    """
+    def __init__(self, iou_threshold=0.3, max_age=3, velocity_smoothing=0.5, confidence_decay=0.9):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.velocity_smoothing = velocity_smoothing   # 新测得的速度所占的权重
+        self.confidence_decay = confidence_decay       # 每次只外推不检测时置信度乘以的系数
+        self.reset()
+
+    def reset(self):
+        self.state = np.zeros((0, 6))       # [cx, cy, w, h, vx, vy]
+        self.classes = np.zeros(0, dtype=np.int32)
+        self.scores = np.zeros(0)           # 最近一次匹配的检测置信度
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.misses = np.zeros(0, dtype=np.int32)   # 连续没有匹配上检测框的次数
+        self.coasted = np.zeros(0, dtype=np.int32)  # 最近一次检测之后外推的帧数
+        self.next_id = 1
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def _to_xyxy(state):
+        cx, cy, w, h = state[:, 0], state[:, 1], state[:, 2], state[:, 3]
+        return np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+
+    @staticmethod
+    def _to_cxcywh(xyxy):
+        xyxy = np.asarray(xyxy, dtype=np.float64).reshape(-1, 4)
+        return np.stack([(xyxy[:, 0] + xyxy[:, 2]) / 2, (xyxy[:, 1] + xyxy[:, 3]) / 2,
+                         xyxy[:, 2] - xyxy[:, 0], xyxy[:, 3] - xyxy[:, 1]], axis=1)
+
+    def _advance(self):
+        self.state[:, 0:2] += self.state[:, 4:6]
+
+    def confidence(self):
+        """当前轨迹的平均置信度（检测置信度按外推次数衰减），没有轨迹时为0"""
+        if not len(self):
+            return 0.0
+        return float(np.mean(self.scores * self.confidence_decay ** self.coasted))
+
+    def _results(self, mask=None):
+        """当前轨迹转换为识别结果格式，附带跟踪编号"""
+        mask = np.ones(len(self), dtype=bool) if mask is None else mask
+        boxes = np.rint(self._to_xyxy(self.state[mask])).astype(int).tolist()
+        scores = (self.scores * self.confidence_decay ** self.coasted)[mask].tolist()
+        return [{'cls': int(c), 'xyxy': box, 'score': score, 'id': int(i)}
+                for c, box, score, i in zip(self.classes[mask], boxes, scores, self.ids[mask])]
+
+    def predict(self):
+        """没有检测结果的帧：按运动模型外推全部轨迹，返回外推得到的结果"""
+        self._advance()
+        self.coasted += 1
+        return self._results()
+
+    def update(self, detections):
+        """有检测结果的帧：关联检测框并更新轨迹，返回本帧的结果（只包含匹配上的和新建的轨迹）"""
+        detections = detections or []
+        det_boxes = np.array([d['xyxy'] for d in detections], dtype=np.float64).reshape(-1, 4)
+        det_classes = np.array([d['cls'] for d in detections], dtype=np.int32)
+        det_scores = np.array([d.get('score', 1.0) for d in detections], dtype=np.float64)
+
+        self._advance()
+        iou = iou_matrix(self._to_xyxy(self.state), det_boxes)
+        # 不同类别的框不关联
+        if iou.size:
+            iou[self.classes[:, None] != det_classes[None, :]] = 0.0
+        matches = greedy_match(iou, self.iou_threshold)
+        track_rows = np.array([m[0] for m in matches], dtype=int)
+        det_rows = np.array([m[1] for m in matches], dtype=int)
+
+        matched = np.zeros(len(self), dtype=bool)
+        if len(matches):
+            measured = self._to_cxcywh(det_boxes[det_rows])
+            # 速度按两次检测之间的帧数计算，用指数平滑抑制检测框抖动
+            frames = (self.coasted[track_rows] + 1)[:, None]
+            previous = self.state[track_rows, 0:2] - self.state[track_rows, 4:6] * frames
+            velocity = (measured[:, 0:2] - previous) / frames
+            a = self.velocity_smoothing
+            self.state[track_rows, 4:6] = a * velocity + (1 - a) * self.state[track_rows, 4:6]
+            self.state[track_rows, 0:4] = measured
+            self.scores[track_rows] = det_scores[det_rows]
+            self.misses[track_rows] = 0
+            self.coasted[track_rows] = 0
+            matched[track_rows] = True
+        self.misses[~matched] += 1
+        self.coasted[~matched] += 1
+
+        # 删除长时间没有匹配的轨迹
+        keep = self.misses <= self.max_age
+        self.state, self.classes, self.scores = self.state[keep], self.classes[keep], self.scores[keep]
+        self.ids, self.misses, self.coasted = self.ids[keep], self.misses[keep], self.coasted[keep]
+        matched = matched[keep]
+
+        # 没有匹配的检测框建立新轨迹
+        new_rows = np.setdiff1d(np.arange(len(detections)), det_rows)
+        if len(new_rows):
+            count = len(new_rows)
+            state = np.zeros((count, 6))
+            state[:, 0:4] = self._to_cxcywh(det_boxes[new_rows])
+            self.state = np.vstack([self.state, state])
+            self.classes = np.concatenate([self.classes, det_classes[new_rows]])
+            self.scores = np.concatenate([self.scores, det_scores[new_rows]])
+            self.ids = np.concatenate([self.ids, np.arange(self.next_id, self.next_id + count)])
+            self.misses = np.concatenate([self.misses, np.zeros(count, dtype=np.int32)])
+            self.coasted = np.concatenate([self.coasted, np.zeros(count, dtype=np.int32)])
+            matched = np.concatenate([matched, np.ones(count, dtype=bool)])
+            self.next_id += count
+        return self._results(matched)
@@ -0,0 +1,283 @@
+# video_io.py
+import bisect
+import json
+import os
+import threading
+
+import cv2
+
+from scene_change import thumbnail, changed_ratio
+
+# 采样间隔达到该值时改用seek直接定位，间隔较小时逐帧grab更快
+SEEK_INTERVAL_THRESHOLD = 30
+# 自适应采样时输出目录中记录采样帧号的文件名
+SAMPLES_NAME = 'samples.json'
+# 图片文件夹中作为帧读取的图片扩展名
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif')
+
+def list_image_files(folder):
+    """文件夹中的图片文件名，按文件名排序；标注工具和批量预标注共用，同一帧序号对应同一张图片"""
+    return sorted(name for name in os.listdir(folder) if name.lower().endswith(IMAGE_EXTENSIONS))
+
+def supports_fast_seek(cap):
+    """检查视频容器是否支持按帧号定位（定位后位置与目标一致）"""
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    if frame_count <= 1:
+        return False
+    origin = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+    target = min(frame_count - 1, origin + 1)
+    ok = cap.set(cv2.CAP_PROP_POS_FRAMES, target) and int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == target
+    cap.set(cv2.CAP_PROP_POS_FRAMES, origin)
+    return bool(ok)
+
+def iter_sampled_frames(cap, interval, convert_rgb=True, seek_threshold=SEEK_INTERVAL_THRESHOLD):
+    """按固定间隔迭代视频帧，返回(采样序号, 源视频帧号, 帧)
+
+    未采样的帧只调用grab()推进而不做retrieve和颜色转换；
+    间隔较大且容器支持快速定位时直接seek到下一个采样帧
+    """
+    interval = max(1, int(interval))
+    use_seek = interval >= seek_threshold and supports_fast_seek(cap)
+    frame_pos = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+    sample_index = 0
+    while cap.isOpened():
+        if not cap.grab():
+            break
+        ret, frame = cap.retrieve()
+        if not ret:
+            break
+        if convert_rgb:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        yield sample_index, frame_pos, frame
+        sample_index += 1
+        frame_pos += interval
+        if use_seek:
+            if not cap.set(cv2.CAP_PROP_POS_FRAMES, frame_pos):
+                break
+        else:
+            # 跳过未采样的帧，只推进不解码输出
+            for _ in range(interval - 1):
+                if not cap.grab():
+                    return
+
+class AdaptiveSampler:
+    """按画面运动和检测结果变化调整采样间隔
+
+    每个采样帧缩小为灰度缩略图后与上一个采样帧比较：变化像素比例超过motion_high时间隔减半，
+    低于motion_low时间隔加1，始终在[min_interval, max_interval]之间。读取线程发现相邻分析帧的
+    检测结果发生变化时调用report_change，下一次决定采样间隔时同样减半。
+    """
+    def __init__(self, min_interval, max_interval, motion_low=0.002, motion_high=0.02):
+        self.min_interval = max(1, int(min_interval))
+        self.max_interval = max(self.min_interval, int(max_interval))
+        self.motion_low = motion_low
+        self.motion_high = motion_high
+        self.interval = self.min_interval
+        self._previous = None
+        self._changed = False
+
+    def report_change(self):
+        """检测结果发生变化（由读取线程调用）"""
+        self._changed = True
+
+    def next_interval(self, frame):
+        """根据刚读取的采样帧决定到下一个采样帧的间隔"""
+        thumb = thumbnail(frame)
+        motion = 0.0
+        if self._previous is not None and self._previous.shape == thumb.shape:
+            motion = changed_ratio(thumb, self._previous)
+        self._previous = thumb
+        changed, self._changed = self._changed, False
+        if changed or motion > self.motion_high:
+            self.interval = max(self.min_interval, self.interval // 2)
+        elif motion < self.motion_low:
+            self.interval = min(self.max_interval, self.interval + 1)
+        return self.interval
+
+def iter_adaptive_frames(cap, sampler=None, planned=(), convert_rgb=True, seek_threshold=SEEK_INTERVAL_THRESHOLD):
+    """按可变间隔迭代视频帧，返回(采样序号, 源视频帧号, 帧)
+
+    planned 为已确定的采样帧号（升序，如上次打开同一视频时记录的采样结果），先依次读取这些帧；
+    之后下一个采样位置由 sampler.next_interval(帧) 决定，sampler为None时读完planned即结束。
+    """
+    planned = list(planned)
+    frame_pos = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+    target = planned[0] if planned else frame_pos
+    use_seek = None
+    sample_index = 0
+    while cap.isOpened():
+        if target - frame_pos >= seek_threshold:
+            if use_seek is None:
+                use_seek = supports_fast_seek(cap)
+            if use_seek:
+                if not cap.set(cv2.CAP_PROP_POS_FRAMES, target):
+                    return
+                frame_pos = target
+        # 跳过未采样的帧，只推进不解码输出
+        while frame_pos < target:
+            if not cap.grab():
+                return
+            frame_pos += 1
+        if not cap.grab():
+            return
+        ret, frame = cap.retrieve()
+        if not ret:
+            return
+        frame_pos += 1
+        if convert_rgb:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        # 计划内的帧也交给sampler，使其运动估计在计划结束后可以直接衔接
+        step = sampler.next_interval(frame) if sampler is not None else None
+        yield sample_index, target, frame
+        sample_index += 1
+        if sample_index < len(planned):
+            target = planned[sample_index]
+        elif step is None:
+            return
+        else:
+            target += step
+
+class VideoSeekIndex:
+    """视频采样帧寻址索引
+
+    加载时只读取压缩数据包（不解码）做一次快速扫描，记录总帧数和关键帧位置，
+    之后任意采样帧都可以从最近的关键帧开始解码取得，解码次数不超过一个GOP。
+    扫描可以在后台线程中进行，扫描完成之前总帧数取容器元数据，按需读取直接按帧号定位。
+    自适应采样时sample_frames按顺序记录每个采样帧的源帧号，否则采样帧号为 采样序号×interval。
+    """
+    def __init__(self, video_path, interval):
+        self.video_path = video_path
+        self.interval = max(1, int(interval))
+        self.frame_count = 0       # 源视频总帧数
+        self.fps = 0.0             # 源视频帧率
+        self.keyframes = []        # 关键帧的源帧号（升序），为空表示容器不提供关键帧信息
+        self.sample_frames = None  # 自适应采样时各采样帧的源帧号
+        self._cap = None           # 按需读取使用的独立解码器
+        self._pos = 0              # 按需读取解码器的下一帧位置
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()   # release()后停止后台扫描
+
+    @classmethod
+    def build(cls, video_path, interval, background=False):
+        """扫描视频并建立索引；background为True时只读取容器元数据后立即返回，数据包扫描在后台线程中完成"""
+        index = cls(video_path, interval)
+        if not background:
+            index.scan()
+            return index
+        index.read_metadata()
+        threading.Thread(target=index._scan_quietly, name="seek-index-scan", daemon=True).start()
+        return index
+
+    def read_metadata(self):
+        """从容器元数据读取帧率和总帧数（不扫描数据包）"""
+        cap = cv2.VideoCapture(self.video_path)
+        try:
+            if not cap.isOpened():
+                raise IOError(f"无法打开视频文件: {self.video_path}")
+            self.fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+            self.frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        finally:
+            cap.release()
+
+    def scan(self):
+        """快速元数据扫描：原始数据包模式下grab只读取数据包，不做解码"""
+        cap = cv2.VideoCapture(self.video_path)
+        try:
+            if not cap.isOpened():
+                raise IOError(f"无法打开视频文件: {self.video_path}")
+            self.fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+            if hasattr(cv2, "CAP_PROP_LRF_HAS_KEY_FRAME") and cap.set(cv2.CAP_PROP_FORMAT, -1):
+                frame_count, keyframes = 0, []
+                while not self._stopped.is_set() and cap.grab():
+                    if cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME):
+                        keyframes.append(frame_count)
+                    frame_count += 1
+                if self._stopped.is_set():
+                    return
+                self.frame_count, self.keyframes = frame_count, keyframes
+            else:
+                # 后端不支持原始数据包读取时退回容器元数据中的帧数
+                self.frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        finally:
+            cap.release()
+
+    def _scan_quietly(self):
+        """后台扫描，失败时保留容器元数据"""
+        try:
+            self.scan()
+        except (IOError, cv2.error) as e:
+            print(f"建立视频寻址索引时出错: {e}")
+
+    def __len__(self):
+        """采样帧数量（自适应采样时为已记录的采样帧数）"""
+        if self.sample_frames is not None:
+            return len(self.sample_frames)
+        return (self.frame_count + self.interval - 1) // self.interval
+
+    def source_frame(self, sample_index):
+        """采样帧序号对应的源视频帧号"""
+        if self.sample_frames is not None:
+            return self.sample_frames[sample_index]
+        return sample_index * self.interval
+
+    def timestamp(self, sample_index):
+        """采样帧在源视频中的时间（秒），帧率未知时返回None"""
+        return self.source_frame(sample_index) / self.fps if self.fps else None
+
+    def save_samples(self, path):
+        """写出采样帧号和帧率（先写临时文件再替换）"""
+        frames = list(self.sample_frames or [])
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'fps': self.fps, 'source_frames': frames}, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load_samples(path):
+        """读取save_samples写出的采样帧号，文件不存在时返回None"""
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return [int(frame) for frame in json.load(f)['source_frames']]
+
+    def decode_position(self, sample_index):
+        """解码采样帧时需要开始解码的位置（不晚于目标帧的最近关键帧）"""
+        target = self.source_frame(sample_index)
+        if not self.keyframes:
+            return target
+        return self.keyframes[max(0, bisect.bisect_right(self.keyframes, target) - 1)]
+
+    def read(self, sample_index, convert_rgb=True):
+        """按需读取一个采样帧，越界或读取失败时返回None"""
+        if not 0 <= sample_index < len(self):
+            return None
+        with self._lock:
+            if self._cap is None:
+                self._cap = cv2.VideoCapture(self.video_path)
+                self._pos = 0
+            target = self.source_frame(sample_index)
+            keyframe = self.decode_position(sample_index)
+            # 目标在当前位置之后且中间没有关键帧时，顺序grab比seek更省；否则直接定位
+            if self._pos > target or (self.keyframes and keyframe > self._pos) or \
+                    (not self.keyframes and target - self._pos >= SEEK_INTERVAL_THRESHOLD):
+                self._cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+                self._pos = target
+            while self._pos < target:
+                if not self._cap.grab():
+                    return None
+                self._pos += 1
+            ret, frame = self._cap.read()
+            if not ret:
+                return None
+            self._pos += 1
+        if convert_rgb:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        return frame
+
+    def release(self):
+        """释放按需读取使用的解码器，并停止尚未完成的后台扫描"""
+        self._stopped.set()
+        with self._lock:
+            if self._cap is not None:
+                self._cap.release()
+                self._cap = None
@@ -0,0 +1,71 @@
+# video_renderer.py
+import cv2
+import numpy as np
+
+import video_io
+from frame_view import label_font, render_annotated_frame
+from pipeline import FramePipeline, Stage
+
+def render_video(video_path, interval, overlays, output_path, fps, draw_workers=2, queue_size=8,
+                 progress=None, cancel=None, sample_frames=None):
+    """把标注绘制到视频的采样帧上并编码输出
+
+    解码（独立线程）-> 绘制（draw_workers个线程）-> 编码（调用线程）三个阶段通过有界队列连接，
+    同时运行；overlays 为 {采样帧序号: FrameView覆盖层格式的标注框列表}，没有标注的帧原样输出。
+    fps 一般取源视频帧率除以采样间隔，输出视频按原速播放。被取消时保留已编码的部分，返回已输出的帧数。
+    sample_frames 为自适应采样时各采样帧的源帧号，此时interval取最小采样间隔，每帧按到下一个采样帧的距离
+    重复写出，播放速度同样与原视频一致。
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"无法打开视频文件: {video_path}")
+    width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    if sample_frames is None:
+        total = (int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) + interval - 1) // interval
+        repeats = None
+    else:
+        total = len(sample_frames)
+        gaps = np.diff(np.append(np.asarray(sample_frames, dtype=np.int64), sample_frames[-1] + interval)) if total else []
+        repeats = np.maximum(1, np.rint(np.asarray(gaps) / interval)).astype(int).tolist()
+
+    # 解码阶段在流水线的读取线程中运行，产出的数据带上帧序号供绘制阶段查找标注
+    def frame_source():
+        try:
+            if sample_frames is None:
+                frames = video_io.iter_sampled_frames(cap, interval)
+            else:
+                frames = video_io.iter_adaptive_frames(cap, planned=sample_frames)
+            for sample_index, _, frame in frames:
+                yield sample_index, (sample_index, frame)
+        finally:
+            cap.release()
+
+    font = label_font()
+    # PySide6的类型包装在第一次使用时才初始化，多个绘制线程同时首次调用可能出错，先在本线程绘制一次
+    render_annotated_frame(np.zeros((16, 16, 3), dtype=np.uint8), [(0, 0, 8, 8, (0, 0, 0), 1, 'x')], font)
+
+    def draw(frames):
+        return [render_annotated_frame(frame, overlays[index], font) if overlays.get(index) else frame
+                for index, frame in frames]
+
+    writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), max(1.0, float(fps)), (width, height))
+    if not writer.isOpened():
+        cap.release()
+        raise IOError(f"无法创建输出视频: {output_path}")
+    pipeline = FramePipeline(frame_source(), [Stage('draw', draw, workers=draw_workers)], queue_size).start()
+    written, done = 0, 0
+    try:
+        for sample_index, frame in pipeline.results():
+            if cancel is not None and cancel.is_set():
+                break
+            frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+            for _ in range(1 if repeats is None else repeats[sample_index]):
+                writer.write(frame)
+                written += 1
+            done += 1
+            if progress is not None and (done % 10 == 0 or done == total):
+                progress(done, total)
+    finally:
+        pipeline.cancel()
+        writer.release()
+    return written